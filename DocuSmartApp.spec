@@ -10,7 +10,6 @@ from PyInstaller.utils.hooks import (
 datas = [
     ('modelos', 'modelos'),
     ('tesseract', 'tesseract'),
-    ('poppler-24.08.0', 'poppler-24.08.0')
 ]
 
 # Dados das bibliotecas
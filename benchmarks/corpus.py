@@ -0,0 +1,211 @@
+"""Synthetic document corpus for the organizer benchmarks.
+
+Generates a reproducible folder of documents (text and scanned PDFs, images, DOCX,
+XLSX, PPTX, HTML and TXT files, plus exact duplicates of some of them) filled with
+Portuguese sentences about the built-in categories. The same seed and counts always
+produce the same files, so runs on different commits can be compared.
+"""
+
+import io
+import json
+import os
+import random
+import shutil
+
+CORPUS_VERSION = 1
+MANIFEST_FILE = "corpus.json"
+DOCUMENTS_FOLDER = "documents"
+
+# Files generated per kind with the default scale
+DEFAULT_COUNTS = {
+    "pdf_text": 12,
+    "pdf_scanned": 4,
+    "image": 8,
+    "docx": 8,
+    "xlsx": 6,
+    "pptx": 6,
+    "html": 8,
+    "txt": 8,
+}
+# Fraction of the generated files that also get an exact copy under another name
+DEFAULT_DUPLICATE_RATIO = 0.1
+
+SENTENCES = {
+    "Financeiro": [
+        "Fatura do cartão de crédito com vencimento no dia {n} e valor total de R$ {v}.",
+        "Boleto de cobrança referente à conta de luz do mês {n}.",
+        "Extrato bancário da conta corrente com saldo de R$ {v}.",
+        "Nota fiscal eletrônica número {n} emitida para pagamento de serviços.",
+        "Holerite com salário líquido de R$ {v} e descontos de imposto de renda.",
+    ],
+    "Saúde": [
+        "Resultado do hemograma completo realizado em {n} de março.",
+        "Laudo de ressonância magnética sem alterações significativas.",
+        "Receita médica com prescrição de uso contínuo por {n} dias.",
+        "Atestado médico de afastamento das atividades por {n} dias.",
+        "Carteira de vacinação com dose de reforço aplicada.",
+    ],
+    "Jurídico": [
+        "Contrato de aluguel residencial com prazo de {n} meses.",
+        "Procuração particular concedendo poderes para representação.",
+        "Petição inicial protocolada na vara cível sob o número {n}.",
+        "Notificação extrajudicial sobre o descumprimento da cláusula {n}.",
+        "Escritura pública de compra e venda do imóvel no valor de R$ {v}.",
+    ],
+    "Pessoal": [
+        "Certidão de nascimento registrada no cartório de registro civil.",
+        "Carteira de identidade RG número {n} emitida pela secretaria de segurança.",
+        "Título de eleitor da zona {n} e seção eleitoral correspondente.",
+        "Passaporte com validade de {n} anos para viagens internacionais.",
+        "Certidão de casamento com averbação de alteração de nome.",
+    ],
+}
+
+
+def _paragraphs(rng, count):
+    category = rng.choice(sorted(SENTENCES))
+    lines = [rng.choice(SENTENCES[category]).format(n=rng.randint(1, 999), v=f"{rng.uniform(10, 9999):.2f}")
+             for _ in range(count)]
+    return category, lines
+
+
+def _render_text_image(lines, width=1240, line_height=34):
+    """Renders lines of text on a white page, like a scanned document."""
+    from PIL import Image, ImageDraw, ImageFont
+    image = Image.new("L", (width, max(400, 80 + line_height * len(lines))), 255)
+    draw = ImageDraw.Draw(image)
+    try:
+        font = ImageFont.load_default(size=26)
+    except TypeError:
+        font = ImageFont.load_default()
+    for i, line in enumerate(lines):
+        draw.text((60, 40 + i * line_height), line, fill=0, font=font)
+    return image
+
+
+def _write_pdf_text(path, lines):
+    import fitz
+    doc = fitz.open()
+    for start in range(0, len(lines), 40):
+        page = doc.new_page()
+        page.insert_textbox(fitz.Rect(50, 50, 550, 800), "\n".join(lines[start:start + 40]), fontsize=10)
+    doc.save(path)
+    doc.close()
+
+
+def _write_pdf_scanned(path, lines):
+    import fitz
+    buffer = io.BytesIO()
+    _render_text_image(lines).save(buffer, format="PNG")
+    doc = fitz.open()
+    page = doc.new_page()
+    page.insert_image(page.rect, stream=buffer.getvalue())
+    doc.save(path)
+    doc.close()
+
+
+def _write_image(path, lines):
+    _render_text_image(lines).convert("RGB").save(path, quality=90)
+
+
+def _write_docx(path, lines):
+    import docx
+    document = docx.Document()
+    for line in lines:
+        document.add_paragraph(line)
+    document.save(path)
+
+
+def _write_xlsx(path, lines):
+    import openpyxl
+    workbook = openpyxl.Workbook()
+    sheet = workbook.active
+    for i, line in enumerate(lines, start=1):
+        sheet.cell(row=i, column=1, value=line)
+        sheet.cell(row=i, column=2, value=i * 10.5)
+    workbook.save(path)
+
+
+def _write_pptx(path, lines):
+    import pptx
+    presentation = pptx.Presentation()
+    for start in range(0, len(lines), 6):
+        slide = presentation.slides.add_slide(presentation.slide_layouts[1])
+        slide.shapes.title.text = lines[start][:40]
+        slide.placeholders[1].text = "\n".join(lines[start:start + 6])
+    presentation.save(path)
+
+
+def _write_html(path, lines):
+    body = "".join(f"<p>{line}</p>" for line in lines)
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(f"<html><head><title>Documento</title><style>p {{margin: 0}}</style></head><body>{body}</body></html>")
+
+
+def _write_txt(path, lines):
+    with open(path, "w", encoding="utf-8") as f:
+        f.write("\n".join(lines))
+
+
+# kind: (extension, writer, number of lines)
+GENERATORS = {
+    "pdf_text": (".pdf", _write_pdf_text, 120),
+    "pdf_scanned": (".pdf", _write_pdf_scanned, 25),
+    "image": (".png", _write_image, 12),
+    "docx": (".docx", _write_docx, 80),
+    "xlsx": (".xlsx", _write_xlsx, 200),
+    "pptx": (".pptx", _write_pptx, 30),
+    "html": (".html", _write_html, 80),
+    "txt": (".txt", _write_txt, 80),
+}
+
+
+def generate_corpus(folder_path, counts=None, duplicate_ratio=DEFAULT_DUPLICATE_RATIO, seed=1234):
+    """Generates the corpus in `folder_path`, unless the same corpus is already there.
+
+    The documents go to the `documents` subfolder and the manifest next to it, so that
+    the folder organized by the benchmarks holds the documents only.
+
+    Args:
+        folder_path (str): The corpus folder. Its previous content is deleted when regenerating.
+        counts (dict, optional): Files per kind (see `DEFAULT_COUNTS`).
+        duplicate_ratio (float, optional): Fraction of the files that get an exact copy.
+        seed (int, optional): The random seed.
+
+    Returns:
+        dict: The corpus manifest: the parameters, `documents_path` and `files`, a dict of
+        file name to `{"kind", "category"}` (duplicates have kind "duplicate" and a
+        `duplicate_of` field).
+    """
+    counts = dict(DEFAULT_COUNTS if counts is None else counts)
+    parameters = {"version": CORPUS_VERSION, "counts": counts, "duplicate_ratio": duplicate_ratio, "seed": seed}
+    manifest_path = os.path.join(folder_path, MANIFEST_FILE)
+    documents_path = os.path.join(folder_path, DOCUMENTS_FOLDER)
+    if os.path.exists(manifest_path):
+        with open(manifest_path, "r", encoding="utf-8") as f:
+            manifest = json.load(f)
+        if all(manifest.get(key) == value for key, value in parameters.items()):
+            return {**manifest, "documents_path": documents_path}
+    shutil.rmtree(folder_path, ignore_errors=True)
+    os.makedirs(documents_path)
+
+    rng = random.Random(seed)
+    files = {}
+    for kind, count in counts.items():
+        extension, writer, line_count = GENERATORS[kind]
+        for i in range(count):
+            category, lines = _paragraphs(rng, line_count)
+            filename = f"{kind}_{i:04d}{extension}"
+            writer(os.path.join(documents_path, filename), lines)
+            files[filename] = {"kind": kind, "category": category}
+
+    originals = sorted(files)
+    for i, original in enumerate(rng.sample(originals, int(len(originals) * duplicate_ratio))):
+        duplicate = f"copia_{i:04d}_{original}"
+        shutil.copyfile(os.path.join(documents_path, original), os.path.join(documents_path, duplicate))
+        files[duplicate] = {"kind": "duplicate", "category": files[original]["category"], "duplicate_of": original}
+
+    manifest = {**parameters, "files": files}
+    with open(manifest_path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2)
+    return {**manifest, "documents_path": documents_path}
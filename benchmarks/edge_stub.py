@@ -0,0 +1,89 @@
+"""Local stand-in for the Supabase Edge Functions, used by the organizer benchmarks.
+
+Answers `POST /functions/v1/<name>` like the classification functions do, after a
+configurable latency, so Gemini-mode runs can be timed without network access or
+credits. Gzip-compressed request bodies are accepted, as the real functions do.
+It runs in its own process, so it does not compete with the benchmark for the GIL or
+inflate its memory figures.
+"""
+
+import gzip
+import json
+import multiprocessing
+import random
+import time
+import zlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class _EdgeStubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        if self.headers.get("Content-Encoding") == "gzip":
+            body = gzip.decompress(body)
+        try:
+            payload = json.loads(body)
+        except ValueError:
+            self._reply(400, {"error": "invalid json"})
+            return
+
+        server = self.server
+        time.sleep(max(0.0, server.rng.gauss(server.latency, server.jitter)))
+        if server.rng.random() < server.error_rate:
+            self._reply(503, {"error": "stub overloaded"}, {"Retry-After": "0"})
+            return
+        # Deterministic answer per document, spread over the requested categories
+        categories = sorted(payload.get("categories") or {"Outros": ""})
+        content = payload.get("document_text") or payload.get("file_data_base64") or ""
+        category = categories[zlib.crc32(content[:4096].encode("utf-8")) % len(categories)]
+        self._reply(200, {"category": category, "confidence": 0.9})
+
+    def _reply(self, status, payload, headers=None):
+        data = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def serve(port=0, latency_ms=300, jitter_ms=50, error_rate=0.0, seed=0, ready_queue=None):
+    """Runs the stub server until the process is terminated.
+
+    Args:
+        port (int, optional): The port to listen on (0 picks a free one).
+        latency_ms (float, optional): The mean time taken by each call, in milliseconds.
+        jitter_ms (float, optional): The standard deviation of that time, in milliseconds.
+        error_rate (float, optional): The fraction of calls answered with 503 (to exercise the retries).
+        seed (int, optional): The random seed for latencies and errors.
+        ready_queue (multiprocessing.Queue, optional): Receives the port once the server listens.
+    """
+    server = ThreadingHTTPServer(("127.0.0.1", port), _EdgeStubHandler)
+    server.daemon_threads = True
+    server.latency, server.jitter, server.error_rate = latency_ms / 1000, jitter_ms / 1000, error_rate
+    server.rng = random.Random(seed)
+    if ready_queue is not None:
+        ready_queue.put(server.server_address[1])
+    server.serve_forever()
+
+
+def start_edge_stub(latency_ms=300, jitter_ms=50, error_rate=0.0, seed=0):
+    """Starts the stub server in a child process.
+
+    Returns:
+        tuple: `(process, base_url)`. Terminate the process when done.
+    """
+    ready_queue = multiprocessing.Queue()
+    process = multiprocessing.Process(target=serve, kwargs={"latency_ms": latency_ms, "jitter_ms": jitter_ms,
+                                                            "error_rate": error_rate, "seed": seed,
+                                                            "ready_queue": ready_queue}, daemon=True)
+    process.start()
+    port = ready_queue.get(timeout=30)
+    return process, f"http://127.0.0.1:{port}"
@@ -0,0 +1,398 @@
+"""Benchmarks of the organizer hot paths.
+
+Generates (or reuses) a synthetic corpus, times each stage of the organizer on it and
+reports, per stage, the number of samples, p50/p95 latency, throughput and peak RSS.
+Gemini-mode runs talk to a local stub of the Edge Functions with configurable latency.
+
+Usage (from the repository root):
+    python benchmarks/run_benchmarks.py
+    python benchmarks/run_benchmarks.py --save-baseline benchmarks/baseline.json
+    python benchmarks/run_benchmarks.py --baseline benchmarks/baseline.json --threshold 0.15
+    python benchmarks/run_benchmarks.py --stages hash_cold,extract_docx --scale 4
+
+With `--baseline`, each stage is compared with the stored results and the exit code is
+1 if any stage got slower than the threshold allows.
+
+Every run uses a throwaway application data folder, so the user's caches are neither
+used nor touched, and the full `simulate_organization` runs always start cold.
+"""
+
+import argparse
+import contextlib
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+BENCHMARKS_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_ROOT = os.path.dirname(BENCHMARKS_DIR)
+sys.path.insert(0, REPO_ROOT)
+
+import corpus
+import edge_stub
+
+RESULTS_VERSION = 1
+DEFAULT_THRESHOLD = 0.10
+# Calls timed together for stages too fast to time one call at a time
+FAST_STAGE_REPEAT = 200
+
+# Kinds of corpus files read by each extractor stage
+EXTRACTOR_STAGES = {
+    "extract_pdf_text": ("extract_from_pdf", ["pdf_text"]),
+    "extract_pdf_scanned": ("extract_from_pdf", ["pdf_scanned"]),
+    "extract_docx": ("extract_from_docx", ["docx"]),
+    "extract_xlsx": ("extract_from_xlsx", ["xlsx"]),
+    "extract_pptx": ("extract_from_pptx", ["pptx"]),
+    "extract_html": ("extract_from_html", ["html"]),
+    "extract_txt": ("extract_from_txt", ["txt"]),
+    "extract_image": ("extract_from_image", ["image"]),
+}
+OCR_STAGES = {"extract_pdf_scanned", "extract_image", "ocr"}
+ALL_STAGES = (["hash_cold", "hash_warm"] + list(EXTRACTOR_STAGES) +
+              ["preprocess_image", "ocr", "classify_filename_keywords", "classify_content_local",
+               "simulate_local_sequential", "simulate_local_parallel", "simulate_gemini_parallel"])
+
+
+def percentile(values, fraction):
+    """Returns the `fraction` percentile of `values`, interpolating between the closest ranks."""
+    ordered = sorted(values)
+    if not ordered: return None
+    position = (len(ordered) - 1) * fraction
+    lower = int(position)
+    upper = min(lower + 1, len(ordered) - 1)
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (position - lower)
+
+
+def peak_rss_mb():
+    """Returns the peak resident memory of this process and of its finished children, in MiB.
+
+    Returns:
+        dict: `{"self": float, "children": float}`; a value is None where it cannot be measured.
+    """
+    try:
+        import resource
+    except ImportError:
+        try:
+            import psutil
+            return {"self": psutil.Process().memory_info().peak_wset / 2 ** 20, "children": None}
+        except (ImportError, AttributeError):
+            return {"self": None, "children": None}
+    # ru_maxrss is in bytes on macOS and in KiB elsewhere
+    scale = 1 if sys.platform == "darwin" else 1024
+    return {"self": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * scale / 2 ** 20,
+            "children": resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss * scale / 2 ** 20}
+
+
+def summarize(samples, items_per_sample=1, bytes_processed=None):
+    """Aggregates the durations of a stage.
+
+    Args:
+        samples (list[float]): The duration of each sample, in seconds.
+        items_per_sample (int, optional): Files (or calls) handled by each sample.
+        bytes_processed (int, optional): Total bytes read by the stage, for a MB/s figure.
+
+    Returns:
+        dict: Sample count, total, mean, p50 and p95 (seconds), throughput (items/s),
+        MB/s when `bytes_processed` is given, and the peak RSS so far.
+    """
+    total = sum(samples)
+    result = {
+        "samples": len(samples),
+        "total_s": total,
+        "mean_s": total / len(samples) if samples else None,
+        "p50_s": percentile(samples, 0.50),
+        "p95_s": percentile(samples, 0.95),
+        "throughput_per_s": (len(samples) * items_per_sample / total) if total else None,
+        "peak_rss_mb": peak_rss_mb(),
+    }
+    if bytes_processed is not None and total:
+        result["mb_per_s"] = bytes_processed / 2 ** 20 / total
+    return result
+
+
+def time_each(items, fn):
+    """Calls `fn` on each item and returns the duration of each call."""
+    samples = []
+    for item in items:
+        started_at = time.perf_counter()
+        fn(item)
+        samples.append(time.perf_counter() - started_at)
+    return samples
+
+
+class BenchmarkRun:
+    """Runs the selected stages over a corpus with an isolated application data folder."""
+    def __init__(self, args, manifest):
+        self.args = args
+        self.manifest = manifest
+        self.documents_path = manifest["documents_path"]
+        self.scratch_dir = tempfile.mkdtemp(prefix="docusmart_bench_")
+        self._app_data_generation = 0
+        self.use_fresh_app_data()
+
+        import organizer
+        self.organizer = organizer
+        self.results = {}
+
+    def files_of_kind(self, *kinds):
+        return [os.path.join(self.documents_path, name) for name, info in sorted(self.manifest["files"].items())
+                if info["kind"] in kinds]
+
+    def all_files(self):
+        return [os.path.join(self.documents_path, name) for name in sorted(self.manifest["files"])]
+
+    def use_fresh_app_data(self):
+        """Points the organizer at a new, empty application data folder (cold caches)."""
+        self._app_data_generation += 1
+        path = os.path.join(self.scratch_dir, f"app_data_{self._app_data_generation}")
+        os.makedirs(path)
+        os.environ["HOME"] = path
+        os.environ["APPDATA"] = path
+        organizer = sys.modules.get("organizer")
+        if organizer is not None:
+            for attribute in ("_hash_index", "_text_cache"):
+                store = getattr(organizer, attribute)
+                if store is not None:
+                    store.close()
+                    setattr(organizer, attribute, None)
+            # Loaded from the app data folder once per process, so it must be dropped with it
+            organizer._category_embeddings_cache = None
+
+    def run(self, stages):
+        """Runs `stages` in order, recording a summary or a skip reason for each."""
+        ocr_unavailable = self._probe_ocr() if OCR_STAGES & set(stages) else None
+        for stage in stages:
+            if stage in OCR_STAGES and ocr_unavailable:
+                self.results[stage] = {"skipped": ocr_unavailable}
+            else:
+                try:
+                    with self._quiet():
+                        if stage in EXTRACTOR_STAGES:
+                            self.results[stage] = self._stage_extract(stage)
+                        else:
+                            self.results[stage] = getattr(self, "_stage_" + stage)()
+                except Exception as e:
+                    self.results[stage] = {"skipped": f"{type(e).__name__}: {e}"}
+            self._print_stage(stage, self.results[stage])
+        return self.results
+
+    def close(self):
+        shutil.rmtree(self.scratch_dir, ignore_errors=True)
+
+    @contextlib.contextmanager
+    def _quiet(self):
+        if self.args.verbose:
+            yield
+            return
+        with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+            yield
+
+    def _probe_ocr(self):
+        """Returns why OCR cannot run here, or None if it can."""
+        import numpy as np
+        try:
+            self.organizer.ocr_image(np.full((64, 64), 255, dtype=np.uint8))
+            return None
+        except Exception as e:
+            return f"OCR indisponível ({type(e).__name__}: {e})"
+
+    def _print_stage(self, stage, result):
+        if "skipped" in result:
+            print(f"  {stage:<28} ignorado: {result['skipped']}")
+            return
+        print(f"  {stage:<28} n={result['samples']:<4} p50={result['p50_s'] * 1000:9.2f} ms  "
+              f"p95={result['p95_s'] * 1000:9.2f} ms  {result['throughput_per_s']:9.1f}/s")
+
+    # --- Stages ---
+
+    def _stage_hash_cold(self):
+        files = self.all_files()
+        return summarize(time_each(files, self.organizer.compute_file_hash),
+                         bytes_processed=sum(os.path.getsize(path) for path in files))
+
+    def _stage_hash_warm(self):
+        files = self.all_files()
+        for path in files:
+            self.organizer.get_file_hash(path)
+        return summarize(time_each(files, self.organizer.get_file_hash))
+
+    def _stage_extract(self, stage):
+        function_name, kinds = EXTRACTOR_STAGES[stage]
+        files = self.files_of_kind(*kinds)
+        if not files: return {"skipped": "nenhum arquivo deste tipo no corpus"}
+        extract = getattr(self.organizer, function_name)
+        return summarize(time_each(files, extract), bytes_processed=sum(os.path.getsize(path) for path in files))
+
+    def _load_images(self):
+        from PIL import Image
+        images = []
+        for path in self.files_of_kind("image"):
+            with Image.open(path) as image:
+                images.append(image.copy())
+        if not images: raise RuntimeError("nenhuma imagem no corpus")
+        return images
+
+    def _stage_preprocess_image(self):
+        return summarize(time_each(self._load_images(), self.organizer.preprocess_image))
+
+    def _stage_ocr(self):
+        import numpy as np
+        preprocessed = [np.asarray(self.organizer.preprocess_image(image)) for image in self._load_images()]
+        return summarize(time_each(preprocessed, self.organizer.ocr_image))
+
+    def _stage_classify_filename_keywords(self):
+        names = sorted(self.manifest["files"])
+        categories = self.organizer.DEFAULT_CATEGORIES
+
+        def classify_all(_):
+            for name in names:
+                self.organizer.classify_by_filename_keywords(name, categories)
+        # One sample per pass over all names, since a single call is too fast to time
+        samples = time_each(range(max(1, FAST_STAGE_REPEAT // max(1, len(names)))), classify_all)
+        return summarize(samples, items_per_sample=len(names))
+
+    def _stage_classify_content_local(self):
+        texts = [self.organizer.extract_text_from_file(path)
+                 for path in self.files_of_kind("pdf_text", "docx", "xlsx", "pptx", "html", "txt")]
+        categories_embeddings = self.organizer.get_category_embeddings(self.organizer.DEFAULT_CATEGORIES)
+        return summarize(time_each(texts, lambda text: self.organizer.classify_content_local(text, categories_embeddings)))
+
+    def _simulate(self, **kwargs):
+        import instrumentation
+        samples = []
+        for _ in range(self.args.repeat):
+            self.use_fresh_app_data()
+            recorder = instrumentation.RunRecorder()
+            started_at = time.perf_counter()
+            self.organizer.simulate_organization(self.documents_path, self.organizer.DEFAULT_CATEGORIES,
+                                                 recorder=recorder, **kwargs)
+            samples.append(time.perf_counter() - started_at)
+        result = summarize(samples, items_per_sample=len(self.manifest["files"]))
+        # Where the time of the last run went, stage by stage
+        result["stage_totals_s"] = {stage: stats["total_s"] for stage, stats in recorder.summary()["stages"].items()}
+        return result
+
+    def _stage_simulate_local_sequential(self):
+        return self._simulate(use_gemini=False)
+
+    def _stage_simulate_local_parallel(self):
+        return self._simulate(use_gemini=False, parallel=True)
+
+    def _stage_simulate_gemini_parallel(self):
+        import config
+        stub_process, stub_url = edge_stub.start_edge_stub(self.args.edge_latency_ms, self.args.edge_jitter_ms,
+                                                           self.args.edge_error_rate, self.args.seed)
+        saved = (config.supabase, config.SUPABASE_URL, config.SUPABASE_KEY)
+        # Any truthy client enables the edge calls; they only use the URL and the key
+        config.supabase, config.SUPABASE_URL, config.SUPABASE_KEY = object(), stub_url, "benchmark"
+        try:
+            result = self._simulate(use_gemini=True, parallel=True,
+                                    available_credits_for_simulation=len(self.manifest["files"]))
+        finally:
+            config.supabase, config.SUPABASE_URL, config.SUPABASE_KEY = saved
+            stub_process.terminate()
+            stub_process.join()
+        result["edge_latency_ms"] = self.args.edge_latency_ms
+        return result
+
+
+def compare_with_baseline(results, baseline, threshold):
+    """Compares the stage results with a baseline.
+
+    A stage regresses when its p50 or p95 latency grew by more than `threshold`
+    (a fraction, e.g. 0.10 for 10%).
+
+    Returns:
+        list[str]: The stages that regressed.
+    """
+    regressions = []
+    print(f"\nComparação com a linha de base (limite: {threshold:.0%}):")
+    for stage, result in results["stages"].items():
+        previous = baseline.get("stages", {}).get(stage)
+        if "skipped" in result or not previous or "skipped" in previous:
+            continue
+        changes = {key: result[key] / previous[key] - 1 for key in ("p50_s", "p95_s") if previous.get(key)}
+        regressed = any(change > threshold for change in changes.values())
+        if regressed:
+            regressions.append(stage)
+        print(f"  {stage:<28} p50 {changes.get('p50_s', 0):+7.1%}  p95 {changes.get('p95_s', 0):+7.1%}"
+              f"{'  <- REGRESSÃO' if regressed else ''}")
+    return regressions
+
+
+def _git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=REPO_ROOT, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Benchmarks dos estágios do organizador.")
+    parser.add_argument("--corpus-dir", default=os.path.join(tempfile.gettempdir(), "docusmart_bench_corpus"),
+                        help="Pasta do corpus sintético (reaproveitado se os parâmetros forem os mesmos).")
+    parser.add_argument("--scale", type=float, default=1.0, help="Multiplica a quantidade de arquivos de cada tipo.")
+    parser.add_argument("--seed", type=int, default=1234)
+    parser.add_argument("--stages", help=f"Estágios a executar, separados por vírgula. Disponíveis: {', '.join(ALL_STAGES)}.")
+    parser.add_argument("--repeat", type=int, default=3, help="Execuções completas de simulate_organization por estágio.")
+    parser.add_argument("--edge-latency-ms", type=float, default=300)
+    parser.add_argument("--edge-jitter-ms", type=float, default=50)
+    parser.add_argument("--edge-error-rate", type=float, default=0.0, help="Fração das chamadas respondidas com 503.")
+    parser.add_argument("--output", help="Salva os resultados em JSON.")
+    parser.add_argument("--save-baseline", help="Salva os resultados como linha de base.")
+    parser.add_argument("--baseline", help="Compara com uma linha de base salva.")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD, help="Piora tolerada em p50/p95 (fração).")
+    parser.add_argument("--verbose", action="store_true", help="Mostra as mensagens do organizador.")
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    stages = args.stages.split(",") if args.stages else ALL_STAGES
+    unknown = [stage for stage in stages if stage not in ALL_STAGES]
+    if unknown:
+        print(f"Estágios desconhecidos: {', '.join(unknown)}", file=sys.stderr)
+        return 2
+
+    os.chdir(REPO_ROOT)
+    counts = {kind: max(1, round(count * args.scale)) for kind, count in corpus.DEFAULT_COUNTS.items()}
+    print(f"Gerando corpus em '{args.corpus_dir}'...")
+    manifest = corpus.generate_corpus(args.corpus_dir, counts=counts, seed=args.seed)
+    print(f"Corpus: {len(manifest['files'])} arquivos.")
+
+    run = BenchmarkRun(args, manifest)
+    try:
+        stage_results = run.run(stages)
+    finally:
+        run.close()
+
+    results = {
+        "version": RESULTS_VERSION,
+        "meta": {"commit": _git_commit(), "python": platform.python_version(), "platform": platform.platform(),
+                 "cpu_count": os.cpu_count(), "corpus": {key: manifest[key] for key in ("version", "counts", "duplicate_ratio", "seed")},
+                 "timestamp": time.time()},
+        "stages": stage_results,
+    }
+    for path in (args.output, args.save_baseline):
+        if path:
+            with open(path, "w", encoding="utf-8") as f:
+                json.dump(results, f, indent=2)
+            print(f"Resultados salvos em '{path}'.")
+
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+        if baseline.get("meta", {}).get("corpus") != results["meta"]["corpus"]:
+            print("AVISO: a linha de base foi gerada com outro corpus; a comparação pode não ser significativa.")
+        if compare_with_baseline(results, baseline, args.threshold):
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,541 @@
+"""Persistent local stores used by the organizer.
+
+This module contains SQLite-backed stores that live in the application data folder:
+- `HashIndex`: maps a file's identity (path, size, mtime, inode) to its last computed hash.
+- `ClassificationCache`: the per-user cache of classification results, keyed by file hash.
+- `TextCache`: a content-addressed store of extracted text and SBERT document embeddings,
+  keyed by file hash and extractor version, with a size cap and LRU eviction.
+- `FolderManifest`: the files of watched folders already classified, with their stat
+  identity, so watch passes only process new or changed files.
+- `NearDuplicateIndex`: the MinHash signatures of classified documents, with an LSH index
+  to find the documents whose text is nearly the same as a new one.
+"""
+
+import json
+import os
+import sqlite3
+import threading
+import time
+import zlib
+import numpy as np
+
+# Default size cap of the extracted-text store (text plus embeddings)
+DEFAULT_TEXT_CACHE_MAX_BYTES = 256 * 1024 * 1024
+# Number of cache hits whose access times are kept in memory before being written in one transaction
+TOUCH_FLUSH_SIZE = 256
+# Number of hash index updates kept in memory before being written in one transaction
+HASH_INDEX_FLUSH_SIZE = 256
+
+
+def _connect(db_path):
+    """Opens an SQLite connection configured for the organizer stores.
+
+    The connection can be shared between threads (callers serialize access with a lock)
+    and uses WAL journaling, so each small commit is cheap and readers never block.
+
+    Args:
+        db_path (str): The path to the database file.
+
+    Returns:
+        sqlite3.Connection: The open connection.
+    """
+    connection = sqlite3.connect(db_path, check_same_thread=False)
+    connection.execute("PRAGMA journal_mode=WAL")
+    connection.execute("PRAGMA synchronous=NORMAL")
+    return connection
+
+
+class HashIndex:
+    """Maps a file's identity to its last computed SHA-256 hash.
+
+    The identity is the file's path together with its size, modification time (in
+    nanoseconds) and inode. As long as none of them changed, the stored hash is
+    returned and the file does not have to be read again.
+
+    Updates are kept in memory and written in a single transaction every
+    `HASH_INDEX_FLUSH_SIZE` updates, on `flush` and on `close`. A row whose file no
+    longer matches it is dropped when it is looked up, and the row of a moved file
+    follows it (`move`), so rows do not pile up for paths that are gone.
+    """
+    def __init__(self, db_path):
+        """Opens (or creates) the index.
+
+        Args:
+            db_path (str): The path to the SQLite database file.
+        """
+        self._lock = threading.Lock()
+        self._connection = _connect(db_path)
+        self._connection.execute("""
+            CREATE TABLE IF NOT EXISTS file_hashes (
+                path TEXT PRIMARY KEY,
+                size INTEGER NOT NULL,
+                mtime_ns INTEGER NOT NULL,
+                inode INTEGER NOT NULL,
+                file_hash TEXT NOT NULL
+            )
+        """)
+        self._connection.commit()
+        # path -> (size, mtime_ns, inode, file_hash) not yet written, or None for a row to delete
+        self._pending = {}
+
+    def get(self, path, stat_result):
+        """Returns the stored hash of a file if its stat information did not change, else None."""
+        identity = (stat_result.st_size, stat_result.st_mtime_ns, stat_result.st_ino)
+        with self._lock:
+            entry = self._lookup(path)
+            if entry is None: return None
+            if entry[:3] == identity: return entry[3]
+            self._queue(path, None)  # The file changed or was replaced: its row is stale
+            return None
+
+    def put(self, path, stat_result, file_hash):
+        """Records the hash computed for a file in its current state."""
+        with self._lock:
+            self._queue(path, (stat_result.st_size, stat_result.st_mtime_ns, stat_result.st_ino, file_hash))
+
+    def move(self, old_path, new_path):
+        """Moves the row of a renamed file to its new path. A row left stale by the move is dropped on lookup."""
+        with self._lock:
+            entry = self._lookup(old_path)
+            if entry is None: return
+            self._queue(old_path, None)
+            self._queue(new_path, entry)
+
+    def remove(self, path):
+        """Forgets a file (e.g. because it was deleted)."""
+        with self._lock:
+            self._queue(path, None)
+
+    def flush(self):
+        """Writes the updates not yet written."""
+        with self._lock:
+            self._flush_pending()
+
+    def close(self):
+        """Writes the pending updates and closes the underlying database connection."""
+        with self._lock:
+            self._flush_pending()
+            self._connection.close()
+
+    def _lookup(self, path):
+        if path in self._pending:
+            return self._pending[path]
+        row = self._connection.execute(
+            "SELECT size, mtime_ns, inode, file_hash FROM file_hashes WHERE path = ?", (path,)).fetchone()
+        return tuple(row) if row else None
+
+    def _queue(self, path, entry):
+        self._pending[path] = entry
+        if len(self._pending) >= HASH_INDEX_FLUSH_SIZE:
+            self._flush_pending()
+
+    def _flush_pending(self):
+        if not self._pending: return
+        self._connection.executemany(
+            "DELETE FROM file_hashes WHERE path = ?", [(path,) for path, entry in self._pending.items() if entry is None])
+        self._connection.executemany(
+            "INSERT OR REPLACE INTO file_hashes (path, size, mtime_ns, inode, file_hash) VALUES (?, ?, ?, ?, ?)",
+            [(path,) + entry for path, entry in self._pending.items() if entry is not None])
+        self._connection.commit()
+        self._pending.clear()
+
+
+class ClassificationCache:
+    """Per-user cache of classification results, keyed by file hash.
+
+    Behaves like the dictionary the JSON cache used to be (`in`, `[]`, `get`, `len`),
+    but every stored result is committed right away, so a crash mid-run keeps the
+    results obtained so far, and lookups go through the primary-key index instead of
+    loading the whole history into memory.
+    """
+    def __init__(self, db_path, legacy_json_path=None):
+        """Opens (or creates) the cache, migrating a legacy JSON cache on first open.
+
+        Args:
+            db_path (str): The path to the SQLite database file.
+            legacy_json_path (str, optional): The path to a JSON cache written by older
+                versions. If it exists, its entries are imported once and the file is
+                renamed with a '.migrated' suffix.
+        """
+        self._lock = threading.Lock()
+        self._connection = _connect(db_path)
+        self._connection.execute("""
+            CREATE TABLE IF NOT EXISTS classifications (
+                file_hash TEXT PRIMARY KEY,
+                category TEXT NOT NULL,
+                updated_at REAL NOT NULL
+            )
+        """)
+        self._connection.commit()
+        if legacy_json_path and os.path.exists(legacy_json_path):
+            self._migrate_json(legacy_json_path)
+
+    def __contains__(self, file_hash):
+        return self.get(file_hash) is not None
+
+    def __getitem__(self, file_hash):
+        category = self.get(file_hash)
+        if category is None:
+            raise KeyError(file_hash)
+        return category
+
+    def __setitem__(self, file_hash, category):
+        with self._lock:
+            self._connection.execute(
+                "INSERT OR REPLACE INTO classifications (file_hash, category, updated_at) VALUES (?, ?, ?)",
+                (file_hash, category, time.time()))
+            self._connection.commit()
+
+    def __len__(self):
+        with self._lock:
+            return self._connection.execute("SELECT COUNT(*) FROM classifications").fetchone()[0]
+
+    def get(self, file_hash, default=None):
+        """Returns the cached category of a file hash, or `default` if it is not cached."""
+        with self._lock:
+            row = self._connection.execute(
+                "SELECT category FROM classifications WHERE file_hash = ?", (file_hash,)).fetchone()
+        return row[0] if row else default
+
+    def update(self, entries):
+        """Stores several `file_hash -> category` entries in a single transaction."""
+        now = time.time()
+        with self._lock:
+            self._connection.executemany(
+                "INSERT OR REPLACE INTO classifications (file_hash, category, updated_at) VALUES (?, ?, ?)",
+                [(file_hash, category, now) for file_hash, category in entries.items()])
+            self._connection.commit()
+
+    def close(self):
+        """Closes the underlying database connection."""
+        with self._lock:
+            self._connection.close()
+
+    def _migrate_json(self, legacy_json_path):
+        try:
+            with open(legacy_json_path, 'r', encoding='utf-8') as f:
+                legacy_entries = json.load(f)
+        except (json.JSONDecodeError, IOError) as e:
+            print(f"AVISO: Cache JSON antigo ilegível, ignorando a migração: {e}")
+            return
+        if isinstance(legacy_entries, dict):
+            self.update({file_hash: category for file_hash, category in legacy_entries.items() if isinstance(category, str)})
+            print(f"Cache JSON migrado para SQLite ({len(legacy_entries)} entradas).")
+        try:
+            os.replace(legacy_json_path, legacy_json_path + ".migrated")
+        except OSError as e:
+            print(f"AVISO: Não foi possível renomear o cache JSON migrado: {e}")
+
+
+class TextCache:
+    """Content-addressed store of extracted text and document embeddings.
+
+    Entries are keyed by the file's SHA-256 hash and the extractor version, so an
+    unchanged file is never parsed or OCR'd twice, and bumping the extractor version
+    invalidates every entry at once. An entry can also hold the SBERT embedding of its
+    text, tagged with the model that produced it. When the total size goes over the
+    cap, the least recently used entries are evicted.
+
+    Cache hits do not write to the database: their access times are kept in memory and
+    written in a single transaction every `TOUCH_FLUSH_SIZE` hits, before an eviction,
+    on `flush` and on `close`.
+    """
+    def __init__(self, db_path, max_size_bytes=DEFAULT_TEXT_CACHE_MAX_BYTES):
+        """Opens (or creates) the store.
+
+        Args:
+            db_path (str): The path to the SQLite database file.
+            max_size_bytes (int, optional): The maximum total size of the stored texts and embeddings.
+        """
+        self.max_size_bytes = max_size_bytes
+        self._lock = threading.Lock()
+        self._connection = _connect(db_path)
+        self._connection.executescript("""
+            CREATE TABLE IF NOT EXISTS extracted_text (
+                file_hash TEXT NOT NULL,
+                extractor_version INTEGER NOT NULL,
+                text TEXT NOT NULL,
+                embedding BLOB,
+                embedding_model TEXT,
+                size_bytes INTEGER NOT NULL,
+                last_access REAL NOT NULL,
+                PRIMARY KEY (file_hash, extractor_version)
+            );
+            CREATE INDEX IF NOT EXISTS idx_extracted_text_last_access ON extracted_text (last_access);
+        """)
+        self._connection.commit()
+        self._total_size = self._connection.execute("SELECT COALESCE(SUM(size_bytes), 0) FROM extracted_text").fetchone()[0]
+        # (file_hash, extractor_version) -> last access not yet written
+        self._pending_touches = {}
+
+    def get_text(self, file_hash, extractor_version):
+        """Returns the cached text of a file, or None if it is not cached."""
+        with self._lock:
+            row = self._connection.execute(
+                "SELECT text FROM extracted_text WHERE file_hash = ? AND extractor_version = ?",
+                (file_hash, extractor_version)).fetchone()
+            if row is None: return None
+            self._touch(file_hash, extractor_version)
+            return row[0]
+
+    def get_embedding(self, file_hash, extractor_version, embedding_model):
+        """Returns the cached document embedding of a file, or None if there is none for this model."""
+        with self._lock:
+            row = self._connection.execute(
+                "SELECT embedding FROM extracted_text WHERE file_hash = ? AND extractor_version = ? AND embedding_model = ?",
+                (file_hash, extractor_version, embedding_model)).fetchone()
+            if row is None or row[0] is None: return None
+            self._touch(file_hash, extractor_version)
+            return np.frombuffer(row[0], dtype=np.float32)
+
+    def put_text(self, file_hash, extractor_version, text):
+        """Stores the extracted text of a file, replacing any previous entry (and its embedding)."""
+        size_bytes = len(text.encode("utf-8"))
+        with self._lock:
+            self._pending_touches.pop((file_hash, extractor_version), None)
+            self._total_size -= self._entry_size(file_hash, extractor_version)
+            self._connection.execute(
+                "INSERT OR REPLACE INTO extracted_text (file_hash, extractor_version, text, embedding, embedding_model, size_bytes, last_access) "
+                "VALUES (?, ?, ?, NULL, NULL, ?, ?)",
+                (file_hash, extractor_version, text, size_bytes, time.time()))
+            self._total_size += size_bytes
+            self._evict_if_needed()
+            self._connection.commit()
+
+    def put_embedding(self, file_hash, extractor_version, embedding_model, embedding):
+        """Attaches a document embedding to an already cached text. Does nothing if the text is not cached."""
+        embedding_bytes = np.asarray(embedding, dtype=np.float32).tobytes()
+        with self._lock:
+            row = self._connection.execute(
+                "SELECT LENGTH(CAST(text AS BLOB)) FROM extracted_text WHERE file_hash = ? AND extractor_version = ?",
+                (file_hash, extractor_version)).fetchone()
+            if row is None: return
+            self._pending_touches.pop((file_hash, extractor_version), None)
+            size_bytes = row[0] + len(embedding_bytes)
+            self._total_size += size_bytes - self._entry_size(file_hash, extractor_version)
+            self._connection.execute(
+                "UPDATE extracted_text SET embedding = ?, embedding_model = ?, size_bytes = ?, last_access = ? "
+                "WHERE file_hash = ? AND extractor_version = ?",
+                (embedding_bytes, embedding_model, size_bytes, time.time(), file_hash, extractor_version))
+            self._evict_if_needed()
+            self._connection.commit()
+
+    def flush(self):
+        """Writes the access times of the cache hits not yet written."""
+        with self._lock:
+            self._flush_touches()
+            self._connection.commit()
+
+    def close(self):
+        """Writes the pending access times and closes the underlying database connection."""
+        with self._lock:
+            self._flush_touches()
+            self._connection.commit()
+            self._connection.close()
+
+    def _entry_size(self, file_hash, extractor_version):
+        row = self._connection.execute(
+            "SELECT size_bytes FROM extracted_text WHERE file_hash = ? AND extractor_version = ?",
+            (file_hash, extractor_version)).fetchone()
+        return row[0] if row else 0
+
+    def _touch(self, file_hash, extractor_version):
+        self._pending_touches[(file_hash, extractor_version)] = time.time()
+        if len(self._pending_touches) >= TOUCH_FLUSH_SIZE:
+            self._flush_touches()
+            self._connection.commit()
+
+    def _flush_touches(self):
+        if not self._pending_touches: return
+        self._connection.executemany(
+            "UPDATE extracted_text SET last_access = ? WHERE file_hash = ? AND extractor_version = ?",
+            [(last_access, file_hash, extractor_version) for (file_hash, extractor_version), last_access in self._pending_touches.items()])
+        self._pending_touches.clear()
+
+    def _evict_if_needed(self):
+        """Deletes least recently used entries until the store is back under 90% of its cap."""
+        if self._total_size <= self.max_size_bytes: return
+        # The eviction order must see the latest cache hits
+        self._flush_touches()
+        target_size = int(self.max_size_bytes * 0.9)
+        rows = self._connection.execute(
+            "SELECT file_hash, extractor_version, size_bytes FROM extracted_text ORDER BY last_access")
+        evicted = []
+        for file_hash, extractor_version, size_bytes in rows:
+            if self._total_size <= target_size: break
+            evicted.append((file_hash, extractor_version))
+            self._total_size -= size_bytes
+        self._connection.executemany(
+            "DELETE FROM extracted_text WHERE file_hash = ? AND extractor_version = ?", evicted)
+
+
+class FolderManifest:
+    """Records the files of watched folders that were already classified.
+
+    Each entry holds a file's stat identity (size, modification time, inode) when it
+    was classified and the result, so the next pass of a watch only has to look at
+    files that are new or whose stat information changed.
+    """
+    def __init__(self, db_path):
+        """Opens (or creates) the manifest.
+
+        Args:
+            db_path (str): The path to the SQLite database file.
+        """
+        self._lock = threading.Lock()
+        self._connection = _connect(db_path)
+        self._connection.execute("""
+            CREATE TABLE IF NOT EXISTS folder_manifest (
+                folder TEXT NOT NULL,
+                name TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                mtime_ns INTEGER NOT NULL,
+                inode INTEGER NOT NULL,
+                category TEXT,
+                method TEXT,
+                seen_at REAL NOT NULL,
+                PRIMARY KEY (folder, name)
+            )
+        """)
+        self._connection.commit()
+
+    def entries(self, folder):
+        """Returns `{name: (size, mtime_ns, inode)}` for every recorded file of a folder."""
+        with self._lock:
+            rows = self._connection.execute(
+                "SELECT name, size, mtime_ns, inode FROM folder_manifest WHERE folder = ?", (folder,)).fetchall()
+        return {name: (size, mtime_ns, inode) for name, size, mtime_ns, inode in rows}
+
+    def results(self, folder):
+        """Returns `{name: (category, method)}` for every recorded file of a folder."""
+        with self._lock:
+            rows = self._connection.execute(
+                "SELECT name, category, method FROM folder_manifest WHERE folder = ?", (folder,)).fetchall()
+        return {name: (category, method) for name, category, method in rows}
+
+    def record(self, folder, entries):
+        """Stores several `(name, stat_result, category, method)` entries in a single transaction."""
+        now = time.time()
+        with self._lock:
+            self._connection.executemany(
+                "INSERT OR REPLACE INTO folder_manifest (folder, name, size, mtime_ns, inode, category, method, seen_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                [(folder, name, st.st_size, st.st_mtime_ns, st.st_ino, category, method, now)
+                 for name, st, category, method in entries])
+            self._connection.commit()
+
+    def remove(self, folder, names):
+        """Forgets files of a folder (e.g. because they were deleted or moved away)."""
+        with self._lock:
+            self._connection.executemany(
+                "DELETE FROM folder_manifest WHERE folder = ? AND name = ?", [(folder, name) for name in names])
+            self._connection.commit()
+
+    def close(self):
+        """Closes the underlying database connection."""
+        with self._lock:
+            self._connection.close()
+
+
+class NearDuplicateIndex:
+    """MinHash signatures of classified documents, searchable for near-duplicates.
+
+    Each document is stored once (keyed by file hash) with its signature and category,
+    and its signature is split into bands: the documents sharing at least one band
+    bucket with a query are its candidates, and only their signatures are compared.
+    Lookups therefore cost a few indexed queries whatever the number of documents, and
+    the buckets refer to documents by integer id, so hundreds of thousands of documents
+    take about half a kilobyte each.
+    """
+    def __init__(self, db_path, bands, version, max_candidates_per_bucket=50):
+        """Opens (or creates) the index.
+
+        Args:
+            db_path (str): The path to the SQLite database file.
+            bands (int): The number of LSH bands the signatures are split into.
+            version (int): The signature version. An index written with another version
+                (or band count) is emptied, since its signatures are not comparable.
+            max_candidates_per_bucket (int, optional): Bound on the candidates read from a
+                single bucket, for texts that share a lot with many others (e.g. forms). The
+                most recently added documents are read first.
+        """
+        self.bands = bands
+        self.max_candidates_per_bucket = max_candidates_per_bucket
+        self._lock = threading.Lock()
+        self._connection = _connect(db_path)
+        user_version = version * 1000 + bands
+        if self._connection.execute("PRAGMA user_version").fetchone()[0] != user_version:
+            self._connection.executescript("DROP TABLE IF EXISTS lsh_buckets; DROP TABLE IF EXISTS documents;")
+            self._connection.execute(f"PRAGMA user_version = {int(user_version)}")
+        self._connection.executescript("""
+            CREATE TABLE IF NOT EXISTS documents (
+                id INTEGER PRIMARY KEY,
+                file_hash TEXT NOT NULL UNIQUE,
+                signature BLOB NOT NULL,
+                category TEXT NOT NULL,
+                updated_at REAL NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS lsh_buckets (
+                band INTEGER NOT NULL,
+                bucket INTEGER NOT NULL,
+                document_id INTEGER NOT NULL,
+                PRIMARY KEY (band, bucket, document_id)
+            ) WITHOUT ROWID;
+        """)
+        self._connection.commit()
+
+    def __len__(self):
+        with self._lock:
+            return self._connection.execute("SELECT COUNT(*) FROM documents").fetchone()[0]
+
+    def _band_buckets(self, signature):
+        return [(band, zlib.crc32(rows.tobytes())) for band, rows in enumerate(np.array_split(signature, self.bands))]
+
+    def add(self, file_hash, signature, category):
+        """Stores (or replaces) the signature and category of a document."""
+        with self._lock:
+            row = self._connection.execute("SELECT id FROM documents WHERE file_hash = ?", (file_hash,)).fetchone()
+            if row is not None:
+                self._connection.execute("DELETE FROM lsh_buckets WHERE document_id = ?", (row[0],))
+                self._connection.execute("DELETE FROM documents WHERE id = ?", (row[0],))
+            document_id = self._connection.execute(
+                "INSERT INTO documents (file_hash, signature, category, updated_at) VALUES (?, ?, ?, ?)",
+                (file_hash, np.asarray(signature, dtype=np.uint32).tobytes(), category, time.time())).lastrowid
+            self._connection.executemany(
+                "INSERT OR IGNORE INTO lsh_buckets (band, bucket, document_id) VALUES (?, ?, ?)",
+                [(band, bucket, document_id) for band, bucket in self._band_buckets(signature)])
+            self._connection.commit()
+
+    def find(self, signature, threshold):
+        """Finds the stored document most similar to a signature.
+
+        Args:
+            signature (numpy.ndarray): The MinHash signature of the new document.
+            threshold (float): The minimum estimated similarity (0.0 to 1.0).
+
+        Returns:
+            tuple or None: `(file_hash, category, similarity)` of the best match at or above
+            `threshold`, or None if there is none.
+        """
+        with self._lock:
+            candidate_ids = set()
+            for band, bucket in self._band_buckets(signature):
+                candidate_ids.update(document_id for document_id, in self._connection.execute(
+                    "SELECT document_id FROM lsh_buckets WHERE band = ? AND bucket = ? ORDER BY document_id DESC LIMIT ?",
+                    (band, bucket, self.max_candidates_per_bucket)))
+            if not candidate_ids: return None
+            candidate_ids = list(candidate_ids)
+            rows = self._connection.execute(
+                f"SELECT file_hash, signature, category FROM documents WHERE id IN ({','.join('?' * len(candidate_ids))})",
+                candidate_ids).fetchall()
+        if not rows: return None
+        signatures = np.vstack([np.frombuffer(row[1], dtype=np.uint32) for row in rows])
+        similarities = (signatures == np.asarray(signature, dtype=np.uint32)).mean(axis=1)
+        best = int(similarities.argmax())
+        if similarities[best] < threshold: return None
+        return rows[best][0], rows[best][2], float(similarities[best])
+
+    def close(self):
+        """Closes the underlying database connection."""
+        with self._lock:
+            self._connection.close()
@@ -6,6 +6,7 @@ functions for checking prerequisites, such as internet connectivity.
 """
 
 import os
+import multiprocessing
 import requests
 from dotenv import load_dotenv
 
@@ -62,9 +63,12 @@ def check_internet_connection(url='http://www.google.com/', timeout=5):
         return False
 
 
-# Check for internet connection on startup
-checkInternet = check_internet_connection()
-print(f"Internet connected: {checkInternet}")
+# Extraction worker processes spawned by the organizer pipeline never talk to the backend,
+# so the startup checks only run in the main process.
+if multiprocessing.parent_process() is None:
+    # Check for internet connection on startup
+    checkInternet = check_internet_connection()
+    print(f"Internet connected: {checkInternet}")
 
-# Initialize the Supabase client on startup
-init_supabase() 
\ No newline at end of file
+    # Initialize the Supabase client on startup
+    init_supabase() 
\ No newline at end of file
@@ -6,11 +6,16 @@ the user interface, handles user interactions, and integrates with the backend
 logic defined in the 'organizer' and 'config' modules.
 """
 
+import time
+# Reference point of the startup timing report, taken before the heavy imports below
+_startup_started_at = time.perf_counter()
+
 import customtkinter as ctk
 import os
-import shutil
 import CTkMessagebox
 import organizer 
+import plan_executor
+import ui_bus
 import threading
 import sys
 import config
@@ -18,6 +23,49 @@ import webbrowser
 import re
 import threading
 import json
+import multiprocessing
+
+
+class StartupTimer:
+    """Records named startup milestones and reports how long each one took.
+
+    The report is printed and appended as a JSON line to `startup_timings.jsonl` in the
+    application data folder, so cold-start regressions can be tracked across versions.
+    """
+    def __init__(self, started_at):
+        """Initializes the timer.
+
+        Args:
+            started_at (float): The `time.perf_counter()` value the milestones are measured from.
+        """
+        self.started_at = started_at
+        self.milestones = []
+        self.reported = False
+
+    def mark(self, name):
+        """Records a milestone at the current time."""
+        self.milestones.append((name, time.perf_counter() - self.started_at))
+
+    def report(self):
+        """Prints the milestones and appends them to the timings file. Only the first call has an effect."""
+        if self.reported: return
+        self.reported = True
+        print("Tempos de inicialização:")
+        for name, elapsed in self.milestones:
+            print(f"  {name}: {elapsed:.2f}s")
+        record = {"timestamp": time.time(), "milestones": {name: round(elapsed, 4) for name, elapsed in self.milestones}}
+        try:
+            with open(os.path.join(organizer.get_app_data_path(), "startup_timings.jsonl"), "a", encoding="utf-8") as f:
+                f.write(json.dumps(record) + "\n")
+        except IOError as e:
+            print(f"AVISO: Não foi possível salvar os tempos de inicialização: {e}")
+
+
+startup_timer = StartupTimer(_startup_started_at)
+startup_timer.mark("imports")
+
+# Lines kept in the log textbox; the oldest ones are removed beyond this
+MAX_LOG_LINES = 4000
 
 
 class App(ctk.CTk):
@@ -69,21 +117,7 @@ class App(ctk.CTk):
         self.grid_rowconfigure(1, weight=1) 
 
         # --- Default Categories ---
-        self.default_categories = {
-            "Pessoal": "Documentos que comprovam a identidade, cidadania e vínculos civis do indivíduo. Incluem registros oficiais emitidos por órgãos governamentais que são frequentemente exigidos em processos legais, administrativos ou cadastrais. Exemplos: documentos de identidade como RG (Registro Geral) e CPF (Cadastro de Pessoa Física), CNH (Carteira Nacional de Habilitação), passaporte, título de eleitor, certidões de nascimento e casamento, carteira de trabalho e outros registros civis ou de identificação.",
-            
-            "Saúde": "Documentos que reúnem informações sobre o histórico médico, exames clínicos e relações com instituições de saúde. Servem como registros pessoais de atendimentos, diagnósticos, prescrições e acompanhamento de tratamentos, além de comprovarem vínculos com planos de saúde. Exemplos: resultados de exames laboratoriais (como hemogramas), laudos de imagem (raio-X, tomografias, ressonâncias), receitas e prescrições médicas, atestados de saúde, histórico de vacinação, carteiras do SUS, comprovantes de plano ou seguro saúde, entre outros documentos médicos.",
-            
-            "Financeiro": "Documentos que envolvem a movimentação de dinheiro, contas a pagar ou a receber, e comprovação de renda ou patrimônio. Inclui tanto registros de consumo e despesas quanto comprovantes de transações bancárias ou fiscais. Exemplos: notas fiscais eletrônicas (NFe), faturas de cartão de crédito, boletos de cobrança, contas mensais (como luz, água, gás, internet, telefone), extratos bancários, comprovantes de transferências, holerites (contracheques), declarações e recibos do Imposto de Renda, comprovantes de pagamento de compras ou serviços.",
-            
-            "Jurídico": "Documentos com valor legal que formalizam acordos, representações, disputas ou direitos. São frequentemente utilizados em contextos judiciais ou administrativos, e envolvem relações contratuais, autorizações legais, processos e registros públicos. Exemplos: contratos (de aluguel, prestação de serviços, compra e venda), procurações (públicas ou particulares), petições judiciais, notificações extrajudiciais, acordos firmados, escrituras públicas, alvarás de funcionamento, intimações, sentenças ou despachos judiciais.",
-            
-            "Imagens": "Arquivos digitais no formato de imagem que não se enquadram nas demais categorias, geralmente por não conterem conteúdo textual ou por não estarem diretamente relacionados a temas jurídicos, financeiros ou pessoais. Podem ter finalidade decorativa, informativa ou recreativa. Exemplos: fotografias pessoais, selfies, imagens de viagens, wallpapers, memes, ilustrações, capturas de tela sem conteúdo documental (como prints de conversas ou redes sociais).",
-            
-            "Vídeos": "Arquivos em formato audiovisual que registram cenas, sons e movimentos. Normalmente são utilizados para fins pessoais, educativos, informativos ou de entretenimento. Não pertencem às demais categorias por não conterem, necessariamente, informações estruturadas ou documentais. Exemplos: vídeos caseiros, gravações de tela (screen recordings), clipes de eventos, vídeos salvos de redes sociais ou plataformas como YouTube, registros de reuniões online, entrevistas pessoais, entre outros.",
-            
-            "Outros": "Categoria genérica destinada a arquivos que não se encaixam com clareza em nenhuma das classificações anteriores. Pode incluir documentos pouco padronizados, arquivos técnicos, formatos incomuns ou conteúdos que exigem uma análise mais aprofundada para classificação correta. Utilizada também como categoria temporária para revisão manual posterior."
-        }
+        self.default_categories = organizer.DEFAULT_CATEGORIES.copy()
         self.current_categories = self.default_categories.copy()
 
         # --- Main Control Frame ---
@@ -117,6 +151,9 @@ class App(ctk.CTk):
 
         self.preview_with_gemini_button = ctk.CTkButton(preview_buttons_frame, text="✨ Visualizar (IA Gemini)", command=lambda: self.show_organization_preview(use_gemini_for_this_run=True), state="disabled", font=self.medium_font, fg_color=self.gemini_button_color, hover_color=self.gemini_button_hover_color)
         self.preview_with_gemini_button.grid(row=0, column=1, padx=(5,0), pady=5, sticky="ew")
+
+        self.undo_organization_button = ctk.CTkButton(preview_buttons_frame, text="↩️ Desfazer Última Organização", command=self.undo_last_organization, state="disabled", font=self.medium_font, fg_color=self.primary_color, hover_color="#2980b9")
+        self.undo_organization_button.grid(row=1, column=0, columnspan=2, pady=5, sticky="ew")
         
         # --- Progress Bar and Label ---
         self.progress_bar = ctk.CTkProgressBar(
@@ -143,6 +180,8 @@ class App(ctk.CTk):
         self.log_textbox.grid(row=1, column=0, padx=30, pady=10, sticky="nsew")
         self.log_textbox.insert("end", "Bem-vindo ao DocuSmart!\nFaça login para começar.\n")
         self.log_textbox.configure(state="disabled")
+        self.ui_bus = ui_bus.UiUpdateBus()
+        self.after(ui_bus.DEFAULT_FRAME_INTERVAL_MS, self._drain_ui_bus)
 
         # --- User State ---
         self.user_session = None # Holds the Supabase session object
@@ -150,12 +189,15 @@ class App(ctk.CTk):
         self.user_credits_remaining = 0
         self.user_credits_total = 0
 
+        startup_timer.mark("main_window")
         self.after(50, self.show_login_window)
 
     def show_login_window(self):
         """Displays the modal login window."""
         login_win = LoginWindow(self)
         login_win.grab_set() 
+        startup_timer.mark("login_window")
+        startup_timer.report()
 
     def show_main_application_ui(self):
         """Makes the main application window visible and updates UI elements after a successful login."""
@@ -171,41 +213,79 @@ class App(ctk.CTk):
             self.log_message("Créditos para IA Gemini esgotados ou não disponíveis.")
         self._update_preview_button_states()
         self.update_idletasks()
+        organizer.preload_sbert_model(on_done=lambda elapsed, error: self.after(0, self._on_sbert_model_loaded, elapsed, error))
 
-    def log_message(self, message):
-        """Appends a message to the log textbox in a thread-safe manner.
+    def _on_sbert_model_loaded(self, elapsed, error_message):
+        """Logs the outcome of the background SBERT model load started after login.
 
         Args:
-            message (str): The message to be logged.
+            elapsed (float): How long the load took, in seconds.
+            error_message (str or None): The error message, or None if the model loaded successfully.
         """
-        is_scrolled_to_bottom = self.log_textbox.yview()[1] >= 1.0
+        if error_message:
+            self.log_message(f"Modelo local indisponível: {error_message}")
+        else:
+            self.log_message(f"Modelo local pronto ({elapsed:.1f}s).")
 
-        self.log_textbox.configure(state="normal")
-        self.log_textbox.insert("end", f"{message}\n\n")
+    def log_message(self, message):
+        """Queues a message for the log textbox. Safe to call from any thread.
 
-        if is_scrolled_to_bottom:
-            self.log_textbox.see("end")
+        The message is written on the next UI frame by `_drain_ui_bus`, together with
+        every other message queued since the previous frame.
 
-        self.log_textbox.configure(state="disabled")
-        self.update_idletasks()
+        Args:
+            message (str): The message to be logged.
+        """
+        self.ui_bus.push_log(message)
 
     def update_progress(self, current_val=None, total_val=None, message=None):
         """Thread-safe method to update the progress bar and label from other threads.
 
+        Updates are coalesced: only the latest one received before the next UI frame is shown.
+
         Args:
             current_val (int, optional): The current progress value.
             total_val (int, optional): The total value for progress calculation.
             message (str, optional): A message to display. If provided, the progress bar
                                     is set to indeterminate mode.
         """
-        self.after(10, lambda: self._update_progress_ui(current_val, total_val, message))
+        self.ui_bus.push_progress(current_val, total_val, message)
+
+    def _drain_ui_bus(self):
+        """Applies the log lines and the latest progress update queued in the UI bus, then schedules the next frame."""
+        try:
+            log_lines, dropped_log_lines, progress = self.ui_bus.drain()
+            if dropped_log_lines:
+                log_lines.insert(0, f"({dropped_log_lines} mensagem(ns) omitida(s))")
+            if log_lines:
+                self._append_log_lines(log_lines)
+            if progress:
+                self._update_progress_ui(*progress)
+        finally:
+            self.after(ui_bus.DEFAULT_FRAME_INTERVAL_MS, self._drain_ui_bus)
+
+    def _append_log_lines(self, log_lines):
+        """Inserts log lines in the log textbox in one go, keeping at most `MAX_LOG_LINES` lines."""
+        is_scrolled_to_bottom = self.log_textbox.yview()[1] >= 1.0
+
+        self.log_textbox.configure(state="normal")
+        self.log_textbox.insert("end", "".join(f"{line}\n\n" for line in log_lines))
+        excess_lines = int(self.log_textbox.index("end-1c").split(".")[0]) - MAX_LOG_LINES
+        if excess_lines > 0:
+            self.log_textbox.delete("1.0", f"{excess_lines + 1}.0")
+
+        if is_scrolled_to_bottom:
+            self.log_textbox.see("end")
+
+        self.log_textbox.configure(state="disabled")
 
     def _update_progress_ui(self, current_val, total_val, message):
         """Internal method that performs the actual UI update for the progress bar.
-        This method should only be called via `self.after` to ensure it runs on the main UI thread.
+        This method should only be called from the main UI thread (see `_drain_ui_bus`).
         """
         if message:
-            self.progress_bar.configure(mode="indeterminate")
+            if self.progress_bar.cget("mode") != "indeterminate":
+                self.progress_bar.configure(mode="indeterminate")
             self.progress_bar.start()
             self.progress_label.configure(text=message)
         elif current_val is not None and total_val is not None and total_val > 0:
@@ -214,7 +294,6 @@ class App(ctk.CTk):
             progress_value = current_val / total_val
             self.progress_bar.set(progress_value)
             self.progress_label.configure(text=f"Progresso geral: {current_val}/{total_val} arquivos...")
-        self.update_idletasks()
 
     def select_folder(self):
         """Opens a dialog for the user to select a folder and updates the UI accordingly."""
@@ -223,6 +302,7 @@ class App(ctk.CTk):
             self.selected_folder_path.configure(text=f"Pasta selecionada: {folder_selected}")
             self.folder_to_organize = folder_selected
             self.log_message(f"Pasta '{folder_selected}' selecionada com sucesso.")
+            self._offer_interrupted_run_recovery(folder_selected)
         else:
             self.selected_folder_path.configure(text="Nenhuma pasta selecionada.")
             self.folder_to_organize = None 
@@ -289,7 +369,7 @@ class App(ctk.CTk):
 
         self.preview_with_local_button.configure(state="disabled")
         self.preview_with_gemini_button.configure(state="disabled")
-        self.select_folder_button.configure(state="disabled"); self.manage_categories_button.configure(state="disabled")
+        self.select_folder_button.configure(state="disabled"); self.manage_categories_button.configure(state="disabled"); self.undo_organization_button.configure(state="disabled")
         self.progress_bar.grid()
         self.progress_label.grid()
         self.progress_bar.set(0)
@@ -311,13 +391,19 @@ class App(ctk.CTk):
             use_gemini_decision (bool): Whether to use the Gemini AI for classification.
             available_credits_to_gemini (int): The number of credits available for the simulation.
         """
-        files_info, structure_info, gemini_calls_count = organizer.simulate_organization(
-            folder_path=self.folder_to_organize, 
-            categories_dict=self.current_categories, 
-            progress_callback=self.update_progress,
-            use_gemini=use_gemini_decision,
-            available_credits_for_simulation=available_credits_to_gemini
-        )
+        try:
+            files_info, structure_info, gemini_calls_count = organizer.simulate_organization(
+                folder_path=self.folder_to_organize, 
+                categories_dict=self.current_categories, 
+                progress_callback=self.update_progress,
+                use_gemini=use_gemini_decision,
+                available_credits_for_simulation=available_credits_to_gemini,
+                parallel=True
+            )
+        except RuntimeError as e:
+            self.log_message(f"Erro na simulação: {e}")
+            files_info, structure_info, gemini_calls_count = [], {}, 0
+        self.ui_bus.discard_progress()
         self.after(0, lambda: self._post_simulation_ui_update(files_info, structure_info, gemini_calls_count))
 
     def _post_simulation_ui_update(self, files_info, structure_info, gemini_calls_count):
@@ -364,6 +450,7 @@ class App(ctk.CTk):
             self.manage_categories_button.configure(state="normal")
             if folder_is_selected:
                 self.preview_with_local_button.configure(state="normal")
+                self.undo_organization_button.configure(state="normal" if plan_executor.has_undoable_run(self.folder_to_organize) else "disabled")
                 if self.user_credits_remaining > 0: 
                     self.preview_with_gemini_button.configure(state="normal")
                 else:
@@ -371,9 +458,11 @@ class App(ctk.CTk):
             else:
                 self.preview_with_local_button.configure(state="disabled")
                 self.preview_with_gemini_button.configure(state="disabled")
+                self.undo_organization_button.configure(state="disabled")
         else: 
             self.select_folder_button.configure(state="disabled")
             self.manage_categories_button.configure(state="disabled")
+            self.undo_organization_button.configure(state="disabled")
             self.preview_with_local_button.configure(state="disabled")
             self.preview_with_gemini_button.configure(state="disabled")
 
@@ -392,6 +481,7 @@ class App(ctk.CTk):
             self.preview_with_gemini_button.configure(state="disabled")
             self.select_folder_button.configure(state="disabled")
             self.manage_categories_button.configure(state="disabled")
+            self.undo_organization_button.configure(state="disabled")
             thread_exec = threading.Thread(target=self._execute_organization_real, args=(final_files_info,), daemon=True)
             thread_exec.start()
         else:
@@ -404,43 +494,89 @@ class App(ctk.CTk):
         Args:
             files_info (list): The list of files and their target categories.
         """
-        self.log_message("Iniciando a movimentação dos arquivos...")
+        if len(files_info) == 0:
+            self.after(0, lambda: self.log_message("Nenhum arquivo para mover."))
+            self.after(0, self._update_preview_button_states)
+            return
+        self._run_plan_operation("Iniciando a movimentação dos arquivos...", lambda progress_callback, log_callback:
+                                 plan_executor.execute_plan(self.folder_to_organize, files_info,
+                                                            progress_callback=progress_callback, log_callback=log_callback))
+
+    def _offer_interrupted_run_recovery(self, folder_path):
+        """Offers to resume or undo an organization of `folder_path` that was interrupted.
+
+        Args:
+            folder_path (str): The selected folder.
+        """
+        try:
+            interrupted_journals = plan_executor.find_interrupted_journals(folder_path)
+        except OSError as e:
+            self.log_message(f"Não foi possível verificar organizações interrompidas: {e}")
+            return
+        if not interrupted_journals: return
+        journal_path = interrupted_journals[0]
+        msg = CTkMessagebox.CTkMessagebox(master=self, title="Organização Interrompida",
+                                          message="A última organização desta pasta não foi concluída.\n"
+                                                  "Deseja retomá-la ou desfazer o que já foi movido?",
+                                          icon="question", option_1="Ignorar", option_2="Desfazer", option_3="Retomar")
+        choice = msg.get()
+        if choice not in ("Desfazer", "Retomar"): return
+        self.preview_with_local_button.configure(state="disabled")
+        self.preview_with_gemini_button.configure(state="disabled")
+        self.select_folder_button.configure(state="disabled")
+        self.manage_categories_button.configure(state="disabled")
+        self.undo_organization_button.configure(state="disabled")
+        if choice == "Retomar":
+            operation = lambda progress_callback, log_callback: plan_executor.resume_plan(
+                journal_path, progress_callback=progress_callback, log_callback=log_callback)
+        else:
+            operation = lambda progress_callback, log_callback: plan_executor.undo_plan(
+                journal_path, progress_callback=progress_callback, log_callback=log_callback)
+        threading.Thread(target=self._run_plan_operation, args=("Recuperando a organização interrompida...", operation), daemon=True).start()
+
+    def undo_last_organization(self):
+        """Asks for confirmation and moves the files of the last organization of the selected folder back."""
+        if not getattr(self, 'folder_to_organize', None): return
+        msg = CTkMessagebox.CTkMessagebox(master=self, title="Desfazer Organização",
+                                          message="Os arquivos movidos pela última organização desta pasta voltarão aos seus locais originais.\n\nDeseja continuar?",
+                                          icon="question", option_1="Cancelar", option_2="Desfazer")
+        if msg.get() != "Desfazer": return
+        self.preview_with_local_button.configure(state="disabled")
+        self.preview_with_gemini_button.configure(state="disabled")
+        self.select_folder_button.configure(state="disabled")
+        self.manage_categories_button.configure(state="disabled")
+        self.undo_organization_button.configure(state="disabled")
+        folder_path = self.folder_to_organize
+        operation = lambda progress_callback, log_callback: plan_executor.rollback_last(
+            folder_path, progress_callback=progress_callback, log_callback=log_callback)
+        threading.Thread(target=self._run_plan_operation, args=("Desfazendo a última organização...", operation, "Organização desfeita."), daemon=True).start()
+
+    def _run_plan_operation(self, start_message, operation, done_message="Organização finalizada com sucesso!"):
+        """Runs a `plan_executor` operation (execute, resume or undo) from a worker thread.
+
+        Args:
+            start_message (str): The message logged before starting.
+            operation (function): Called with `progress_callback` and `log_callback`; returns the summary
+                dict, or None if there was nothing to do (the operation logs why).
+            done_message (str, optional): The message logged when no file failed.
+        """
+        self.log_message(start_message)
         self.after(0, lambda: self.progress_bar.grid())
         self.after(0, lambda: self.progress_label.grid())
         self.after(0, lambda: self.progress_bar.set(0))
         self.after(0, lambda: self.progress_label.configure(text="Movendo arquivos..."))
-        total_files_to_move = len(files_info)
-        if total_files_to_move == 0:
-            self.after(0, lambda: self.log_message("Nenhum arquivo para mover."))
-            self.after(0, lambda: self.progress_bar.grid_remove())
-            self.after(0, lambda: self.progress_label.grid_remove())
-            self.after(0, self._update_preview_button_states)
-            return
-        for i, file_data_tuple in enumerate(files_info):
-            filename, classified_category, _, _ = file_data_tuple 
-            
-            self.update_progress(message=f"Movendo '{filename}'...")
-
-            original_file_path = os.path.join(self.folder_to_organize, filename)
-            if classified_category == "Outros (Não processável)": 
-                self.after(0, lambda f=filename: self.log_message(f"Pulando '{f}' (Não processável)."))
-                self.update_progress(current_val=i + 1, total_val=total_files_to_move); continue 
-            target_category_path = os.path.join(self.folder_to_organize, classified_category)
-            if not os.path.exists(target_category_path):
-                try: os.makedirs(target_category_path); self.after(0, lambda tc=target_category_path: self.log_message(f"Criando pasta: '{tc}'")) 
-                except OSError as e: self.after(0, lambda tc=target_category_path, err=str(e): self.log_message(f"Erro ao criar pasta '{tc}': {err}")); self.update_progress(current_val=i + 1, total_val=total_files_to_move); continue
-            try:
-                target_file_path = os.path.join(target_category_path, filename)
-                if os.path.exists(target_file_path):
-                    base, ext = os.path.splitext(filename); count = 1; new_filename = filename
-                    while os.path.exists(target_file_path): new_filename = f"{base}_{count}{ext}"; target_file_path = os.path.join(target_category_path, new_filename); count += 1
-                    self.after(0, lambda fn=filename, nfn=os.path.basename(target_file_path) : self.log_message(f"Arquivo '{fn}' já existe. Renomeando para '{nfn}'."))
-                shutil.move(original_file_path, target_file_path)
-                self.after(0, lambda fn=os.path.basename(original_file_path), cc=classified_category: self.log_message(f"Arquivo '{fn}' movido para '{cc}'."))
-            except Exception as e: self.after(0, lambda fn=filename, err=str(e): self.log_message(f"Erro ao mover '{fn}': {err}"))
-            self.update_progress(current_val=i + 1, total_val=total_files_to_move)
-
-        self.after(0, lambda: self.log_message("Organização finalizada com sucesso!"))
+        try:
+            summary = operation(self.update_progress, self.log_message)
+            if summary is None:
+                pass
+            elif summary["failed"]:
+                self.log_message(f"AVISO: {summary['failed']} arquivo(s) não puderam ser movidos.")
+            else:
+                self.log_message(done_message)
+        except Exception as e:
+            self.log_message(f"Erro ao mover arquivos: {e}")
+        self.ui_bus.discard_progress()
+
         self.after(0, lambda: self.progress_bar.grid_remove())
         self.after(0, lambda: self.progress_label.grid_remove())
         self.after(0, lambda: self.progress_bar.set(0))
@@ -478,21 +614,27 @@ class App(ctk.CTk):
         """Opens the category management window."""
         self.select_folder_button.configure(state="disabled")
         self.manage_categories_button.configure(state="disabled")
+        self.undo_organization_button.configure(state="disabled")
         self.preview_with_local_button.configure(state="disabled")
         self.preview_with_gemini_button.configure(state="disabled")
         category_manager_window = CategoryManager(self)
         category_manager_window.grab_set()
     
-    def handle_category_manager_close(self, updated_categories):
+    def handle_category_manager_close(self, updated_categories, changed_categories=None):
         """Callback method for the `CategoryManager` window.
 
-        Updates the application's current categories if changes were saved.
+        Updates the application's current categories if changes were saved. Categories
+        whose description changed get their embeddings computed in the background, so
+        the next local preview finds them in the persistent cache.
 
         Args:
             updated_categories (dict or None): The updated dictionary of categories, or None if cancelled.
+            changed_categories (dict, optional): The new or edited categories and their descriptions.
         """
         if updated_categories is not None: self.current_categories = updated_categories; self.log_message("Categorias atualizadas.")
         else: self.log_message("Gerenciamento de categorias cancelado.")
+        if changed_categories:
+            threading.Thread(target=organizer.get_category_embeddings, args=(changed_categories,), daemon=True).start()
         self._update_preview_button_states()
 
 
@@ -1026,8 +1168,10 @@ class CategoryManager(ctk.CTkToplevel):
             if essential_cat not in temp_categories:
                 temp_categories[essential_cat] = self.master.default_categories.get(essential_cat, "")
 
+        changed_categories = {name: desc for name, desc in temp_categories.items() if self.master.current_categories.get(name) != desc}
+
         self.result_categories = temp_categories
-        self.master.handle_category_manager_close(self.result_categories)
+        self.master.handle_category_manager_close(self.result_categories, changed_categories)
         self.destroy()
 
     def _cancel_and_close(self):
@@ -1042,7 +1186,14 @@ class OrganizationPreview(ctk.CTkToplevel):
     This window shows the user which files will be moved into which category folders.
     It allows the user to modify the classification for individual files before
     confirming or canceling the entire operation.
+
+    The list is virtualized: a fixed number of row widgets is created once and reused
+    to show whichever rows are scrolled into view, so the window opens just as fast for
+    thousands of files as for a few.
     """
+    VISIBLE_ROWS = 16
+    ROW_HEIGHT = 34
+
     def __init__(self, master, files_info, structure_info, available_categories):
         """Initializes the preview window."""
         super().__init__(master)
@@ -1085,10 +1236,22 @@ class OrganizationPreview(ctk.CTkToplevel):
         ctk.CTkLabel(self, text="Verifique a prévia da organização antes de confirmar:", font=self.big_font, text_color=self.text_color).grid(row=0, column=0, padx=20, pady=10, sticky="w")
 
         # --- Preview Content Frame ---
-        self.preview_frame = ctk.CTkScrollableFrame(self, fg_color=self.frame_color, corner_radius=10)
+        self.preview_frame = ctk.CTkFrame(self, fg_color=self.frame_color, corner_radius=10)
         self.preview_frame.grid(row=1, column=0, padx=20, pady=10, sticky="nsew")
-        self.preview_frame.grid_columnconfigure(0, weight=1) 
+        self.preview_frame.grid_columnconfigure(0, weight=1)
+        ctk.CTkLabel(self.preview_frame, text="Estrutura de Pastas e Conteúdo Estimado:", font=self.medium_font, text_color=self.text_color).grid(row=0, column=0, padx=10, pady=5, sticky="w")
+        self.preview_scrollbar = ctk.CTkScrollbar(self.preview_frame, command=self._on_scrollbar)
+        self.preview_scrollbar.grid(row=1, column=1, rowspan=self.VISIBLE_ROWS, padx=(0, 5), pady=5, sticky="ns")
+        self.first_visible_row = 0
+        # Category of each file when the window opened, to mark the files edited since
+        self.original_categories = {file_data[0]: file_data[1] for file_data in self.files_info}
+        self._build_rows()
+        self._create_row_widgets()
         self._display_preview_content()
+        for sequence in ("<MouseWheel>", "<Button-4>", "<Button-5>"):
+            self.bind(sequence, self._on_mouse_wheel)
+        self.bind("<Prior>", lambda event: self._scroll_to(self.first_visible_row - self.VISIBLE_ROWS))
+        self.bind("<Next>", lambda event: self._scroll_to(self.first_visible_row + self.VISIBLE_ROWS))
 
         # --- Action Buttons ---
         self.action_buttons_frame = ctk.CTkFrame(self, fg_color="transparent")
@@ -1098,51 +1261,119 @@ class OrganizationPreview(ctk.CTkToplevel):
         self.confirm_button.grid(row=0, column=0, padx=10, pady=10, sticky="ew")
         self.cancel_button = ctk.CTkButton(self.action_buttons_frame, text="❌ Cancelar", command=self._cancel_organization, font=self.big_font, fg_color=self.cancel_color, hover_color="#c0392b")
         self.cancel_button.grid(row=0, column=1, padx=10, pady=10, sticky="ew")
+        duplicate_count = sum(1 for file_data in self.files_info if getattr(file_data, "duplicate_of", None))
+        if duplicate_count:
+            self.duplicates_folder_var = ctk.BooleanVar(value=any(file_data[1] == organizer.DUPLICATES_CATEGORY for file_data in self.files_info))
+            ctk.CTkCheckBox(self.action_buttons_frame, text=f"Mover as {duplicate_count} cópia(s) idêntica(s) para a pasta '{organizer.DUPLICATES_CATEGORY}'",
+                            variable=self.duplicates_folder_var, command=self._toggle_duplicates_folder,
+                            font=self.small_font, text_color=self.text_color).grid(row=1, column=0, columnspan=2, padx=10, pady=(0, 5), sticky="w")
         self.protocol("WM_DELETE_WINDOW", self._cancel_organization)
 
-    def _rebuild_structure_info(self):
-        """Rebuilds the `structure_info` dictionary based on the current `files_info` list."""
-        new_structure_info = {cat: [] for cat in self.master.current_categories.keys()}
-        if any(fi[1] == "Outros (Não processável)" for fi in self.files_info) and "Outros (Não processável)" not in new_structure_info:
-            new_structure_info["Outros (Não processável)"] = []
-        for filename, category, _, _ in self.files_info: 
-            if category not in new_structure_info: new_structure_info[category] = []
-            new_structure_info[category].append(filename)
-        self.structure_info = new_structure_info
+    def _build_rows(self):
+        """Builds the flat list of rows shown by the preview: one header per category, then its files.
+
+        Rows are `("header", category)`, `("file", index in files_info)` or `("empty", category)`.
+        Files are listed under their current category, so the header counts always match
+        the rows shown; files whose category was changed are marked on their row.
+        """
+        files_by_category = {}
+        for index, (_, category, _, _) in enumerate(self.files_info):
+            files_by_category.setdefault(category, []).append(index)
+        self.category_counts = {category: len(indexes) for category, indexes in files_by_category.items()}
+        self.file_indexes = {file_data[0]: index for index, file_data in enumerate(self.files_info)}
 
-    def _display_preview_content(self):
-        """Clears and redraws the content of the preview frame."""
-        for widget in self.preview_frame.winfo_children(): widget.destroy()
-        row_idx = 0
-        ctk.CTkLabel(self.preview_frame, text="Estrutura de Pastas e Conteúdo Estimado:", font=self.medium_font, text_color=self.text_color).grid(row=row_idx, column=0, columnspan=2, padx=5, pady=5, sticky="w")
-        row_idx += 1
-        self._rebuild_structure_info()
         sorted_category_keys = list(self.master.current_categories.keys())
-        if "Outros (Não processável)" in self.structure_info and "Outros (Não processável)" not in sorted_category_keys: sorted_category_keys.append("Outros (Não processável)")
+        sorted_category_keys += [category for category in files_by_category if category not in self.master.current_categories]
+        self.rows = []
         for category in sorted_category_keys:
-            if category not in self.structure_info: continue 
-            files_in_category = self.structure_info.get(category, [])
-            ctk.CTkLabel(self.preview_frame, text=f"📂 {category}/", font=self.medium_font, text_color=self.primary_color).grid(row=row_idx, column=0, columnspan=2, padx=15, pady=(5,2), sticky="w")
-            row_idx += 1
-            if files_in_category:
-                for file_name in files_in_category:
-                    file_label_frame = ctk.CTkFrame(self.preview_frame, fg_color="transparent")
-                    file_label_frame.grid(row=row_idx, column=0, columnspan=2, sticky="ew", padx=15) 
-                    file_label_frame.grid_columnconfigure(0, weight=1)
-                    file_label_frame.grid_columnconfigure(1, weight=0) 
-                    file_display_text = f"📄 {file_name}"
-                    text_color_for_file = self.text_color
-                    is_unprocessed = (category == "Outros (Não processável)")
-                    if is_unprocessed: file_display_text = f"🚫 {file_name}"; text_color_for_file = "orange"
-                    ctk.CTkLabel(file_label_frame, text=file_display_text, font=self.small_font, text_color=text_color_for_file).grid(row=0, column=0, pady=1, sticky="w")
-                    if not is_unprocessed:
-                        button_font = self.master.small_font; new_button_width = 100; new_button_height = 28 
-                        modify_button = ctk.CTkButton(file_label_frame, text="Modificar", command=lambda fn=file_name, cat=category: self._open_modify_dialog(fn, cat), width=new_button_width, height=new_button_height, font=button_font, fg_color="gray60", hover_color="gray50")
-                        modify_button.grid(row=0, column=1, padx=(0, 5), pady=1, sticky="e")
-                    row_idx += 1
+            if category == "Outros (Não processável)" and category not in files_by_category: continue
+            self.rows.append(("header", category))
+            if category in files_by_category:
+                self.rows.extend(("file", index) for index in files_by_category[category])
             else:
-                ctk.CTkLabel(self.preview_frame, text="    (Nenhum arquivo para esta categoria)", font=self.small_italic_font, text_color="gray").grid(row=row_idx, column=0, columnspan=2, padx=30, pady=1, sticky="w")
-                row_idx += 1
+                self.rows.append(("empty", category))
+
+    def _create_row_widgets(self):
+        """Creates the fixed pool of row widgets reused for the visible rows."""
+        self.row_widgets = []
+        for slot in range(self.VISIBLE_ROWS):
+            row_frame = ctk.CTkFrame(self.preview_frame, fg_color="transparent", height=self.ROW_HEIGHT)
+            row_frame.grid(row=slot + 1, column=0, sticky="ew", padx=15)
+            row_frame.grid_propagate(False)
+            row_frame.grid_columnconfigure(0, weight=1)
+            row_frame.grid_columnconfigure(1, weight=0)
+            label = ctk.CTkLabel(row_frame, text="", font=self.small_font, text_color=self.text_color, anchor="w")
+            label.grid(row=0, column=0, pady=1, sticky="w")
+            modify_button = ctk.CTkButton(row_frame, text="Modificar", width=100, height=28, font=self.master.small_font, fg_color="gray60", hover_color="gray50")
+            modify_button.grid(row=0, column=1, padx=(0, 5), pady=1, sticky="e")
+            self.row_widgets.append((label, modify_button))
+
+    def _display_preview_content(self):
+        """Shows the rows scrolled into view in the row widgets and updates the scrollbar."""
+        for slot, (label, modify_button) in enumerate(self.row_widgets):
+            row_idx = self.first_visible_row + slot
+            if row_idx >= len(self.rows):
+                label.configure(text="")
+                modify_button.grid_remove()
+                continue
+            self._render_row(self.rows[row_idx], label, modify_button)
+
+        total_rows = max(len(self.rows), 1)
+        self.preview_scrollbar.set(self.first_visible_row / total_rows,
+                                   min(1.0, (self.first_visible_row + self.VISIBLE_ROWS) / total_rows))
+
+    def _render_row(self, row, label, modify_button):
+        """Fills one row widget with a header, a file or an empty-category placeholder."""
+        kind, value = row
+        if kind == "header":
+            label.configure(text=f"📂 {value}/  ({self.category_counts.get(value, 0)})", font=self.medium_font, text_color=self.primary_color)
+            label.grid_configure(padx=0)
+            modify_button.grid_remove()
+        elif kind == "empty":
+            label.configure(text="(Nenhum arquivo para esta categoria)", font=self.small_italic_font, text_color="gray")
+            label.grid_configure(padx=15)
+            modify_button.grid_remove()
+        else:
+            file_name, category, _, _ = self.files_info[value]
+            label.grid_configure(padx=0)
+            if category == "Outros (Não processável)":
+                label.configure(text=f"🚫 {file_name}", font=self.small_font, text_color="orange")
+                modify_button.grid_remove()
+                return
+            if getattr(self.files_info[value], "duplicate_of", None) and self.files_info[value].method == organizer.DUPLICATE_METHOD:
+                # Copies moved in or out of the duplicates folder by the checkbox are not edits
+                label.configure(text=f"📑 {file_name}  (cópia de '{self.files_info[value].duplicate_of}')", font=self.small_font, text_color="gray")
+            elif category != self.original_categories.get(file_name, category):
+                label.configure(text=f"✏️ {file_name}  (antes em {self.original_categories[file_name]}/)", font=self.small_font, text_color=self.primary_color)
+            else:
+                label.configure(text=f"📄 {file_name}", font=self.small_font, text_color=self.text_color)
+            modify_button.configure(command=lambda fn=file_name: self._open_modify_dialog(fn, self.files_info[self.file_indexes[fn]][1]))
+            modify_button.grid()
+
+    def _scroll_to(self, first_row):
+        """Scrolls the list so that `first_row` is the top visible row."""
+        first_row = max(0, min(int(first_row), len(self.rows) - self.VISIBLE_ROWS))
+        if first_row != self.first_visible_row:
+            self.first_visible_row = first_row
+            self._display_preview_content()
+
+    def _on_scrollbar(self, action, value, unit=None):
+        """Handles the scrollbar's `moveto` and `scroll` commands."""
+        if action == "moveto":
+            self._scroll_to(round(float(value) * len(self.rows)))
+        else:
+            step = self.VISIBLE_ROWS if unit == "pages" else 1
+            self._scroll_to(self.first_visible_row + int(value) * step)
+
+    def _on_mouse_wheel(self, event):
+        """Scrolls the list with the mouse wheel (three rows per notch)."""
+        if sys.platform.startswith("win"):
+            delta = -int(event.delta / 40)
+        elif sys.platform == "darwin":
+            delta = -event.delta
+        else:
+            delta = -1 if event.num == 4 else 1
+        self._scroll_to(self.first_visible_row + 3 * (1 if delta > 0 else -1 if delta < 0 else 0))
 
     def _open_modify_dialog(self, filename, current_category):
         """Opens the `ModifyCategory` dialog for a specific file.
@@ -1156,21 +1387,30 @@ class OrganizationPreview(ctk.CTkToplevel):
         modify_window.grab_set()
 
     def handle_modify_category_close(self, original_filename, new_category):
-        """Callback for the `ModifyCategory` dialog. Updates the file's category and redraws the preview.
+        """Callback for the `ModifyCategory` dialog. Updates the file's category and moves its row under the new category.
 
         Args:
             original_filename (str): The name of the file that was modified.
             new_category (str or None): The new category selected by the user, or None if cancelled.
         """
-        if new_category is not None: 
-            for i, file_data in enumerate(self.files_info):
-                fn, current_cat_before_modify, dates, original_method = file_data 
-                if fn == original_filename:
-                    method_to_set = "manual_override" if new_category != current_cat_before_modify else original_method
-                    self.files_info[i] = (fn, new_category, dates, method_to_set) 
-                    self.master.log_message(f"Categoria de '{fn}' alterada manualmente para '{new_category}'.")
-                    break
-            self._display_preview_content()
+        if new_category is None or original_filename not in self.file_indexes: return
+        i = self.file_indexes[original_filename]
+        fn, current_cat_before_modify, dates, original_method = self.files_info[i]
+        method_to_set = "manual_override" if new_category != current_cat_before_modify else original_method
+        self.files_info[i] = self.files_info[i]._replace(category=new_category, method=method_to_set)
+        self.master.log_message(f"Categoria de '{fn}' alterada manualmente para '{new_category}'.")
+        self._refresh_rows()
+
+    def _refresh_rows(self):
+        """Rebuilds the rows after the plan changed, keeping the scroll position where possible."""
+        self._build_rows()
+        self.first_visible_row = max(0, min(self.first_visible_row, len(self.rows) - self.VISIBLE_ROWS))
+        self._display_preview_content()
+
+    def _toggle_duplicates_folder(self):
+        """Moves the identical copies to the duplicates folder, or back to the category of the file they copy."""
+        self.files_info = organizer.route_duplicates(self.files_info, self.duplicates_folder_var.get())
+        self._refresh_rows()
 
     def _confirm_organization(self):
         """Confirms the organization plan and closes the preview window."""
@@ -1269,6 +1509,8 @@ class ModifyCategory(ctk.CTkToplevel):
 
 if __name__ == "__main__":
     # --- Application Entry Point ---
+    # Required by the extraction process pool when running as a PyInstaller executable
+    multiprocessing.freeze_support()
     ctk.set_appearance_mode("System")
     ctk.set_default_color_theme("blue")
     try:
@@ -0,0 +1,469 @@
+"""Headless command-line entry point of DocuSmart, for unattended batch runs.
+
+Scans a folder, classifies its files (with the local model or the Gemini AI), writes
+the organization plan as JSON or CSV and, optionally, applies it. Nothing here depends
+on Tk, so it runs on servers without a display.
+
+Examples:
+    python docusmart_cli.py /data/inbox --output plano.json
+    python docusmart_cli.py /data/inbox --gemini --recursive --output plano.csv --apply --progress
+    python docusmart_cli.py /data/inbox --from-plan plano.json --apply
+    python docusmart_cli.py /data/inbox --resume
+    python docusmart_cli.py /data/inbox --undo
+    python docusmart_cli.py /data/inbox --output plano.json --timings tempos.json --trace trace.json
+    python docusmart_cli.py /data/inbox --watch --apply --gemini
+
+Gemini mode logs in with the DOCUSMART_EMAIL and DOCUSMART_PASSWORD environment
+variables and deducts the credits used, like the GUI does.
+
+With `--watch`, the folder is monitored until interrupted (Ctrl+C): the files that
+arrive or change are classified as they settle and, with `--apply`, moved right away.
+
+With `--progress`, progress is written to stdout as JSON lines (one object per event);
+every human-readable message goes to stderr, including the ones printed by the
+extraction worker processes and by Tesseract.
+
+Exit codes:
+    0: success.
+    1: unexpected error.
+    2: invalid arguments.
+    3: folder or plan file not found.
+    4: login failed or Gemini credits unavailable.
+    5: some files could not be moved (applying, resuming or undoing a plan).
+"""
+
+import argparse
+import contextlib
+import csv
+import json
+import multiprocessing
+import os
+import sys
+
+# The startup checks of `config` print to stdout, which is kept for the machine-readable output
+with contextlib.redirect_stdout(sys.stderr):
+    import config
+    import folder_watch
+    import instrumentation
+    import organizer
+    import plan_executor
+
+EXIT_OK = 0
+EXIT_ERROR = 1
+EXIT_USAGE = 2
+EXIT_NOT_FOUND = 3
+EXIT_AUTH = 4
+EXIT_MOVE_FAILED = 5
+
+PLAN_FIELDS = ("file", "category", "date", "method")
+
+
+class _ProgressStream:
+    """Writes progress events as JSON lines to a stream (or discards them)."""
+    def __init__(self, stream=None):
+        self.stream = stream
+        self.stage = None
+
+    def emit(self, event, **fields):
+        if self.stream is None: return
+        self.stream.write(json.dumps({"event": event, **fields}, ensure_ascii=False) + "\n")
+        self.stream.flush()
+
+    def callback(self, current_val=None, total_val=None, message=None):
+        """A `progress_callback` for `simulate_organization` and `execute_plan`."""
+        self.emit("progress", stage=self.stage, current=current_val, total=total_val, message=message)
+
+
+def build_parser():
+    """Builds the command-line argument parser.
+
+    Returns:
+        argparse.ArgumentParser: The parser.
+    """
+    parser = argparse.ArgumentParser(
+        prog="docusmart_cli",
+        description="Classifica os arquivos de uma pasta e gera (e opcionalmente aplica) um plano de organização.")
+    parser.add_argument("folder", help="Pasta a organizar.")
+    parser.add_argument("-o", "--output", help="Arquivo do plano (.json ou .csv). Use '-' para a saída padrão.")
+    parser.add_argument("--format", choices=("json", "csv"), help="Formato do plano. Padrão: pela extensão de --output, ou json.")
+    parser.add_argument("--categories", help="Arquivo JSON com as categorias ({nome: descrição}). Padrão: categorias embutidas.")
+    parser.add_argument("--from-plan", help="Usa um plano já gerado (JSON ou CSV) em vez de classificar a pasta.")
+    parser.add_argument("--apply", action="store_true", help="Move os arquivos para as pastas das categorias.")
+    parser.add_argument("--resume", action="store_true", help="Conclui as organizações desta pasta que foram interrompidas.")
+    parser.add_argument("--watch", action="store_true",
+                        help="Monitora a pasta até ser interrompido, classificando (e, com --apply, movendo) os arquivos que chegam.")
+    parser.add_argument("--poll-interval", type=float, default=folder_watch.DEFAULT_POLL_INTERVAL, metavar="SEGUNDOS",
+                        help="Com --watch, intervalo entre as verificações da pasta quando o inotify não está disponível.")
+    parser.add_argument("--undo", action="store_true", help="Desfaz a última organização desta pasta, devolvendo os arquivos aos locais originais.")
+    parser.add_argument("--force", action="store_true", help="Com --undo, devolve também os arquivos modificados depois da organização.")
+    parser.add_argument("--gemini", action="store_true", help="Classifica com a IA Gemini (requer login e créditos).")
+    parser.add_argument("--max-credits", type=int, help="Limite de créditos Gemini usados nesta execução.")
+    parser.add_argument("-r", "--recursive", action="store_true", help="Inclui os arquivos das subpastas.")
+    parser.add_argument("--include", action="append", metavar="GLOB", help="Classifica apenas os arquivos que casam com o padrão (repetível).")
+    parser.add_argument("--exclude", action="append", metavar="GLOB", help="Ignora arquivos e pastas que casam com o padrão (repetível).")
+    parser.add_argument("--duplicates-folder", action="store_true",
+                        help=f"Move as cópias idênticas de um arquivo para a pasta '{organizer.DUPLICATES_CATEGORY}' em vez da categoria do original.")
+    parser.add_argument("--no-near-duplicates", action="store_true",
+                        help="Com --gemini, não reaproveita a categoria de documentos quase idênticos já classificados pela IA.")
+    parser.add_argument("--sequential", action="store_true", help="Processa um arquivo por vez em vez de usar o pipeline paralelo.")
+    parser.add_argument("--hash-workers", type=int, default=organizer.DEFAULT_HASH_WORKERS)
+    parser.add_argument("--extraction-workers", type=int, default=organizer.DEFAULT_EXTRACTION_WORKERS)
+    parser.add_argument("--edge-workers", type=int, default=organizer.DEFAULT_EDGE_WORKERS)
+    parser.add_argument("--move-workers", type=int, default=plan_executor.DEFAULT_MOVE_WORKERS)
+    parser.add_argument("--timings", metavar="ARQUIVO", help="Salva os tempos por estágio e por arquivo da classificação (JSON).")
+    parser.add_argument("--trace", metavar="ARQUIVO", help="Salva os tempos da classificação no formato Chrome trace (chrome://tracing, Perfetto).")
+    parser.add_argument("--progress", action="store_true", help="Escreve o progresso na saída padrão como linhas JSON.")
+    parser.add_argument("-q", "--quiet", action="store_true", help="Suprime as mensagens informativas.")
+    return parser
+
+
+def load_categories(path):
+    """Loads a `{name: description}` categories file.
+
+    Args:
+        path (str): The JSON file.
+
+    Returns:
+        dict: The categories.
+
+    Raises:
+        OSError: If the file cannot be read.
+        ValueError: If the file does not hold a JSON object of strings.
+    """
+    with open(path, "r", encoding="utf-8") as f:
+        try:
+            categories = json.load(f)
+        except json.JSONDecodeError as e:
+            raise ValueError(f"o arquivo de categorias não é um JSON válido ({e}).") from e
+    if not isinstance(categories, dict) or not all(isinstance(v, str) for v in categories.values()):
+        raise ValueError("o arquivo de categorias deve conter um objeto JSON {nome: descrição}.")
+    return categories
+
+
+def plan_format(path, explicit_format=None):
+    """Returns 'json' or 'csv' for a plan file, from `explicit_format` or the file extension."""
+    if explicit_format: return explicit_format
+    return "csv" if path and path.lower().endswith(".csv") else "json"
+
+
+def write_plan(files_info, stream, fmt, folder_path, gemini_calls=0):
+    """Writes an organization plan.
+
+    JSON plans also record the seconds spent on each file per stage, when known, and
+    the file each identical copy duplicates.
+
+    Args:
+        files_info (list): The `(filename, category, date, method)` tuples (or `organizer.PlanEntry`).
+        stream (file): The text stream to write to.
+        fmt (str): 'json' or 'csv'.
+        folder_path (str): The classified folder (recorded in JSON plans).
+        gemini_calls (int, optional): The Gemini calls made (recorded in JSON plans).
+    """
+    if fmt == "csv":
+        writer = csv.writer(stream)
+        writer.writerow(PLAN_FIELDS)
+        writer.writerows(files_info)
+    else:
+        json.dump({"folder": os.path.abspath(folder_path), "gemini_calls": gemini_calls,
+                   "files": [_plan_row(entry) for entry in files_info]},
+                  stream, ensure_ascii=False, indent=2)
+        stream.write("\n")
+
+
+def _plan_row(entry):
+    row = dict(zip(PLAN_FIELDS, entry))
+    if getattr(entry, "duplicate_of", None):
+        row["duplicate_of"] = entry.duplicate_of
+    if getattr(entry, "timings", None):
+        row["timings"] = entry.timings
+    return row
+
+
+def read_plan(path, fmt=None):
+    """Reads a plan written by `write_plan`.
+
+    Args:
+        path (str): The plan file.
+        fmt (str, optional): 'json' or 'csv'. Defaults to the file extension.
+
+    Returns:
+        list: The `(filename, category, date, method)` tuples.
+    """
+    with open(path, "r", encoding="utf-8", newline="") as f:
+        if plan_format(path, fmt) == "csv":
+            rows = list(csv.DictReader(f))
+        else:
+            rows = json.load(f)["files"]
+    return [tuple(row[field] for field in PLAN_FIELDS) for row in rows]
+
+
+def login_from_environment():
+    """Logs in with DOCUSMART_EMAIL / DOCUSMART_PASSWORD and reads the user's credits.
+
+    Returns:
+        tuple: `(user, credits_remaining)`, or `(None, error_message)` if the login failed.
+    """
+    email, password = os.getenv("DOCUSMART_EMAIL"), os.getenv("DOCUSMART_PASSWORD")
+    if not email or not password:
+        return None, "defina DOCUSMART_EMAIL e DOCUSMART_PASSWORD para usar a IA Gemini."
+    if not config.supabase:
+        config.init_supabase()
+    if not config.supabase:
+        return None, "Supabase não configurado (SUPABASE_URL / SUPABASE_KEY)."
+    try:
+        session_response = config.supabase.auth.sign_in_with_password({"email": email, "password": password})
+        user = session_response.user
+        profile_response = config.supabase.table("profiles").select("credits_remaining,is_approved").eq("id", user.id).limit(1).single().execute()
+    except Exception as e:
+        return None, f"falha no login: {str(e).splitlines()[0] if str(e) else e}"
+    if not profile_response.data:
+        return None, "perfil de usuário não encontrado."
+    if not profile_response.data.get("is_approved", False):
+        return None, "a conta ainda está aguardando aprovação."
+    return user, profile_response.data.get("credits_remaining", 0)
+
+
+def deduct_credits(user, credits_used):
+    """Deducts the Gemini credits used from the user's profile, like `App.update_user_credits`.
+
+    Returns:
+        bool: True if the profile was updated.
+    """
+    try:
+        current = config.supabase.table("profiles").select("credits_remaining").eq("id", user.id).single().execute()
+        remaining = max(0, current.data.get("credits_remaining", 0) - credits_used)
+        response = config.supabase.table("profiles").update({"credits_remaining": remaining}).eq("id", user.id).execute()
+    except Exception as e:
+        print(f"Erro ao atualizar créditos: {e}")
+        return False
+    if response.data:
+        print(f"Créditos atualizados. Restantes: {remaining}")
+    return bool(response.data)
+
+
+def resume_interrupted(args, progress):
+    """Finishes every interrupted organization of `args.folder`. Returns the exit code."""
+    journals = plan_executor.find_interrupted_journals(args.folder)
+    if not journals:
+        print("Nenhuma organização interrompida encontrada para esta pasta.")
+        return EXIT_OK
+    failed = 0
+    progress.stage = "move"
+    for journal_path in reversed(journals):
+        summary = plan_executor.resume_plan(journal_path, progress_callback=progress.callback, workers=args.move_workers)
+        progress.emit("resumed", **summary)
+        failed += summary["failed"]
+    return EXIT_MOVE_FAILED if failed else EXIT_OK
+
+
+def watch(args, progress, categories, user, credits):
+    """Watches `args.folder` until interrupted, classifying and, with `--apply`, moving the files that arrive. Returns the exit code."""
+    failed = 0
+
+    def on_plan(files_info, removed, gemini_calls):
+        nonlocal failed
+        if gemini_calls > 0:
+            print(f"Processando dedução de {gemini_calls} créditos pela classificação com IA Gemini...")
+            deduct_credits(user, gemini_calls)
+        if files_info:
+            print(f"Arquivos novos ou alterados classificados: {len(files_info)}, {gemini_calls} chamada(s) à IA Gemini.")
+        progress.emit("plan", files=len(files_info), removed=len(removed), gemini_calls=gemini_calls)
+        if args.apply and files_info:
+            progress.stage = "move"
+            summary = plan_executor.execute_plan(args.folder, files_info, progress_callback=progress.callback,
+                                                   workers=args.move_workers)
+            progress.emit("applied", **summary)
+            print(f"Organização finalizada: {summary['moved']} movido(s), {summary['skipped']} ignorado(s), {summary['failed']} com erro.")
+            failed += summary["failed"]
+        progress.stage = "classify"
+
+    print(f"Monitorando '{args.folder}'. Pressione Ctrl+C para encerrar.")
+    progress.stage = "classify"
+    try:
+        folder_watch.watch_folder(
+            args.folder, categories, on_plan, poll_interval=args.poll_interval, progress_callback=progress.callback,
+            use_gemini=args.gemini, available_credits_for_simulation=credits, parallel=not args.sequential,
+            hash_workers=args.hash_workers, extraction_workers=args.extraction_workers, edge_workers=args.edge_workers,
+            include=args.include, exclude=args.exclude, route_duplicates_apart=args.duplicates_folder,
+            detect_near_duplicates=not args.no_near_duplicates)
+    except KeyboardInterrupt:
+        print("Monitoramento encerrado.")
+    return EXIT_MOVE_FAILED if failed else EXIT_OK
+
+
+def run(args, progress, stdout, categories=None):
+    """Runs the command described by the parsed `args`, writing `--output -` plans to `stdout`. Returns the exit code.
+
+    `categories` are the ones loaded from `--categories`; the built-in ones are used if None.
+    """
+    if not os.path.isdir(args.folder):
+        print(f"Erro: pasta não encontrada: '{args.folder}'")
+        return EXIT_NOT_FOUND
+
+    if args.resume:
+        return resume_interrupted(args, progress)
+    if args.undo:
+        progress.stage = "undo"
+        summary = plan_executor.rollback_last(args.folder, progress_callback=progress.callback,
+                                              workers=args.move_workers, force=args.force)
+        if summary is None: return EXIT_OK
+        progress.emit("undone", **summary)
+        print(f"Organização desfeita: {summary['restored']} arquivo(s) restaurado(s), {summary['missing']} ausente(s), {summary['failed']} com erro.")
+        return EXIT_MOVE_FAILED if summary["failed"] else EXIT_OK
+
+    if args.from_plan:
+        if not os.path.isfile(args.from_plan):
+            print(f"Erro: plano não encontrado: '{args.from_plan}'")
+            return EXIT_NOT_FOUND
+        files_info = read_plan(args.from_plan, args.format)
+        gemini_calls = 0
+        print(f"Plano carregado: {len(files_info)} arquivo(s).")
+    else:
+        if categories is None:
+            categories = organizer.DEFAULT_CATEGORIES.copy()
+        user, credits = None, 0
+        if args.gemini:
+            user, credits = login_from_environment()
+            if user is None:
+                print(f"Erro: {credits}")
+                return EXIT_AUTH
+            if args.max_credits is not None:
+                credits = min(credits, max(0, args.max_credits))
+            if credits <= 0:
+                print("Erro: créditos para IA Gemini esgotados ou não disponíveis.")
+                return EXIT_AUTH
+            print(f"Usando a IA Gemini com até {credits} crédito(s).")
+        if args.watch:
+            return watch(args, progress, categories, user, credits)
+
+        progress.stage = "classify"
+        recorder = instrumentation.RunRecorder()
+        files_info, _, gemini_calls = organizer.simulate_organization(
+            args.folder, categories, progress_callback=progress.callback, use_gemini=args.gemini,
+            available_credits_for_simulation=credits, parallel=not args.sequential,
+            hash_workers=args.hash_workers, extraction_workers=args.extraction_workers,
+            edge_workers=args.edge_workers, recursive=args.recursive, include=args.include, exclude=args.exclude,
+            recorder=recorder, route_duplicates_apart=args.duplicates_folder,
+            detect_near_duplicates=not args.no_near_duplicates)
+        if args.timings:
+            recorder.write_json(args.timings)
+            print(f"Tempos salvos em '{args.timings}'.")
+        if args.trace:
+            recorder.write_chrome_trace(args.trace)
+            print(f"Trace salvo em '{args.trace}'.")
+        if gemini_calls > 0:
+            print(f"Processando dedução de {gemini_calls} créditos pela classificação com IA Gemini...")
+            deduct_credits(user, gemini_calls)
+        print(f"Classificação concluída: {len(files_info)} arquivo(s), {gemini_calls} chamada(s) à IA Gemini.")
+
+    if args.output:
+        fmt = plan_format(args.output, args.format)
+        if args.output == "-":
+            write_plan(files_info, stdout, fmt, args.folder, gemini_calls)
+        else:
+            with open(args.output, "w", encoding="utf-8", newline="") as f:
+                write_plan(files_info, f, fmt, args.folder, gemini_calls)
+            print(f"Plano salvo em '{args.output}'.")
+    progress.emit("plan", files=len(files_info), gemini_calls=gemini_calls)
+
+    if args.apply:
+        progress.stage = "move"
+        summary = plan_executor.execute_plan(args.folder, files_info, progress_callback=progress.callback,
+                                               workers=args.move_workers)
+        progress.emit("applied", **summary)
+        print(f"Organização finalizada: {summary['moved']} movido(s), {summary['skipped']} ignorado(s), {summary['failed']} com erro.")
+        print(f"Registro da organização: '{summary['journal']}'.")
+        if summary["failed"]:
+            return EXIT_MOVE_FAILED
+    return EXIT_OK
+
+
+def _detach_stdout(log_stream):
+    """Points file descriptor 1 at `log_stream`, returning a stream on the original stdout.
+
+    `contextlib.redirect_stdout` only replaces `sys.stdout` in this process. The extraction
+    worker processes (started by spawn or forkserver on Windows, macOS and recent Pythons)
+    and Tesseract write to file descriptor 1 itself, which would mix their messages into
+    the JSON lines and plans written to stdout.
+
+    Args:
+        log_stream (file): The stream the messages go to (stderr, or devnull with `--quiet`).
+
+    Returns:
+        tuple: `(stdout, saved_fd)`: the stream for the machine-readable output and the
+        duplicate of the original descriptor 1 to restore afterwards, or `(sys.stdout, None)`
+        if stdout or `log_stream` has no file descriptor (e.g. when captured in tests).
+    """
+    try:
+        stdout_fd, log_fd = sys.stdout.fileno(), log_stream.fileno()
+    except (AttributeError, OSError, ValueError):
+        return sys.stdout, None
+    sys.stdout.flush()
+    saved_fd = os.dup(stdout_fd)
+    os.dup2(log_fd, stdout_fd)
+    return os.fdopen(saved_fd, "w", encoding=sys.stdout.encoding, closefd=False), saved_fd
+
+
+def main(argv=None):
+    """Parses the command line and runs it.
+
+    Args:
+        argv (list[str], optional): The arguments. Defaults to `sys.argv[1:]`.
+
+    Returns:
+        int: The exit code.
+    """
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    if args.progress and args.output == "-":
+        parser.error("--progress e --output - não podem ser usados juntos (ambos escrevem na saída padrão).")
+    if args.resume and args.undo:
+        parser.error("--resume e --undo não podem ser usados juntos.")
+    if (args.resume or args.undo) and (args.apply or args.from_plan or args.gemini):
+        parser.error("--resume e --undo não podem ser combinados com --apply, --from-plan ou --gemini.")
+    if args.from_plan and args.gemini:
+        parser.error("--from-plan não classifica arquivos; remova --gemini.")
+    if args.watch and (args.from_plan or args.resume or args.undo or args.output or args.recursive or args.timings or args.trace):
+        parser.error("--watch não pode ser combinado com --from-plan, --resume, --undo, --output, --recursive, --timings ou --trace.")
+    if args.no_near_duplicates and not args.gemini:
+        parser.error("--no-near-duplicates só vale com --gemini.")
+    if (args.from_plan or args.resume or args.undo) and args.duplicates_folder:
+        parser.error("--duplicates-folder vale para a classificação; não pode ser usado com --from-plan, --resume ou --undo.")
+    if (args.from_plan or args.resume or args.undo) and (args.timings or args.trace):
+        parser.error("--timings e --trace medem a classificação; não podem ser usados com --from-plan, --resume ou --undo.")
+    categories = None
+    if args.categories:
+        try:
+            categories = load_categories(args.categories)
+        except (OSError, ValueError) as e:
+            parser.error(f"--categories: {e}")
+
+    # Every message of the organizer goes to stderr, keeping stdout for the machine-readable output
+    log_stream = open(os.devnull, "w") if args.quiet else sys.stderr
+    stdout, saved_stdout_fd = _detach_stdout(log_stream)
+    progress = _ProgressStream(stdout if args.progress else None)
+    try:
+        with contextlib.redirect_stdout(log_stream):
+            return run(args, progress, stdout, categories)
+    except KeyboardInterrupt:
+        print("Interrompido.", file=sys.stderr)
+        return EXIT_ERROR
+    except (OSError, ValueError) as e:
+        print(f"Erro: {e}", file=sys.stderr)
+        return EXIT_ERROR
+    except Exception as e:
+        print(f"Erro inesperado: {type(e).__name__}: {e}", file=sys.stderr)
+        return EXIT_ERROR
+    finally:
+        if saved_stdout_fd is not None:
+            stdout.flush()
+            os.dup2(saved_stdout_fd, sys.stdout.fileno())
+            os.close(saved_stdout_fd)
+        if log_stream is not sys.stderr:
+            log_stream.close()
+
+
+if __name__ == "__main__":
+    # Required by the extraction process pool when running as a PyInstaller executable
+    multiprocessing.freeze_support()
+    sys.exit(main())
@@ -0,0 +1,260 @@
+"""HTTP client used to call the Supabase Edge Functions.
+
+All calls share one `requests.Session` per process, so the TCP and TLS connection to
+the functions endpoint is kept alive and reused across files and retries instead of
+being set up again for every request. Large JSON bodies are sent gzip-compressed;
+the Edge Functions read them through `readJsonBody` (supabase/functions/_shared), and
+an endpoint still running an older deployment that rejects a compressed body is sent
+it again uncompressed, and then only uncompressed bodies for the rest of the process.
+
+Every call is timed: DNS resolution and connection setup (only when a new connection
+had to be opened), time to first byte and total time. The most recent timings are
+kept in memory and can be read with `get_call_timings()` / `summarize_call_timings()`.
+"""
+
+import base64
+import gzip
+import json
+import os
+import socket
+import threading
+import time
+from collections import deque
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.connection import HTTPConnection, HTTPSConnection
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+
+# Maximum number of keep-alive connections kept open to the functions endpoint
+DEFAULT_POOL_SIZE = 8
+# JSON bodies at least this large are gzip-compressed before being sent
+GZIP_MIN_BYTES = 32 * 1024
+# Statuses with which a function deployed before gzip support fails to parse a compressed body
+GZIP_REJECTED_STATUS_CODES = (400, 415)
+# Raw bytes read per chunk when streaming a Base64 body (a multiple of 3, so chunks encode without padding)
+BASE64_READ_CHUNK_BYTES = 3 * 256 * 1024
+# Number of call timings kept in memory
+MAX_RECORDED_TIMINGS = 2000
+
+_session = None
+_session_pid = None
+_session_lock = threading.Lock()
+_connection_timings = threading.local()
+_call_timings = deque(maxlen=MAX_RECORDED_TIMINGS)
+_call_timings_lock = threading.Lock()
+# Endpoints that did not accept a gzip-compressed body
+_gzip_rejected_urls = set()
+
+
+class _TimedConnectionMixin:
+    """Records how long DNS resolution and connection setup take for new connections.
+
+    The host name is resolved once, timed, right before urllib3's own connection setup,
+    which resolves it again (usually from the system resolver's cache) and keeps its
+    handling of every address, timeouts and errors. Only public connection attributes
+    are used, so nothing depends on urllib3 internals.
+    """
+    def connect(self):
+        dns_started_at = time.perf_counter()
+        try:
+            socket.getaddrinfo(self.host.strip("[]"), self.port, 0, socket.SOCK_STREAM)
+            _connection_timings.dns = time.perf_counter() - dns_started_at
+        except (socket.gaierror, UnicodeError):
+            # The connection setup below fails on its own and raises urllib3's error
+            _connection_timings.dns = None
+        connect_started_at = time.perf_counter()
+        super().connect()
+        # Covers the TCP connection and, for HTTPS, the TLS handshake
+        _connection_timings.connect = time.perf_counter() - connect_started_at
+
+
+class _TimedHTTPConnection(_TimedConnectionMixin, HTTPConnection):
+    pass
+
+
+class _TimedHTTPSConnection(_TimedConnectionMixin, HTTPSConnection):
+    pass
+
+
+class _TimedHTTPConnectionPool(HTTPConnectionPool):
+    ConnectionCls = _TimedHTTPConnection
+
+
+class _TimedHTTPSConnectionPool(HTTPSConnectionPool):
+    ConnectionCls = _TimedHTTPSConnection
+
+
+class _TimedHTTPAdapter(HTTPAdapter):
+    """An `HTTPAdapter` whose connections report their DNS and connection setup times."""
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {"http": _TimedHTTPConnectionPool, "https": _TimedHTTPSConnectionPool}
+
+
+class Base64JsonBody:
+    """A JSON request body with one field holding a file's content in Base64, produced in chunks.
+
+    The file is read and encoded piece by piece while the request is being sent, so
+    neither the whole file nor its Base64 encoding is ever held in memory. The body
+    length is known in advance, so it is sent with a regular Content-Length header.
+    Iterating the body again (e.g. on a retry) reads the file again.
+    """
+    def __init__(self, fields, base64_field, file_path=None, data=None):
+        """Initializes the body.
+
+        Args:
+            fields (dict): The other JSON fields of the body.
+            base64_field (str): The name of the field that holds the Base64 content.
+            file_path (str, optional): The file whose content is encoded.
+            data (bytes, optional): Content to encode instead of a file.
+        """
+        self.file_path = file_path
+        self.data = data
+        self.content_size = os.path.getsize(file_path) if file_path is not None else len(data)
+        prefix = json.dumps(fields)[:-1] + (", " if fields else "") + json.dumps(base64_field) + ': "'
+        self._prefix = prefix.encode("utf-8")
+        self._suffix = b'"}'
+
+    def __len__(self):
+        return len(self._prefix) + 4 * ((self.content_size + 2) // 3) + len(self._suffix)
+
+    def __iter__(self):
+        yield self._prefix
+        if self.file_path is None:
+            for start in range(0, len(self.data), BASE64_READ_CHUNK_BYTES):
+                yield base64.b64encode(self.data[start:start + BASE64_READ_CHUNK_BYTES])
+        else:
+            read_size = 0
+            with open(self.file_path, "rb") as f:
+                while chunk := f.read(BASE64_READ_CHUNK_BYTES):
+                    read_size += len(chunk)
+                    yield base64.b64encode(chunk)
+            if read_size != self.content_size:
+                raise IOError(f"O arquivo '{self.file_path}' mudou durante o envio.")
+        yield self._suffix
+
+
+def get_session(pool_size=DEFAULT_POOL_SIZE):
+    """Returns the process-wide session used for Edge Function calls, creating it on first use.
+
+    A process started by forking gets its own session, since connections cannot be
+    shared between processes.
+
+    Args:
+        pool_size (int, optional): The maximum number of keep-alive connections per host.
+            Only used when the session is created.
+
+    Returns:
+        requests.Session: The shared session.
+    """
+    global _session, _session_pid
+    with _session_lock:
+        if _session is None or _session_pid != os.getpid():
+            session = requests.Session()
+            adapter = _TimedHTTPAdapter(pool_connections=2, pool_maxsize=pool_size, pool_block=False)
+            session.mount("https://", adapter)
+            session.mount("http://", adapter)
+            _session, _session_pid = session, os.getpid()
+        return _session
+
+
+def post_json(url, payload, headers=None, timeout=120, label=None):
+    """POSTs a JSON payload through the shared session and returns the decoded JSON response.
+
+    Bodies of at least `GZIP_MIN_BYTES` are gzip-compressed (`Content-Encoding: gzip`),
+    except `Base64JsonBody` payloads, which are streamed as they are. If the endpoint
+    answers a compressed body with one of `GZIP_REJECTED_STATUS_CODES`, the body is sent
+    again uncompressed and, if that succeeds, the endpoint is no longer sent compressed
+    bodies. Each call's timing is recorded whether it succeeds or not.
+
+    Args:
+        url (str): The endpoint URL.
+        payload (dict | Base64JsonBody): The JSON payload.
+        headers (dict, optional): Extra request headers.
+        timeout (int, optional): The request timeout in seconds.
+        label (str, optional): A name for the call in the recorded timings. Defaults to the URL.
+
+    Returns:
+        dict: The decoded JSON response.
+
+    Raises:
+        requests.exceptions.RequestException: For network errors and error status codes.
+    """
+    request_headers = {"Content-Type": "application/json", **(headers or {})}
+    if isinstance(payload, Base64JsonBody):
+        return _post(url, payload, request_headers, timeout, label, len(payload))
+    body = json.dumps(payload).encode("utf-8")
+    if len(body) < GZIP_MIN_BYTES or url in _gzip_rejected_urls:
+        return _post(url, body, request_headers, timeout, label, len(body))
+
+    try:
+        return _post(url, gzip.compress(body, compresslevel=5), {**request_headers, "Content-Encoding": "gzip"},
+                     timeout, label, len(body))
+    except requests.exceptions.HTTPError as e:
+        if e.response is None or e.response.status_code not in GZIP_REJECTED_STATUS_CODES: raise
+        result = _post(url, body, request_headers, timeout, label, len(body))
+        _gzip_rejected_urls.add(url)
+        return result
+
+
+def _post(url, body, request_headers, timeout, label, uncompressed_size):
+    """Sends one POST through the shared session, recording its timing, and returns the decoded JSON response."""
+    _connection_timings.__dict__.clear()
+    timing = {"label": label or url, "request_bytes": len(body), "uncompressed_bytes": uncompressed_size,
+              "status": None, "error": None}
+    started_at = time.perf_counter()
+    try:
+        response = get_session().post(url, data=body, headers=request_headers, timeout=timeout, stream=True)
+        timing["ttfb"] = time.perf_counter() - started_at
+        timing["status"] = response.status_code
+        content = response.content
+        response.raise_for_status()
+        return json.loads(content)
+    except Exception as e:
+        timing["error"] = type(e).__name__
+        raise
+    finally:
+        timing["total"] = time.perf_counter() - started_at
+        timing["dns"] = getattr(_connection_timings, "dns", None)
+        timing["connect"] = getattr(_connection_timings, "connect", None)
+        timing["new_connection"] = timing["connect"] is not None
+        with _call_timings_lock:
+            _call_timings.append(timing)
+
+
+def get_call_timings():
+    """Returns a copy of the recorded call timings, oldest first (times in seconds)."""
+    with _call_timings_lock:
+        return list(_call_timings)
+
+
+def clear_call_timings():
+    """Discards the recorded call timings."""
+    with _call_timings_lock:
+        _call_timings.clear()
+
+
+def summarize_call_timings(timings=None):
+    """Aggregates call timings into averages and connection reuse counts.
+
+    Args:
+        timings (list[dict], optional): The timings to summarize. Defaults to every recorded timing.
+
+    Returns:
+        dict: The number of calls, how many opened a new connection, the average DNS and
+        connection setup time of those, and the average TTFB and total time of all calls.
+        Empty if there are no timings.
+    """
+    timings = get_call_timings() if timings is None else timings
+    if not timings: return {}
+    new_connections = [t for t in timings if t["new_connection"]]
+    average = lambda values: sum(values) / len(values) if values else None
+    return {
+        "calls": len(timings),
+        "new_connections": len(new_connections),
+        "avg_dns": average([t["dns"] for t in new_connections if t["dns"] is not None]),
+        "avg_connect": average([t["connect"] for t in new_connections]),
+        "avg_ttfb": average([t["ttfb"] for t in timings if "ttfb" in t]),
+        "avg_total": average([t["total"] for t in timings]),
+    }
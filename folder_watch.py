@@ -0,0 +1,203 @@
+"""Incremental (watch-folder) mode of the organizer.
+
+A watch keeps a persisted manifest (`cache_store.FolderManifest`) of the files of a
+folder that were already looked at. Each pass lists the folder once, compares every
+file's stat information with the manifest and runs `organizer.simulate_organization` on
+the new and changed files only (handing it that listing), producing an incremental
+organization plan. Settled files are never read again, including the ones the
+classification left out, which are recorded without a category.
+
+Between passes, the watch sleeps until the folder changes (through inotify on Linux)
+or until the polling interval elapses on other platforms.
+"""
+
+import ctypes
+import ctypes.util
+import os
+import select
+import sys
+import threading
+import time
+
+import cache_store
+import organizer
+
+FOLDER_MANIFEST_FILE = "folder_manifest.db"
+# Seconds between passes when inotify is not available, and maximum wait between passes with it
+DEFAULT_POLL_INTERVAL = 30
+# Files modified less than this many seconds ago may still be being written; they wait for the next pass
+DEFAULT_SETTLE_SECONDS = 2
+# Longest time a wait for changes goes without checking whether the watch was stopped
+STOP_CHECK_SECONDS = 0.5
+
+# inotify event masks (from <sys/inotify.h>)
+_IN_MODIFY = 0x002
+_IN_CLOSE_WRITE = 0x008
+_IN_MOVED_FROM = 0x040
+_IN_MOVED_TO = 0x080
+_IN_CREATE = 0x100
+_IN_DELETE = 0x200
+_IN_NONBLOCK = os.O_NONBLOCK
+_IN_CLOEXEC = 0o2000000
+
+
+class _InotifyWaiter:
+    """Blocks until a folder changes, using the Linux inotify API through ctypes."""
+    def __init__(self, folder_path):
+        libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+        self._fd = libc.inotify_init1(_IN_NONBLOCK | _IN_CLOEXEC)
+        if self._fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 falhou")
+        mask = _IN_MODIFY | _IN_CLOSE_WRITE | _IN_MOVED_FROM | _IN_MOVED_TO | _IN_CREATE | _IN_DELETE
+        if libc.inotify_add_watch(self._fd, os.fsencode(folder_path), mask) < 0:
+            error = ctypes.get_errno()
+            os.close(self._fd)
+            raise OSError(error, f"inotify_add_watch falhou para '{folder_path}'")
+
+    def wait(self, timeout, stop_event):
+        """Waits up to `timeout` seconds for a change, or until `stop_event` is set. Returns True if the folder changed."""
+        deadline = time.monotonic() + timeout
+        while True:
+            remaining = deadline - time.monotonic()
+            if stop_event.is_set() or remaining <= 0: return False
+            readable, _, _ = select.select([self._fd], [], [], min(remaining, STOP_CHECK_SECONDS))
+            if readable: break
+        try:
+            while os.read(self._fd, 64 * 1024):
+                pass
+        except BlockingIOError:
+            pass
+        return True
+
+    def close(self):
+        """Stops watching the folder."""
+        os.close(self._fd)
+
+
+def diff_folder(folder_path, manifest_entries, settle_seconds=DEFAULT_SETTLE_SECONDS, include=None, exclude=None):
+    """Compares the files of a folder with the manifest of a previous pass.
+
+    Args:
+        folder_path (str): The watched folder.
+        manifest_entries (dict): `{name: (size, mtime_ns, inode)}` as returned by `FolderManifest.entries`.
+        settle_seconds (float, optional): Files modified more recently than this are left for a later pass.
+        include (list[str], optional): Glob patterns; when given, only matching files are compared.
+            See `organizer.scan_folder`.
+        exclude (list[str], optional): Glob patterns of files to leave out.
+
+    Returns:
+        tuple: `(changed, removed, unsettled)`: a dict `{name: stat_result}` of new or
+        modified files, the names recorded in the manifest that are gone, and the number
+        of files left for a later pass because they may still be being written.
+    """
+    changed = {}
+    present = set()
+    unsettled = 0
+    settle_limit_ns = time.time_ns() - int(settle_seconds * 1e9)
+    with os.scandir(folder_path) as entries:
+        for entry in entries:
+            try:
+                if not entry.is_file(): continue
+                stat_result = entry.stat()
+            except OSError:
+                continue
+            if include and not organizer._matches_any_glob(entry.name, include): continue
+            if exclude and organizer._matches_any_glob(entry.name, exclude): continue
+            present.add(entry.name)
+            identity = (stat_result.st_size, stat_result.st_mtime_ns, stat_result.st_ino)
+            if manifest_entries.get(entry.name) == identity: continue
+            if stat_result.st_mtime_ns > settle_limit_ns:
+                unsettled += 1
+                continue
+            changed[entry.name] = stat_result
+    removed = [name for name in manifest_entries if name not in present]
+    return changed, removed, unsettled
+
+
+def run_watch_pass(folder_path, categories_dict, manifest, settle_seconds=DEFAULT_SETTLE_SECONDS, **simulate_kwargs):
+    """Runs one incremental pass over a watched folder.
+
+    Args:
+        folder_path (str): The watched folder.
+        categories_dict (dict): A dictionary of category names to their descriptions.
+        manifest (cache_store.FolderManifest): The manifest of already classified files.
+        settle_seconds (float, optional): See `diff_folder`.
+        **simulate_kwargs: Extra arguments for `organizer.simulate_organization`
+            (`use_gemini`, `available_credits_for_simulation`, `parallel`, ...). Its `include`
+            and `exclude` patterns are applied when listing the folder.
+
+    Returns:
+        tuple: A tuple containing:
+            - list: The classification results `(filename, category, date, method)` of the new and changed files.
+            - list: The names of the files that left the folder since the previous pass.
+            - int: The number of Gemini API calls made during the pass.
+            - int: The number of files left for a later pass because they were still being written.
+    """
+    folder_key = os.path.abspath(folder_path)
+    include, exclude = simulate_kwargs.pop("include", None), simulate_kwargs.pop("exclude", None)
+    changed, removed, unsettled = diff_folder(folder_path, manifest.entries(folder_key), settle_seconds, include, exclude)
+    if removed:
+        manifest.remove(folder_key, removed)
+    if not changed:
+        return [], removed, 0, unsettled
+
+    files_to_organize, _, gemini_calls = organizer.simulate_organization(
+        folder_path, categories_dict, only_files=changed, **simulate_kwargs)
+    results = {filename: (category, method) for filename, category, _, method in files_to_organize}
+    # Files the classification left out are recorded too (without a category), so they are not sent again
+    manifest.record(folder_key, [(filename, stat_result) + results.get(filename, (None, None))
+                                 for filename, stat_result in changed.items()])
+    return files_to_organize, removed, gemini_calls, unsettled
+
+
+def watch_folder(folder_path, categories_dict, on_plan, stop_event=None, poll_interval=DEFAULT_POLL_INTERVAL,
+                 settle_seconds=DEFAULT_SETTLE_SECONDS, use_inotify=True, **simulate_kwargs):
+    """Watches a folder and classifies the files that arrive or change, until stopped.
+
+    The first pass classifies every file not yet in the manifest; each later pass only
+    the files that are new or changed since. Gemini credits passed through
+    `available_credits_for_simulation` are shared by all passes.
+
+    Args:
+        folder_path (str): The folder to watch.
+        categories_dict (dict): A dictionary of category names to their descriptions.
+        on_plan (function): Called after each pass that found changes, with the
+            incremental plan: `on_plan(files_to_organize, removed_files, gemini_calls)`.
+        stop_event (threading.Event, optional): Set it to end the watch. Without one, the watch runs forever.
+        poll_interval (float, optional): Seconds between passes when inotify is unavailable,
+            and the longest wait between passes when it is.
+        settle_seconds (float, optional): See `diff_folder`.
+        use_inotify (bool, optional): If True (and on Linux), passes run as soon as the folder changes.
+        **simulate_kwargs: Extra arguments for `organizer.simulate_organization`.
+    """
+    stop_event = stop_event or threading.Event()
+    manifest = cache_store.FolderManifest(os.path.join(organizer.get_app_data_path(), FOLDER_MANIFEST_FILE))
+    waiter = None
+    if use_inotify and sys.platform.startswith("linux"):
+        try:
+            waiter = _InotifyWaiter(folder_path)
+        except (OSError, AttributeError) as e:
+            print(f"AVISO: inotify indisponível ({e}). Verificando a pasta a cada {poll_interval}s.")
+
+    try:
+        while not stop_event.is_set():
+            files_to_organize, removed, gemini_calls, unsettled = run_watch_pass(
+                folder_path, categories_dict, manifest, settle_seconds, **simulate_kwargs)
+            if "available_credits_for_simulation" in simulate_kwargs:
+                simulate_kwargs["available_credits_for_simulation"] = max(0, simulate_kwargs["available_credits_for_simulation"] - gemini_calls)
+            if files_to_organize or removed:
+                on_plan(files_to_organize, removed, gemini_calls)
+
+            # Files still being written are retried once they settle, even if no further event arrives
+            timeout = min(poll_interval, settle_seconds + 0.5) if unsettled else poll_interval
+            if waiter:
+                waiter.wait(timeout, stop_event)
+                if not stop_event.is_set():
+                    # Lets a burst of events (e.g. a batch copy) finish before the next pass
+                    stop_event.wait(0.5)
+            else:
+                stop_event.wait(timeout)
+    finally:
+        if waiter:
+            waiter.close()
+        manifest.close()
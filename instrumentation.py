@@ -0,0 +1,240 @@
+"""Per-file, per-stage timing of the classification pipeline.
+
+Code that does measurable work wraps it in `timed(stage)`. The span is only recorded
+when the current thread is collecting (inside `collect()`), so the timers cost almost
+nothing otherwise. Work running in pools is run through `call_collecting`, which
+returns the spans alongside the result, including from worker processes, and the
+caller hands them to the run's `RunRecorder` for the file they belong to.
+
+Stages:
+    hash: reading and hashing a file (`compute_file_hash`).
+    cache_lookup: hash index, classification cache, extracted-text and embedding cache lookups.
+    extraction: text extraction, including the OCR it triggers.
+    ocr: rendering and OCR of scanned pages and images (nested in `extraction`).
+    embedding: SBERT encoding.
+    classification: similarity of document and category embeddings.
+    edge_call: Edge Function calls, including their retries.
+    near_duplicates: MinHash signature and near-duplicate index lookup before a Gemini call.
+
+Spans of a batch (e.g. an SBERT batch) are charged to each of its files in equal shares.
+A recorder's results can be exported as JSON statistics or as a Chrome trace, viewable
+in chrome://tracing or Perfetto.
+"""
+
+import contextlib
+import json
+import os
+import threading
+import time
+
+STAGES = ("hash", "cache_lookup", "extraction", "ocr", "embedding", "classification", "edge_call", "near_duplicates")
+# Names of the stages in the summaries printed to the log
+STAGE_LABELS = {
+    "hash": "hash",
+    "cache_lookup": "consultas ao cache",
+    "extraction": "extração",
+    "ocr": "OCR",
+    "embedding": "embeddings",
+    "classification": "classificação",
+    "edge_call": "chamadas à IA",
+    "near_duplicates": "quase duplicados",
+}
+
+_collecting = threading.local()
+
+
+@contextlib.contextmanager
+def collect():
+    """Collects the spans timed by the current thread until the block exits.
+
+    Yields:
+        list: The collected spans, as `(stage, start, duration, pid, thread_id)` tuples
+        (`start` is a wall-clock timestamp and `duration` is in seconds).
+    """
+    previous = getattr(_collecting, "spans", None)
+    _collecting.spans = spans = []
+    try:
+        yield spans
+    finally:
+        _collecting.spans = previous
+
+
+@contextlib.contextmanager
+def timed(stage):
+    """Times the block as a span of `stage`, if the current thread is collecting."""
+    spans = getattr(_collecting, "spans", None)
+    if spans is None:
+        yield
+        return
+    started_at = time.time()
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        spans.append((stage, started_at, time.perf_counter() - started, os.getpid(), threading.get_ident()))
+
+
+def record(spans):
+    """Adds spans timed elsewhere (e.g. in a worker process) to the current thread's collection."""
+    current = getattr(_collecting, "spans", None)
+    if current is not None:
+        current.extend(spans)
+
+
+def call_collecting(fn, *args):
+    """Calls `fn(*args)`, collecting the spans it times. Can be submitted to process pools.
+
+    Returns:
+        tuple: `(result, spans)`.
+    """
+    with collect() as spans:
+        result = fn(*args)
+    return result, spans
+
+
+def percentile(values, fraction):
+    """Returns the `fraction` percentile of `values`, interpolating between the closest ranks."""
+    ordered = sorted(values)
+    if not ordered: return None
+    position = (len(ordered) - 1) * fraction
+    lower = int(position)
+    upper = min(lower + 1, len(ordered) - 1)
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (position - lower)
+
+
+class RunRecorder:
+    """Collects the spans of one classification run and aggregates them per file and per stage. Thread-safe."""
+    def __init__(self):
+        self.started_at = time.time()
+        self.finished_at = None
+        self._pid = os.getpid()
+        self._lock = threading.Lock()
+        # (stage, start, duration, pid, thread_id, file_keys)
+        self._spans = []
+        self._file_timings = {}
+
+    def add(self, spans, file_key=None):
+        """Records spans of work done for one file (or for the whole run if `file_key` is None)."""
+        self.add_shared(spans, [] if file_key is None else [file_key])
+
+    def add_shared(self, spans, file_keys):
+        """Records spans of work done for several files at once; each file is charged an equal share."""
+        file_keys = tuple(file_keys)
+        with self._lock:
+            for span in spans:
+                self._spans.append(tuple(span) + (file_keys,))
+                share = span[2] / len(file_keys) if file_keys else 0.0
+                for file_key in file_keys:
+                    timings = self._file_timings.setdefault(file_key, {})
+                    timings[span[0]] = timings.get(span[0], 0.0) + share
+
+    def swap_files(self, file_key, other_file_key):
+        """Exchanges everything recorded for two files (their timings and their share of the spans)."""
+        swapped = {file_key: other_file_key, other_file_key: file_key}
+        with self._lock:
+            timings, other_timings = self._file_timings.pop(file_key, None), self._file_timings.pop(other_file_key, None)
+            if timings is not None: self._file_timings[other_file_key] = timings
+            if other_timings is not None: self._file_timings[file_key] = other_timings
+            self._spans = [span[:-1] + (tuple(swapped.get(key, key) for key in span[-1]),)
+                           if file_key in span[-1] or other_file_key in span[-1] else span
+                           for span in self._spans]
+
+    @contextlib.contextmanager
+    def scope(self, file_key=None):
+        """Collects the spans timed by the current thread in the block and records them for `file_key`."""
+        with collect() as spans:
+            try:
+                yield
+            finally:
+                self.add(spans, file_key)
+
+    @contextlib.contextmanager
+    def timed(self, stage, file_key=None):
+        """Times the block as a span of `stage` for `file_key`, whether or not the thread is collecting."""
+        started_at = time.time()
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add([(stage, started_at, time.perf_counter() - started, os.getpid(), threading.get_ident())], file_key)
+
+    def finish(self):
+        """Marks the end of the run (for the wall time in `summary`)."""
+        self.finished_at = time.time()
+
+    def timings_for(self, file_key):
+        """Returns the time spent on a file, as a dict of stage name to seconds."""
+        with self._lock:
+            return dict(self._file_timings.get(file_key, {}))
+
+    def file_timings(self):
+        """Returns the time spent on every file, as a dict of file key to `timings_for(file_key)`."""
+        with self._lock:
+            return {file_key: dict(timings) for file_key, timings in self._file_timings.items()}
+
+    def summary(self):
+        """Aggregates the recorded spans.
+
+        Returns:
+            dict: `wall_s` (the run's duration), `files`, `stages` (for each stage: span
+            count, total, mean, p50, p95 and max duration, in seconds) and `by_extension`
+            (for each file extension: file count and total seconds per stage).
+        """
+        with self._lock:
+            spans = list(self._spans)
+            file_timings = {file_key: dict(timings) for file_key, timings in self._file_timings.items()}
+
+        durations = {}
+        for span in spans:
+            durations.setdefault(span[0], []).append(span[2])
+        stages = {}
+        for stage in sorted(durations, key=lambda name: STAGES.index(name) if name in STAGES else len(STAGES)):
+            values = durations[stage]
+            stages[stage] = {"count": len(values), "total_s": sum(values), "mean_s": sum(values) / len(values),
+                             "p50_s": percentile(values, 0.50), "p95_s": percentile(values, 0.95), "max_s": max(values)}
+
+        by_extension = {}
+        for file_key, timings in file_timings.items():
+            extension = os.path.splitext(str(file_key))[1].lower() or "(sem extensão)"
+            totals = by_extension.setdefault(extension, {"files": 0, "stages": {}})
+            totals["files"] += 1
+            for stage, seconds in timings.items():
+                totals["stages"][stage] = totals["stages"].get(stage, 0.0) + seconds
+
+        return {"wall_s": (self.finished_at or time.time()) - self.started_at, "files": len(file_timings),
+                "stages": stages, "by_extension": by_extension}
+
+    def to_chrome_trace(self):
+        """Returns the spans in the Chrome trace event format (a dict ready for `json.dump`)."""
+        with self._lock:
+            spans = list(self._spans)
+        events = []
+        for pid in sorted({span[3] for span in spans} | {self._pid}):
+            name = "DocuSmart" if pid == self._pid else f"Extração (pid {pid})"
+            events.append({"name": "process_name", "ph": "M", "pid": pid, "args": {"name": name}})
+        for stage, started_at, duration, pid, thread_id, file_keys in spans:
+            event = {"name": stage, "cat": "docusmart", "ph": "X", "pid": pid, "tid": thread_id,
+                     "ts": round((started_at - self.started_at) * 1e6), "dur": round(duration * 1e6)}
+            if len(file_keys) == 1:
+                event["args"] = {"file": file_keys[0]}
+            elif file_keys:
+                event["args"] = {"files": len(file_keys)}
+            events.append(event)
+        return {"traceEvents": events, "displayTimeUnit": "ms"}
+
+    def write_json(self, path):
+        """Writes `summary()` and the per-file timings to a JSON file."""
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump({"summary": self.summary(), "files": self.file_timings()}, f, ensure_ascii=False, indent=2)
+
+    def write_chrome_trace(self, path):
+        """Writes `to_chrome_trace()` to a JSON file."""
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(self.to_chrome_trace(), f, ensure_ascii=False)
+
+
+def format_summary(summary):
+    """Formats the per-stage totals of `RunRecorder.summary()` as a single log line."""
+    parts = [f"{STAGE_LABELS.get(stage, stage)} {stats['total_s']:.2f}s ({stats['count']})"
+             for stage, stats in summary["stages"].items()]
+    return f"Tempo por estágio ({summary['wall_s']:.2f}s no total): " + (", ".join(parts) or "nenhum")
@@ -0,0 +1,71 @@
+"""MinHash signatures of extracted text, for near-duplicate detection.
+
+Two versions of the same document (a scan and the original PDF, an invoice exported
+twice) have different bytes, so their hashes differ, but most of their text is the
+same. The text is normalized (lowercase, no accents, words of letters and digits
+only) and cut into overlapping word shingles; the MinHash signature of that set
+estimates the Jaccard similarity of two texts as the fraction of positions where their
+signatures agree. Signatures are split into bands for locality-sensitive hashing (see
+`cache_store.NearDuplicateIndex`): texts at least `DEFAULT_THRESHOLD` similar share a
+band, and so become candidates of each other, with high probability.
+"""
+
+import re
+import unicodedata
+import zlib
+import numpy as np
+
+# Bump when the normalization, shingles or hash functions change: stored signatures are then discarded
+SIGNATURE_VERSION = 1
+NUM_PERMUTATIONS = 64
+# Signature bands for LSH (NUM_PERMUTATIONS / LSH_BANDS rows each). With 16 bands of 4 rows,
+# texts 80% similar share at least one band 99.9% of the time, and 50% similar ones 64%
+LSH_BANDS = 16
+SHINGLE_WORDS = 3
+# Texts with fewer shingles than this are too short to be compared reliably
+MIN_SHINGLES = 20
+# Estimated Jaccard similarity from which two texts are near-duplicates
+DEFAULT_THRESHOLD = 0.8
+
+_MERSENNE_PRIME = np.uint64((1 << 61) - 1)
+_MAX_HASH = np.uint64((1 << 32) - 1)
+# Fixed seed: the permutations must be the same in every run for stored signatures to stay comparable
+_permutation_rng = np.random.RandomState(1_000_003)
+_PERMUTATION_A = _permutation_rng.randint(1, 1 << 32, size=NUM_PERMUTATIONS, dtype=np.uint64)
+_PERMUTATION_B = _permutation_rng.randint(0, 1 << 32, size=NUM_PERMUTATIONS, dtype=np.uint64)
+_WORD_PATTERN = re.compile(r"[a-z0-9]+")
+
+
+def normalize_words(text):
+    """Returns the words of a text, lowercased and without accents or punctuation."""
+    text = unicodedata.normalize("NFKD", text.lower())
+    text = "".join(char for char in text if not unicodedata.combining(char))
+    return _WORD_PATTERN.findall(text)
+
+
+def shingle_hashes(text, shingle_words=SHINGLE_WORDS):
+    """Returns the distinct 32-bit hashes of the word shingles of a text, as a uint64 array."""
+    words = normalize_words(text)
+    shingles = {" ".join(words[i:i + shingle_words]) for i in range(max(0, len(words) - shingle_words + 1))}
+    return np.fromiter((zlib.crc32(shingle.encode("utf-8")) for shingle in shingles), dtype=np.uint64, count=len(shingles))
+
+
+def compute_signature(text):
+    """Computes the MinHash signature of a text.
+
+    Each of the `NUM_PERMUTATIONS` universal hash functions `(a * x + b) mod p` is applied
+    to every shingle hash at once, and the signature keeps the minimum of each.
+
+    Args:
+        text (str): The extracted text.
+
+    Returns:
+        numpy.ndarray or None: The signature (uint32 array of length `NUM_PERMUTATIONS`),
+        or None if the text is too short to be compared.
+    """
+    if not text: return None
+    hashes = shingle_hashes(text)
+    if len(hashes) < MIN_SHINGLES: return None
+    permuted = (hashes[:, None] * _PERMUTATION_A + _PERMUTATION_B) % _MERSENNE_PRIME
+    return (permuted.min(axis=0) & _MAX_HASH).astype(np.uint32)
+
@@ -0,0 +1,252 @@
+"""Pool of Tesseract OCR engines shared by the text extractors.
+
+Each engine of the pool is a long-lived Tesseract instance that loads the language
+models once and reads images straight from memory. Engines come from the optional
+`tesserocr` binding when it is installed and otherwise from the Tesseract library
+itself, called through its C API: the `libtesseract-5.dll` shipped next to the bundled
+`tesseract.exe` (and in the Windows executable), or the system `libtesseract`. Only when
+neither is available does the pool fall back to `pytesseract`, which starts a
+`tesseract` process per image; the pool then only bounds how many run at once.
+
+Each process (the extraction process pool included) creates its own pool on first use.
+"""
+
+import ctypes
+import ctypes.util
+import os
+import queue
+import threading
+
+# Default number of engines per process and maximum time spent on one image, in seconds
+DEFAULT_POOL_SIZE = min(4, os.cpu_count() or 1)
+DEFAULT_PAGE_TIMEOUT = 60
+DEFAULT_LANG = "por+eng"
+
+# File name of the Tesseract library shipped next to the bundled tesseract.exe on Windows
+BUNDLED_LIBTESSERACT_NAME = "libtesseract-5.dll"
+
+_pool = None
+_pool_pid = None
+_pool_lock = threading.Lock()
+
+
+class OcrEnginePool:
+    """A fixed-size pool of Tesseract engines, borrowed by one thread at a time."""
+    def __init__(self, tesseract_cmd, tessdata_path, size=DEFAULT_POOL_SIZE, lang=DEFAULT_LANG, page_timeout=DEFAULT_PAGE_TIMEOUT):
+        """Initializes the pool. Engines are created lazily, the first time they are needed.
+
+        Args:
+            tesseract_cmd (str): The path to the `tesseract` executable, next to which the bundled
+                library is looked for (and which the pytesseract fallback runs).
+            tessdata_path (str): The folder holding the `.traineddata` language files.
+            size (int, optional): The maximum number of engines, i.e. of images read at the same time.
+            lang (str, optional): The Tesseract languages to load.
+            page_timeout (float, optional): The maximum time spent on one image, in seconds.
+        """
+        self.tesseract_cmd = tesseract_cmd
+        self.tessdata_path = tessdata_path
+        self.size = size
+        self.lang = lang
+        self.page_timeout = page_timeout
+        self._idle_engines = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(size)
+        # The engines' origin: 'tesserocr', 'libtesseract' or 'pytesseract' (no engines)
+        self._engine_factory = None
+        try:
+            import tesserocr
+            self._engine_factory = lambda: tesserocr.PyTessBaseAPI(path=self.tessdata_path, lang=self.lang)
+            self.backend = "tesserocr"
+        except ImportError:
+            capi = _load_capi(tesseract_cmd)
+            if capi is not None:
+                self._engine_factory = lambda: CapiEngine(capi, self.tessdata_path, self.lang)
+                self.backend = "libtesseract"
+        if self._engine_factory is None:
+            self.backend = "pytesseract"
+            import pytesseract
+            # Set once here: the engines of the pool run in several threads at once
+            pytesseract.pytesseract.tesseract_cmd = tesseract_cmd
+
+    def image_to_string(self, image):
+        """Reads the text of an image, waiting for a free engine if all of them are busy.
+
+        Args:
+            image (numpy.ndarray | PIL.Image.Image): The image, preferably a 2D uint8 grayscale array.
+
+        Returns:
+            str: The recognized text, or an empty string if the image took longer than the page timeout.
+        """
+        with self._slots:
+            if self._engine_factory is None:
+                return self._pytesseract_image_to_string(image)
+            engine = self._acquire_engine()
+            try:
+                return self._engine_image_to_string(engine, image)
+            finally:
+                engine.Clear()
+                self._idle_engines.put(engine)
+
+    def close(self):
+        """Releases the engines created so far."""
+        while True:
+            try:
+                self._idle_engines.get_nowait().End()
+            except queue.Empty:
+                return
+
+    def _acquire_engine(self):
+        try:
+            return self._idle_engines.get_nowait()
+        except queue.Empty:
+            return self._engine_factory()
+
+    def _engine_image_to_string(self, engine, image):
+        import numpy as np
+        if isinstance(image, np.ndarray) and image.ndim == 2:
+            gray = np.ascontiguousarray(image, dtype=np.uint8)
+            engine.SetImageBytes(gray.tobytes(), gray.shape[1], gray.shape[0], 1, gray.shape[1])
+        else:
+            engine.SetImage(image)
+        if not engine.Recognize(timeout=int(self.page_timeout * 1000)):
+            print(f"AVISO: OCR excedeu o tempo limite de {self.page_timeout}s. Página ignorada.")
+            return ""
+        return engine.GetUTF8Text()
+
+    def _pytesseract_image_to_string(self, image):
+        import pytesseract
+        try:
+            return pytesseract.image_to_string(image, lang=self.lang, timeout=self.page_timeout)
+        except RuntimeError as e:
+            if "timeout" not in str(e).lower(): raise
+            print(f"AVISO: OCR excedeu o tempo limite de {self.page_timeout}s. Página ignorada.")
+            return ""
+
+
+class CapiEngine:
+    """A Tesseract instance driven through the C API of `libtesseract`.
+
+    Exposes the subset of `tesserocr.PyTessBaseAPI` used by `OcrEnginePool`, so both
+    kinds of engine are interchangeable.
+    """
+    def __init__(self, capi, tessdata_path, lang):
+        """Creates the instance and loads the language models.
+
+        Args:
+            capi (ctypes.CDLL): The Tesseract library, as returned by `_load_capi`.
+            tessdata_path (str): The folder holding the `.traineddata` language files.
+            lang (str): The Tesseract languages to load.
+
+        Raises:
+            RuntimeError: If Tesseract could not load the languages.
+        """
+        self._capi = capi
+        self._handle = capi.TessBaseAPICreate()
+        if capi.TessBaseAPIInit3(self._handle, os.fsencode(tessdata_path), lang.encode()) != 0:
+            capi.TessBaseAPIDelete(self._handle)
+            raise RuntimeError(f"Falha ao carregar os idiomas '{lang}' do Tesseract em '{tessdata_path}'.")
+
+    def SetImageBytes(self, imagedata, width, height, bytes_per_pixel, bytes_per_line):
+        # Tesseract copies the pixels, so the buffer only needs to outlive this call
+        self._capi.TessBaseAPISetImage(self._handle, imagedata, width, height, bytes_per_pixel, bytes_per_line)
+
+    def SetImage(self, image):
+        import numpy as np
+        pixels = np.ascontiguousarray(image.convert("L"), dtype=np.uint8)
+        self.SetImageBytes(pixels.tobytes(), pixels.shape[1], pixels.shape[0], 1, pixels.shape[1])
+
+    def Recognize(self, timeout=0):
+        monitor = self._capi.TessMonitorCreate()
+        try:
+            if timeout > 0:
+                self._capi.TessMonitorSetDeadlineMSecs(monitor, timeout)
+            return self._capi.TessBaseAPIRecognize(self._handle, monitor) == 0
+        finally:
+            self._capi.TessMonitorDelete(monitor)
+
+    def GetUTF8Text(self):
+        text_pointer = self._capi.TessBaseAPIGetUTF8Text(self._handle)
+        if not text_pointer:
+            return ""
+        try:
+            return ctypes.string_at(text_pointer).decode("utf-8", errors="replace")
+        finally:
+            self._capi.TessDeleteText(text_pointer)
+
+    def Clear(self):
+        self._capi.TessBaseAPIClear(self._handle)
+
+    def End(self):
+        self._capi.TessBaseAPIEnd(self._handle)
+        self._capi.TessBaseAPIDelete(self._handle)
+
+
+_capi = None
+_capi_loaded = False
+
+
+def _load_capi(tesseract_cmd):
+    """Loads the Tesseract library and declares the C API functions used by `CapiEngine`.
+
+    Args:
+        tesseract_cmd (str): The path to the `tesseract` executable, next to which the
+            bundled library is looked for first.
+
+    Returns:
+        ctypes.CDLL | None: The library, or None if it could not be found or loaded.
+    """
+    global _capi, _capi_loaded
+    if _capi_loaded:
+        return _capi
+    _capi_loaded = True
+    bundled_path = os.path.join(os.path.dirname(os.path.abspath(tesseract_cmd)), BUNDLED_LIBTESSERACT_NAME)
+    try:
+        if os.path.isfile(bundled_path):
+            # The bundled library's dependencies (Leptonica etc.) sit in the same folder
+            os.add_dll_directory(os.path.dirname(bundled_path))
+            library = ctypes.CDLL(bundled_path)
+        else:
+            library_name = ctypes.util.find_library("tesseract")
+            if library_name is None:
+                return None
+            library = ctypes.CDLL(library_name)
+        handle, text, monitor = ctypes.c_void_p, ctypes.c_void_p, ctypes.c_void_p
+        for name, restype, argtypes in (
+                ("TessBaseAPICreate", handle, []),
+                ("TessBaseAPIInit3", ctypes.c_int, [handle, ctypes.c_char_p, ctypes.c_char_p]),
+                ("TessBaseAPISetImage", None, [handle, ctypes.c_char_p, ctypes.c_int, ctypes.c_int, ctypes.c_int, ctypes.c_int]),
+                ("TessBaseAPIRecognize", ctypes.c_int, [handle, monitor]),
+                ("TessBaseAPIGetUTF8Text", text, [handle]),
+                ("TessDeleteText", None, [text]),
+                ("TessBaseAPIClear", None, [handle]),
+                ("TessBaseAPIEnd", None, [handle]),
+                ("TessBaseAPIDelete", None, [handle]),
+                ("TessMonitorCreate", monitor, []),
+                ("TessMonitorSetDeadlineMSecs", None, [monitor, ctypes.c_int]),
+                ("TessMonitorDelete", None, [monitor])):
+            function = getattr(library, name)
+            function.restype, function.argtypes = restype, argtypes
+    except (OSError, AttributeError) as e:
+        print(f"AVISO: Biblioteca do Tesseract indisponível ({e}). O OCR iniciará um processo por imagem.")
+        return None
+    _capi = library
+    return _capi
+
+
+def get_pool(tesseract_cmd, tessdata_path, size=DEFAULT_POOL_SIZE, page_timeout=DEFAULT_PAGE_TIMEOUT):
+    """Returns this process's OCR pool, creating it on first use.
+
+    Args:
+        tesseract_cmd (str): The path to the `tesseract` executable.
+        tessdata_path (str): The folder holding the language files.
+        size (int, optional): The pool size. Only used when the pool is created.
+        page_timeout (float, optional): The per-image timeout in seconds. Only used when the pool is created.
+
+    Returns:
+        OcrEnginePool: The pool.
+    """
+    global _pool, _pool_pid
+    with _pool_lock:
+        if _pool is None or _pool_pid != os.getpid():
+            _pool = OcrEnginePool(tesseract_cmd, tessdata_path, size=size, page_timeout=page_timeout)
+            _pool_pid = os.getpid()
+        return _pool
@@ -6,6 +6,10 @@ This module contains functions for:
 - Classifying files based on their content using both local (SBERT) and cloud-based (Google Gemini via Supabase Edge Functions) models.
 - Managing a local cache to avoid re-processing files.
 - Simulating the file organization process to show users a preview.
+
+Heavy libraries (OpenCV, PyMuPDF, Tesseract, the Office/HTML parsers and the SBERT
+model) are only imported the first time they are needed, so importing this module
+stays fast for users who never run the local model.
 """
 
 import subprocess
@@ -13,25 +17,24 @@ import sys
 import os
 import shutil
 import re
-import dateparser
-import docx
-from PIL import Image
-import pytesseract
-from sentence_transformers import SentenceTransformer, util
-import cv2
+import fnmatch
 import numpy as np
-from pdf2image import convert_from_path
-import fitz
-import openpyxl
-from pptx import Presentation
-from bs4 import BeautifulSoup
 import config
-import json
-from postgrest.exceptions import APIError
+import cache_store
+import edge_client
+import ocr_engine
+import instrumentation
+import near_duplicates
+import sqlite3
 import time
-import base64
 import hashlib
+import email.utils
+import datetime
+import mmap
 import requests
+import threading
+from collections import deque, namedtuple
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, wait, FIRST_COMPLETED
 
 # Constants for file extensions, facilitating maintenance
 TEXT_BASED_EXTENSIONS = ['.docx', '.pptx', '.xlsx', '.txt', '.html', '.htm']
@@ -39,6 +42,80 @@ IMAGE_EXTENSIONS = ['jpg', 'jpeg', 'png', 'bmp', 'gif', 'tiff']
 VIDEO_EXTENSIONS = ['mp4', 'mov', 'avi', 'mkv', 'webm']
 NATIVE_GEMINI_EXTENSIONS = ['pdf'] + IMAGE_EXTENSIONS + VIDEO_EXTENSIONS
 
+# Built-in categories, with the descriptions used by the local model and the Gemini prompts
+DEFAULT_CATEGORIES = {
+    "Pessoal": "Documentos que comprovam a identidade, cidadania e vínculos civis do indivíduo. Incluem registros oficiais emitidos por órgãos governamentais que são frequentemente exigidos em processos legais, administrativos ou cadastrais. Exemplos: documentos de identidade como RG (Registro Geral) e CPF (Cadastro de Pessoa Física), CNH (Carteira Nacional de Habilitação), passaporte, título de eleitor, certidões de nascimento e casamento, carteira de trabalho e outros registros civis ou de identificação.",
+
+    "Saúde": "Documentos que reúnem informações sobre o histórico médico, exames clínicos e relações com instituições de saúde. Servem como registros pessoais de atendimentos, diagnósticos, prescrições e acompanhamento de tratamentos, além de comprovarem vínculos com planos de saúde. Exemplos: resultados de exames laboratoriais (como hemogramas), laudos de imagem (raio-X, tomografias, ressonâncias), receitas e prescrições médicas, atestados de saúde, histórico de vacinação, carteiras do SUS, comprovantes de plano ou seguro saúde, entre outros documentos médicos.",
+
+    "Financeiro": "Documentos que envolvem a movimentação de dinheiro, contas a pagar ou a receber, e comprovação de renda ou patrimônio. Inclui tanto registros de consumo e despesas quanto comprovantes de transações bancárias ou fiscais. Exemplos: notas fiscais eletrônicas (NFe), faturas de cartão de crédito, boletos de cobrança, contas mensais (como luz, água, gás, internet, telefone), extratos bancários, comprovantes de transferências, holerites (contracheques), declarações e recibos do Imposto de Renda, comprovantes de pagamento de compras ou serviços.",
+
+    "Jurídico": "Documentos com valor legal que formalizam acordos, representações, disputas ou direitos. São frequentemente utilizados em contextos judiciais ou administrativos, e envolvem relações contratuais, autorizações legais, processos e registros públicos. Exemplos: contratos (de aluguel, prestação de serviços, compra e venda), procurações (públicas ou particulares), petições judiciais, notificações extrajudiciais, acordos firmados, escrituras públicas, alvarás de funcionamento, intimações, sentenças ou despachos judiciais.",
+
+    "Imagens": "Arquivos digitais no formato de imagem que não se enquadram nas demais categorias, geralmente por não conterem conteúdo textual ou por não estarem diretamente relacionados a temas jurídicos, financeiros ou pessoais. Podem ter finalidade decorativa, informativa ou recreativa. Exemplos: fotografias pessoais, selfies, imagens de viagens, wallpapers, memes, ilustrações, capturas de tela sem conteúdo documental (como prints de conversas ou redes sociais).",
+
+    "Vídeos": "Arquivos em formato audiovisual que registram cenas, sons e movimentos. Normalmente são utilizados para fins pessoais, educativos, informativos ou de entretenimento. Não pertencem às demais categorias por não conterem, necessariamente, informações estruturadas ou documentais. Exemplos: vídeos caseiros, gravações de tela (screen recordings), clipes de eventos, vídeos salvos de redes sociais ou plataformas como YouTube, registros de reuniões online, entrevistas pessoais, entre outros.",
+
+    "Outros": "Categoria genérica destinada a arquivos que não se encaixam com clareza em nenhuma das classificações anteriores. Pode incluir documentos pouco padronizados, arquivos técnicos, formatos incomuns ou conteúdos que exigem uma análise mais aprofundada para classificação correta. Utilizada também como categoria temporária para revisão manual posterior."
+}
+
+# Folder that receives the identical copies of a file when duplicates are routed apart
+DUPLICATES_CATEGORY = "Duplicados"
+# Method of the files that reuse the result of an identical file of the same scan
+DUPLICATE_METHOD = "duplicado"
+# Method of the files that reuse the category of a previously classified document with nearly the same text
+NEAR_DUPLICATE_METHOD = "quase_duplicado"
+# Method of the videos too large to upload, which have no text to classify either and are
+# left in 'Outros' for the media-type fallback of _apply_category_adjustments
+OVERSIZED_MEDIA_METHOD = "midia_grande"
+
+# Default worker counts for each stage of the pipeline mode of simulate_organization
+DEFAULT_HASH_WORKERS = 4
+DEFAULT_EXTRACTION_WORKERS = max(1, (os.cpu_count() or 2) - 1)
+DEFAULT_EDGE_WORKERS = 4
+DEFAULT_SBERT_BATCH_SIZE = 32
+
+# Edge Function calls: attempts for failed calls, waits allowed on rate-limited (429) responses
+# and the longest Retry-After delay honoured, in seconds
+EDGE_MAX_RETRIES = 3
+EDGE_MAX_RATE_LIMIT_WAITS = 5
+EDGE_MAX_RETRY_AFTER = 60
+
+# Largest file sent as-is to the file classification Edge Function (Gemini accepts about
+# 20 MB of inline data, which the Base64 encoding inflates by a third), and the size that
+# larger images are downsampled to
+MAX_EDGE_UPLOAD_BYTES = 14 * 1024 * 1024
+UPLOAD_IMAGE_MAX_DIMENSION = 3072
+
+# OCR engines per process (long-lived, see ocr_engine), engines in each process
+# of the extraction process pool (which already runs one file per CPU), and maximum time
+# spent on one image or page, in seconds
+OCR_POOL_SIZE = ocr_engine.DEFAULT_POOL_SIZE
+EXTRACTION_PROCESS_OCR_POOL_SIZE = 1
+OCR_PAGE_TIMEOUT = ocr_engine.DEFAULT_PAGE_TIMEOUT
+
+# PDF OCR fallback: rendering resolution, maximum number of pages, amount of text after
+# which the remaining pages are skipped (pages are OCR'd OCR_POOL_SIZE at a time)
+PDF_OCR_DPI = 200
+PDF_OCR_MAX_PAGES = 5
+PDF_OCR_TARGET_CHARS = 2000
+# Longest side, in pixels, that images are downscaled to before OCR (about 250 dpi for an A4 page)
+OCR_MAX_IMAGE_DIMENSION = 3000
+
+# Character budget of text extraction: classification never uses more (the Edge Function
+# truncates documents to 15,000 characters), so extractors stop reading past it
+EXTRACTION_CHAR_BUDGET = 15000
+
+# Version of the text extractors. Bump it whenever an extractor changes its output,
+# so texts stored in the extracted-text cache are extracted again.
+EXTRACTOR_VERSION = 4
+TEXT_CACHE_FILE = "text_cache.db"
+
+# File hashing: index of already hashed files, read chunk size and size from which files are memory-mapped
+HASH_INDEX_FILE = "hash_index.db"
+HASH_CHUNK_SIZE = 1024 * 1024
+HASH_MMAP_THRESHOLD = 64 * 1024 * 1024
+
 
 # Patch to ensure that the PyInstaller executable does not open a console window.
 if sys.platform == "win32" and getattr(sys, 'frozen', False):
@@ -69,61 +146,135 @@ def get_app_data_path():
     return path
 
 
-def get_file_hash(file_path):
-    """Calculates the SHA-256 hash of a file.
+def compute_file_hash(file_path):
+    """Calculates the SHA-256 hash of a file by reading its content.
 
-    Reads the file in chunks to avoid high memory usage for large files.
+    Small files are read in large chunks into a reused buffer, and big files are
+    memory-mapped and hashed in a single call, so hashing is limited by disk speed
+    rather than by Python overhead.
 
     Args:
         file_path (str): The path to the file.
 
     Returns:
-        str or None: The hex digest of the hash, or None if an error occurs.
+        str: The hex digest of the hash.
+
+    Raises:
+        OSError: If the file cannot be read.
     """
     sha256_hash = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        file_size = os.fstat(f.fileno()).st_size
+        if file_size >= HASH_MMAP_THRESHOLD:
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped_file:
+                sha256_hash.update(mapped_file)
+        else:
+            buffer = bytearray(HASH_CHUNK_SIZE)
+            view = memoryview(buffer)
+            while True:
+                bytes_read = f.readinto(buffer)
+                if not bytes_read: break
+                sha256_hash.update(view[:bytes_read])
+    return sha256_hash.hexdigest()
+
+
+_hash_index = None
+_hash_index_lock = threading.Lock()
+
+
+def get_hash_index():
+    """Returns the shared file-identity hash index, opening it on first use.
+
+    Returns:
+        cache_store.HashIndex: The index of previously computed file hashes.
+    """
+    global _hash_index
+    with _hash_index_lock:
+        if _hash_index is None:
+            _hash_index = cache_store.HashIndex(os.path.join(get_app_data_path(), HASH_INDEX_FILE))
+        return _hash_index
+
+
+def get_file_hash(file_path, stat_result=None):
+    """Returns the SHA-256 hash of a file.
+
+    Files whose path, size, modification time and inode did not change since the
+    last scan reuse the hash stored in the file-identity index and are not read
+    again. Other files are hashed with `compute_file_hash` and recorded in the index.
+
+    Args:
+        file_path (str): The path to the file.
+        stat_result (os.stat_result, optional): The file's stat information, if already known (e.g. from `os.scandir`).
+
+    Returns:
+        str or None: The hex digest of the hash, or None if an error occurs.
+    """
     try:
-        with open(file_path, "rb") as f:
-            for byte_block in iter(lambda: f.read(4096), b""):
-                sha256_hash.update(byte_block)
-        return sha256_hash.hexdigest()
+        absolute_path = os.path.abspath(file_path)
+        stat_result = stat_result or os.stat(absolute_path)
+        hash_index = get_hash_index()
+        with instrumentation.timed("cache_lookup"):
+            file_hash = hash_index.get(absolute_path, stat_result)
+        if file_hash is None:
+            with instrumentation.timed("hash"):
+                file_hash = compute_file_hash(absolute_path)
+            hash_index.put(absolute_path, stat_result, file_hash)
+        return file_hash
     except Exception as e:
         print(f"AVISO: Não foi possível calcular o hash para {os.path.basename(file_path)}: {e}")
         return None
 
 
 def load_cache(user_id):
-    """Loads the JSON cache file for a specific user.
+    """Opens the classification cache of a specific user.
 
-    The cache stores file hashes and their corresponding classification results.
+    The cache stores file hashes and their corresponding classification results in an
+    SQLite database. A JSON cache left by older versions is migrated on first open.
 
     Args:
         user_id (str): The unique identifier for the user.
 
     Returns:
-        dict: The loaded cache data, or an empty dictionary if the cache doesn't exist or is invalid.
+        cache_store.ClassificationCache: The dictionary-like cache. Results stored in it
+        are committed immediately.
     """
-    cache_path = os.path.join(get_app_data_path(), f"cache_{user_id}.json")
-    if os.path.exists(cache_path):
-        try:
-            with open(cache_path, 'r', encoding='utf-8') as f:
-                return json.load(f)
-        except (json.JSONDecodeError, IOError):
-            return {}
-    return {}
+    app_data_path = get_app_data_path()
+    return cache_store.ClassificationCache(
+        os.path.join(app_data_path, f"cache_{user_id}.db"),
+        legacy_json_path=os.path.join(app_data_path, f"cache_{user_id}.json"))
+
+
+def open_near_duplicate_index(user_id):
+    """Opens the near-duplicate index of a specific user, next to their classification cache.
+
+    Args:
+        user_id (str): The unique identifier for the user.
+
+    Returns:
+        cache_store.NearDuplicateIndex: The MinHash index of the documents classified by Gemini.
+    """
+    return cache_store.NearDuplicateIndex(os.path.join(get_app_data_path(), f"near_duplicates_{user_id}.db"),
+                                          near_duplicates.LSH_BANDS, near_duplicates.SIGNATURE_VERSION)
 
 
 def save_cache(user_id, cache_data):
-    """Saves the cache dictionary to a JSON file for a specific user.
+    """Flushes and closes a user's classification cache.
+
+    Results stored in a cache returned by `load_cache` are already committed, so this
+    only closes it. A plain dictionary is written into the user's cache in a single
+    transaction.
 
     Args:
         user_id (str): The unique identifier for the user.
-        cache_data (dict): The cache dictionary to be saved.
+        cache_data (cache_store.ClassificationCache or dict): The cache to be saved.
     """
-    cache_path = os.path.join(get_app_data_path(), f"cache_{user_id}.json")
     try:
-        with open(cache_path, 'w', encoding='utf-8') as f:
-            json.dump(cache_data, f, indent=4)
-    except IOError as e:
+        if not isinstance(cache_data, cache_store.ClassificationCache):
+            cache = load_cache(user_id)
+            cache.update(cache_data)
+            cache_data = cache
+        cache_data.close()
+    except sqlite3.Error as e:
         print(f"ERRO: Falha ao salvar o cache para o usuário {user_id}: {e}")
 
 
@@ -141,36 +292,47 @@ def get_tesseract_path():
     return os.path.join(base_path, 'tesseract', 'tesseract')
 
 
-def get_poppler_path():
-    """Returns the path to the bundled Poppler 'bin' folder.
-
-    Detects whether the app is running from source or as a frozen executable (PyInstaller).
-    Required by pdf2image to convert PDFs to images.
-
-    Returns:
-        str: The path to the Poppler bin directory.
-    """
-    base_path = sys._MEIPASS if getattr(sys, 'frozen', False) else os.path.dirname(os.path.abspath(__file__))
-    if sys.platform == "win32":
-        return os.path.join(base_path, 'poppler-24.08.0', 'Library', 'bin')
-    return os.path.join(base_path, 'poppler', 'bin')
-
-
 def configure_tesseract():
     """Configures environment variables for Tesseract to use local packages.
 
-    Sets the command path for pytesseract and the TESSDATA_PREFIX environment
-    variable so Tesseract can find its language data files.
+    Sets the TESSDATA_PREFIX environment variable so Tesseract can find its
+    language data files. The command path is passed to the OCR pool.
     """
     try:
         tess_path = get_tesseract_path()
         tessdata_path = os.path.join(os.path.dirname(tess_path), 'tessdata')
-        pytesseract.pytesseract.tesseract_cmd = tess_path
         os.environ['TESSDATA_PREFIX'] = tessdata_path
+        # Pages and files are OCR'd in parallel already; one thread per Tesseract process avoids oversubscribing the CPU
+        os.environ.setdefault('OMP_THREAD_LIMIT', '1')
     except Exception as e:
         print(f"ERRO CRÍTICO: Falha ao configurar o Tesseract. A função de OCR não funcionará. Detalhes: {e}")
 
 
+_tesseract_configured = False
+
+
+def _init_extraction_process():
+    # Runs in each process of the extraction pool: the pool already extracts one file per
+    # CPU, so each process gets a single OCR engine instead of a pool of them
+    global OCR_POOL_SIZE
+    OCR_POOL_SIZE = EXTRACTION_PROCESS_OCR_POOL_SIZE
+
+
+def get_ocr_pool():
+    """Returns this process's pool of Tesseract engines, configuring the bundled Tesseract on first use.
+
+    Returns:
+        ocr_engine.OcrEnginePool: The OCR pool.
+    """
+    global _tesseract_configured
+    if not _tesseract_configured:
+        configure_tesseract()
+        _tesseract_configured = True
+    tess_path = get_tesseract_path()
+    return ocr_engine.get_pool(tess_path, os.path.join(os.path.dirname(tess_path), 'tessdata'),
+                               size=OCR_POOL_SIZE, page_timeout=OCR_PAGE_TIMEOUT)
+
+
 def preprocess_image(pil_image):
     """Applies basic preprocessing to an image to improve OCR results.
 
@@ -183,21 +345,100 @@ def preprocess_image(pil_image):
     Returns:
         PIL.Image.Image: The preprocessed image.
     """
+    from PIL import Image
     try:
-        img = np.array(pil_image.convert('RGB')) 
-        gray = cv2.cvtColor(img, cv2.COLOR_RGB2GRAY)
-        thresh = cv2.adaptiveThreshold(gray, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C, cv2.THRESH_BINARY, 11, 2)
-        return Image.fromarray(thresh)
+        gray = np.asarray(pil_image.convert('L')).copy()
+        return Image.fromarray(threshold_for_ocr(downscale_for_ocr(gray)))
     except Exception as e:
         print(f"AVISO: Falha no pré-processamento da imagem: {e}")
         return pil_image 
 
 
+def load_grayscale_for_ocr(file_path, max_dimension=None):
+    """Reads an image file straight into a grayscale array sized for OCR.
+
+    The file is decoded by OpenCV directly to grayscale and, for oversized photos, at a
+    reduced scale (1/2, 1/4 or 1/8, chosen from the dimensions in the file header), so
+    the full-resolution color frame is never materialized. Whatever is still above
+    `max_dimension` is then downscaled. Formats OpenCV cannot decode (e.g. GIF) are read
+    through PIL instead.
+
+    Args:
+        file_path (str): The path to the image file.
+        max_dimension (int, optional): The maximum width and height of the result.
+            Defaults to `OCR_MAX_IMAGE_DIMENSION`.
+
+    Returns:
+        numpy.ndarray: A writable 2D uint8 grayscale image.
+    """
+    import cv2
+    from PIL import Image
+    max_dimension = max_dimension or OCR_MAX_IMAGE_DIMENSION
+    with Image.open(file_path) as image:
+        longest_side = max(image.size)
+    reduce_flag = cv2.IMREAD_GRAYSCALE
+    for factor, flag in ((8, cv2.IMREAD_REDUCED_GRAYSCALE_8), (4, cv2.IMREAD_REDUCED_GRAYSCALE_4), (2, cv2.IMREAD_REDUCED_GRAYSCALE_2)):
+        if longest_side // factor >= max_dimension:
+            reduce_flag = flag
+            break
+    # imdecode (instead of imread) also handles non-ASCII paths on Windows
+    gray = cv2.imdecode(np.fromfile(file_path, dtype=np.uint8), reduce_flag)
+    if gray is None:
+        with Image.open(file_path) as image:
+            gray = np.asarray(image.convert('L')).copy()
+    return downscale_for_ocr(gray, max_dimension)
+
+
+def downscale_for_ocr(gray, max_dimension=None):
+    """Shrinks a grayscale image whose longest side exceeds `max_dimension`. Smaller images are returned as they are.
+
+    Args:
+        gray (numpy.ndarray): A 2D uint8 grayscale image.
+        max_dimension (int, optional): The maximum width and height. Defaults to `OCR_MAX_IMAGE_DIMENSION`.
+
+    Returns:
+        numpy.ndarray: The (possibly new) image.
+    """
+    import cv2
+    max_dimension = max_dimension or OCR_MAX_IMAGE_DIMENSION
+    height, width = gray.shape
+    scale = max_dimension / max(height, width)
+    if scale >= 1: return gray
+    return cv2.resize(gray, (max(1, round(width * scale)), max(1, round(height * scale))), interpolation=cv2.INTER_AREA)
+
+
+def threshold_for_ocr(gray):
+    """Binarizes a grayscale image with adaptive thresholding, in place.
+
+    Args:
+        gray (numpy.ndarray): A 2D uint8 grayscale image. It is overwritten with the result.
+
+    Returns:
+        numpy.ndarray: The binarized image (the same array).
+    """
+    import cv2
+    cv2.adaptiveThreshold(gray, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C, cv2.THRESH_BINARY, 11, 2, dst=gray)
+    return gray
+
+
+def ocr_image(image):
+    """Runs Tesseract OCR (Portuguese and English) on an image, through the OCR pool.
+
+    Args:
+        image (PIL.Image.Image | numpy.ndarray): The image to read.
+
+    Returns:
+        str: The recognized text (empty if it took longer than `OCR_PAGE_TIMEOUT`).
+    """
+    return get_ocr_pool().image_to_string(image)
+
+
 def invoke_edge_function_manually(function_name, payload, timeout=120):
     """Invokes a Supabase Edge Function via a direct HTTP request with a timeout.
 
     This is used to call functions that might exceed the default timeout of the
-    Supabase Python client library.
+    Supabase Python client library. The request goes through the shared keep-alive
+    session of `edge_client`, which also records its timing.
 
     Args:
         function_name (str): The name of the Edge Function.
@@ -213,15 +454,10 @@ def invoke_edge_function_manually(function_name, payload, timeout=120):
         raise RuntimeError("Cliente Supabase não inicializado.")
 
     url = f"{config.SUPABASE_URL}/functions/v1/{function_name}"
-    headers = {
-        "Authorization": f"Bearer {config.SUPABASE_KEY}",
-        "Content-Type": "application/json"
-    }
+    headers = {"Authorization": f"Bearer {config.SUPABASE_KEY}"}
 
     try:
-        response = requests.post(url, headers=headers, json=payload, timeout=timeout)
-        response.raise_for_status()
-        return response.json()
+        return edge_client.post_json(url, payload, headers=headers, timeout=timeout, label=function_name)
     except requests.exceptions.Timeout:
         print(f"ERRO: A requisição para '{function_name}' excedeu o tempo limite de {timeout}s.")
         raise
@@ -230,7 +466,67 @@ def invoke_edge_function_manually(function_name, payload, timeout=120):
         raise
 
 
-def extract_from_pdf(file_path):
+class TextBudget:
+    """Accumulates pieces of extracted text up to a character budget.
+
+    Extractors add text as they read a document and stop reading as soon as `add`
+    reports that the budget is met, so large files are never read in full.
+    """
+    def __init__(self, max_chars=None, separator="\n"):
+        """Initializes an empty accumulator.
+
+        Args:
+            max_chars (int, optional): The character budget. None means no limit.
+            separator (str, optional): The string placed between the pieces of text.
+        """
+        self.max_chars = max_chars
+        self.separator = separator
+        self.parts = []
+        self.length = 0
+
+    def add(self, text):
+        """Adds a piece of text. Returns True once the budget is met and reading should stop."""
+        if text:
+            self.parts.append(text)
+            self.length += len(text) + len(self.separator)
+        return self.is_full()
+
+    def is_full(self):
+        """Returns True if the accumulated text already fills the budget."""
+        return self.max_chars is not None and self.length >= self.max_chars
+
+    def value(self):
+        """Returns the accumulated text, stripped and cut to the budget."""
+        text = self.separator.join(self.parts).strip()
+        return text[:self.max_chars] if self.max_chars is not None else text
+
+
+def _iter_ooxml_paragraphs(zip_file, member_name, paragraph_tag, text_tag):
+    """Yields the text of each paragraph of an XML part of an Office Open XML (zip) file.
+
+    The part is parsed incrementally and every paragraph is discarded once read, so
+    memory stays flat however large the document is, and the caller can stop early.
+
+    Args:
+        zip_file (zipfile.ZipFile): The open document.
+        member_name (str): The XML part to read (e.g. 'word/document.xml').
+        paragraph_tag (str): The qualified tag of paragraph elements.
+        text_tag (str): The qualified tag of the text runs inside a paragraph.
+
+    Yields:
+        str: The text of a non-empty paragraph.
+    """
+    import xml.etree.ElementTree as ET
+    with zip_file.open(member_name) as xml_file:
+        for _, element in ET.iterparse(xml_file, events=("end",)):
+            if element.tag == paragraph_tag:
+                paragraph_text = "".join(node.text or "" for node in element.iter(text_tag))
+                element.clear()
+                if paragraph_text.strip():
+                    yield paragraph_text
+
+
+def extract_from_pdf(file_path, max_chars=None, ocr_fallback=True):
     """Extracts text from a PDF file.
 
     First, it tries to extract text directly. If the extracted text is too short,
@@ -238,62 +534,117 @@ def extract_from_pdf(file_path):
 
     Args:
         file_path (str): The path to the PDF file.
+        max_chars (int, optional): Stop reading pages once this much text was extracted. Defaults to no limit.
+        ocr_fallback (bool, optional): If False, only the PDF's text layer is read, however short.
 
     Returns:
         str: The extracted text content, or an empty string on failure.
     """
-    text = ""
+    import fitz
+    text = TextBudget(max_chars, separator="")
     min_text_length_for_ocr_fallback = 100
     try:
         with fitz.open(file_path) as doc:
             for page in doc:
-                text += page.get_text("text")
+                if text.add(page.get_text("text")): break
             
-            if len(text.strip()) < min_text_length_for_ocr_fallback and doc.page_count > 0:
+            if ocr_fallback and len(text.value()) < min_text_length_for_ocr_fallback and doc.page_count > 0:
                 print("  > Texto curto no PDF, tentando OCR como fallback...")
-                images = convert_from_path(file_path, poppler_path=get_poppler_path(), dpi=200, last_page=3)
-                ocr_text_accumulator = ""
-                for i, image in enumerate(images):
-                    preprocessed_image = preprocess_image(image)
-                    ocr_text_accumulator += pytesseract.image_to_string(preprocessed_image, lang='por+eng')
-                
-                if len(ocr_text_accumulator.strip()) > len(text.strip()):
-                    text = ocr_text_accumulator
+                with instrumentation.timed("ocr"):
+                    ocr_text_accumulator = ocr_pdf_pages(doc)
+                if len(ocr_text_accumulator.strip()) > len(text.value()):
+                    text = TextBudget(max_chars)
+                    text.add(ocr_text_accumulator)
     except Exception as e:
         print(f"ERRO ao extrair texto do PDF '{os.path.basename(file_path)}': {e}")
         return ""
-    return text.strip()
+    return text.value()
 
 
-def extract_from_docx(file_path):
+def ocr_pdf_pages(doc, max_pages=PDF_OCR_MAX_PAGES, target_chars=PDF_OCR_TARGET_CHARS, workers=None):
+    """OCRs the first pages of an open PDF, several pages at a time.
+
+    Pages are rendered in order by the calling thread (PyMuPDF documents must not be
+    shared between threads) straight to grayscale pixmaps, and each rendered page is
+    OCR'd in a thread pool while the next ones are rendered. Once the pages read so
+    far, in order, hold `target_chars` characters, no further pages are rendered and
+    the pending ones are cancelled.
+
+    Args:
+        doc (fitz.Document): The open PDF document.
+        max_pages (int, optional): The maximum number of pages to OCR.
+        target_chars (int, optional): The amount of text after which OCR stops.
+        workers (int, optional): The number of pages OCR'd at the same time. Defaults to the
+            OCR pool size of this process.
+
+    Returns:
+        str: The text of the OCR'd pages, in page order.
+    """
+    import fitz
+    workers = workers or OCR_POOL_SIZE
+    page_count = min(doc.page_count, max_pages)
+    page_texts = []
+    recovered_chars = 0
+    with ThreadPoolExecutor(max_workers=workers) as ocr_pool:
+        pending = deque()
+        next_page = 0
+        while next_page < page_count or pending:
+            # Keeps every worker busy, plus one rendered page waiting
+            while next_page < page_count and len(pending) <= workers:
+                pixmap = doc[next_page].get_pixmap(dpi=PDF_OCR_DPI, colorspace=fitz.csGRAY, alpha=False)
+                # Thresholds and OCRs the pixmap's own buffer (kept alive by the closure) instead of a copy
+                gray = np.frombuffer(pixmap.samples_mv, dtype=np.uint8).reshape(pixmap.height, pixmap.stride)
+                gray = gray if pixmap.stride == pixmap.width else np.ascontiguousarray(gray[:, :pixmap.width])
+                pending.append(ocr_pool.submit(lambda image, _pixmap=pixmap: ocr_image(threshold_for_ocr(image)), gray))
+                next_page += 1
+            page_text = pending.popleft().result()
+            page_texts.append(page_text)
+            recovered_chars += len(page_text.strip())
+            if recovered_chars >= target_chars:
+                for future in pending:
+                    future.cancel()
+                break
+    return "\n".join(page_texts)
+
+
+def extract_from_docx(file_path, max_chars=None):
     """Extracts text from a DOCX file.
 
+    Reads the paragraphs of the document body (tables included) as a stream.
+
     Args:
         file_path (str): The path to the DOCX file.
+        max_chars (int, optional): Stop reading once this much text was extracted. Defaults to no limit.
 
     Returns:
         str: The extracted text content, or an empty string on failure.
     """
+    import zipfile
+    word_namespace = "{http://schemas.openxmlformats.org/wordprocessingml/2006/main}"
+    text = TextBudget(max_chars)
     try:
-        doc = docx.Document(file_path)
-        return "\n".join([p.text for p in doc.paragraphs]).strip()
+        with zipfile.ZipFile(file_path) as docx_file:
+            for paragraph_text in _iter_ooxml_paragraphs(docx_file, "word/document.xml", f"{word_namespace}p", f"{word_namespace}t"):
+                if text.add(paragraph_text): break
+        return text.value()
     except Exception as e:
         print(f"ERRO ao extrair texto do DOCX '{os.path.basename(file_path)}': {e}")
         return ""
 
 
-def extract_from_txt(file_path):
+def extract_from_txt(file_path, max_chars=None):
     """Extracts text from a plain text file.
 
     Args:
         file_path (str): The path to the TXT file.
+        max_chars (int, optional): Read at most this many characters. Defaults to the whole file.
 
     Returns:
         str: The file's content, or an empty string on failure.
     """
     try:
         with open(file_path, 'r', encoding='utf-8', errors='ignore') as f:
-            return f.read().strip()
+            return f.read(max_chars if max_chars is not None else -1).strip()
     except Exception as e:
         print(f"ERRO ao extrair texto do TXT '{os.path.basename(file_path)}': {e}")
         return ""
@@ -309,91 +660,126 @@ def extract_from_image(file_path):
         str: The extracted text content, or an empty string on failure.
     """
     try:
-        image = Image.open(file_path)
-        preprocessed_image = preprocess_image(image)
-        return pytesseract.image_to_string(preprocessed_image, lang='por+eng').strip()
+        with instrumentation.timed("ocr"):
+            gray = load_grayscale_for_ocr(file_path)
+            return ocr_image(threshold_for_ocr(gray)).strip()
     except Exception as e:
         print(f"ERRO ao extrair texto da Imagem '{os.path.basename(file_path)}': {e}")
         return ""
 
 
-def extract_from_xlsx(file_path):
+def extract_from_xlsx(file_path, max_chars=None):
     """Extracts text from an XLSX (Excel) file.
 
-    Iterates through all cells in all sheets and concatenates their values.
+    Iterates through the cells of every sheet, in read-only (streaming) mode, and
+    concatenates their values.
 
     Args:
         file_path (str): The path to the XLSX file.
+        max_chars (int, optional): Stop reading once this much text was extracted. Defaults to no limit.
 
     Returns:
         str: The extracted text content, or an empty string on failure.
     """
-    text_content = []
+    import openpyxl
+    text = TextBudget(max_chars)
     try:
-        workbook = openpyxl.load_workbook(file_path, data_only=True)
-        for sheet in workbook:
-            for row in sheet.iter_rows():
-                row_text = [str(cell.value) for cell in row if cell.value is not None]
-                if row_text:
-                    text_content.append(" | ".join(row_text))
-        return "\n".join(text_content).strip()
+        workbook = openpyxl.load_workbook(file_path, read_only=True, data_only=True)
+        try:
+            for sheet in workbook:
+                for row in sheet.iter_rows(values_only=True):
+                    row_text = [str(value) for value in row if value is not None]
+                    if row_text and text.add(" | ".join(row_text)): break
+                if text.is_full(): break
+        finally:
+            workbook.close()
+        return text.value()
     except Exception as e:
         print(f"ERRO ao extrair texto do XLSX '{os.path.basename(file_path)}': {e}")
         return ""
 
 
-def extract_from_pptx(file_path):
+def extract_from_pptx(file_path, max_chars=None):
     """Extracts text from a PPTX (PowerPoint) file.
 
-    Iterates through all shapes on all slides and extracts their text content.
+    Reads the text paragraphs of the slides in order, as a stream, without loading
+    the rest of the presentation (layouts, media).
 
     Args:
         file_path (str): The path to the PPTX file.
+        max_chars (int, optional): Stop reading once this much text was extracted. Defaults to no limit.
 
     Returns:
         str: The extracted text content, or an empty string on failure.
     """
-    text_content = []
+    import zipfile
+    drawing_namespace = "{http://schemas.openxmlformats.org/drawingml/2006/main}"
+    text = TextBudget(max_chars)
     try:
-        prs = Presentation(file_path)
-        for slide in prs.slides:
-            for shape in slide.shapes:
-                if hasattr(shape, "text"):
-                    text_content.append(shape.text)
-        return "\n".join(text_content).strip()
+        with zipfile.ZipFile(file_path) as pptx_file:
+            slide_names = [name for name in pptx_file.namelist() if re.fullmatch(r"ppt/slides/slide\d+\.xml", name)]
+            slide_names.sort(key=lambda name: int(re.search(r"(\d+)\.xml$", name).group(1)))
+            for slide_name in slide_names:
+                for paragraph_text in _iter_ooxml_paragraphs(pptx_file, slide_name, f"{drawing_namespace}p", f"{drawing_namespace}t"):
+                    if text.add(paragraph_text): break
+                if text.is_full(): break
+        return text.value()
     except Exception as e:
         print(f"ERRO ao extrair texto do PPTX '{os.path.basename(file_path)}': {e}")
         return ""
 
 
-def extract_from_html(file_path):
+def extract_from_html(file_path, max_chars=None):
     """Extracts text from an HTML file.
 
-    Removes common non-content tags like <script>, <style>, <nav>, etc.,
-    before extracting the visible text.
+    Skips common non-content tags like <script>, <style>, <nav>, etc., and
+    extracts the visible text. The file is parsed in chunks.
 
     Args:
         file_path (str): The path to the HTML file.
+        max_chars (int, optional): Stop reading once this much text was extracted. Defaults to no limit.
 
     Returns:
         str: The extracted text content, or an empty string on failure.
     """
+    from html.parser import HTMLParser
+    skipped_tags = {"script", "style", "nav", "footer", "aside"}
+    text = TextBudget(max_chars)
+
+    class VisibleTextParser(HTMLParser):
+        def __init__(self):
+            super().__init__(convert_charrefs=True)
+            self.skipped_depth = 0
+
+        def handle_starttag(self, tag, attrs):
+            if tag in skipped_tags: self.skipped_depth += 1
+
+        def handle_endtag(self, tag):
+            if tag in skipped_tags and self.skipped_depth: self.skipped_depth -= 1
+
+        def handle_data(self, data):
+            if not self.skipped_depth and data.strip():
+                text.add(data.strip())
+
     try:
+        parser = VisibleTextParser()
         with open(file_path, 'r', encoding='utf-8', errors='ignore') as f:
-            soup = BeautifulSoup(f.read(), 'html.parser')
-        for element in soup(["script", "style", "nav", "footer", "aside"]):
-            element.extract()
-        return soup.get_text(separator='\n', strip=True)
+            while not text.is_full() and (chunk := f.read(64 * 1024)):
+                parser.feed(chunk)
+        parser.close()
+        return text.value()
     except Exception as e:
         print(f"ERRO ao extrair texto do HTML '{os.path.basename(file_path)}': {e}")
         return ""
 
 
-def extract_text_from_file(file_path):
+def extract_text_from_file(file_path, max_chars=EXTRACTION_CHAR_BUDGET):
     """Dispatches to the correct text extractor based on the file extension.
 
     Args:
         file_path (str): The path to the file.
+        max_chars (int, optional): The character budget: extractors stop reading once they
+            have this much text. Defaults to `EXTRACTION_CHAR_BUDGET`; None reads everything.
 
     Returns:
         str: The extracted text, or a message indicating an unsupported format.
@@ -410,12 +796,96 @@ def extract_text_from_file(file_path):
         '.htm': extract_from_html,
     }
     
-    if extension in extraction_map:
-        return extraction_map[extension](file_path)
-    elif extension in [f".{e}" for e in IMAGE_EXTENSIONS]:
-        return extract_from_image(file_path)
-    else:
-        return "Formato de arquivo não suportado."
+    with instrumentation.timed("extraction"):
+        if extension in extraction_map:
+            return extraction_map[extension](file_path, max_chars)
+        elif extension in [f".{e}" for e in IMAGE_EXTENSIONS]:
+            text_content = extract_from_image(file_path)
+            return text_content[:max_chars] if max_chars is not None else text_content
+    return "Formato de arquivo não suportado."
+
+
+def extract_text_without_ocr(file_path, max_chars=EXTRACTION_CHAR_BUDGET):
+    """Extracts the text of a file only if that needs no OCR.
+
+    Text-based formats are extracted as by `extract_text_from_file`, and PDFs from their
+    text layer only.
+
+    Returns:
+        str or None: The text, or None for images and other formats that would need OCR.
+    """
+    extension = os.path.splitext(file_path)[1].lower()
+    if extension == ".pdf":
+        with instrumentation.timed("extraction"):
+            return extract_from_pdf(file_path, max_chars, ocr_fallback=False)
+    if extension in TEXT_BASED_EXTENSIONS:
+        return extract_text_from_file(file_path, max_chars)
+    return None
+
+
+_text_cache = None
+_text_cache_lock = threading.Lock()
+
+
+def get_text_cache():
+    """Returns the shared extracted-text cache, opening it on first use.
+
+    Returns:
+        cache_store.TextCache: The store of extracted texts and document embeddings.
+    """
+    global _text_cache
+    with _text_cache_lock:
+        if _text_cache is None:
+            _text_cache = cache_store.TextCache(os.path.join(get_app_data_path(), TEXT_CACHE_FILE))
+        return _text_cache
+
+
+def extract_text_cached(file_path, file_hash, extract_fn=None):
+    """Extracts the text of a file, reusing the extracted-text cache when possible.
+
+    Args:
+        file_path (str): The path to the file.
+        file_hash (str or None): The file's hash. If None, the cache is bypassed.
+        extract_fn (function, optional): The extractor to run on a cache miss. Defaults to `extract_text_from_file`.
+
+    Returns:
+        str: The extracted text, or a message indicating an unsupported format.
+    """
+    if file_hash:
+        with instrumentation.timed("cache_lookup"):
+            cached_text = get_text_cache().get_text(file_hash, EXTRACTOR_VERSION)
+        if cached_text is not None:
+            return cached_text
+    text_content = (extract_fn or extract_text_from_file)(file_path)
+    if file_hash and text_content != "Formato de arquivo não suportado.":
+        get_text_cache().put_text(file_hash, EXTRACTOR_VERSION, text_content)
+    return text_content
+
+
+def near_duplicate_text_cached(file_path, file_hash, extract_fn=None):
+    """Returns the text to look a file up in the near-duplicate index, if it is cheap to get.
+
+    The extracted-text cache is used when it has the file; otherwise the file is only read
+    if that needs no OCR, so scans and images are never OCR'd just for the lookup.
+
+    Args:
+        file_path (str): The path to the file.
+        file_hash (str or None): The file's hash. If None, the cache is bypassed.
+        extract_fn (function, optional): The extractor to run on a cache miss. Defaults to `extract_text_without_ocr`.
+
+    Returns:
+        str or None: The text, or None if it would need OCR.
+    """
+    if file_hash:
+        with instrumentation.timed("cache_lookup"):
+            cached_text = get_text_cache().get_text(file_hash, EXTRACTOR_VERSION)
+        if cached_text is not None:
+            return cached_text
+    text_content = (extract_fn or extract_text_without_ocr)(file_path)
+    # Only text-based formats are extracted in full; a PDF's text layer alone is not what the cache holds
+    if file_hash and text_content is not None and os.path.splitext(file_path)[1].lower() in TEXT_BASED_EXTENSIONS:
+        get_text_cache().put_text(file_hash, EXTRACTOR_VERSION, text_content)
+    return text_content
 
 
 def extract_dates(text_content):
@@ -428,6 +898,7 @@ def extract_dates(text_content):
         list[datetime.datetime]: A list of parsed datetime objects found in the text.
     """
     if not text_content: return []
+    import dateparser
     pattern = r'\b(\d{1,2}[./-]\d{1,2}[./-]\d{2,4})\b'
     found_dates_str = re.findall(pattern, text_content)
     parsed_dates = []
@@ -443,44 +914,264 @@ def extract_dates(text_content):
 
 MODEL_NAME = 'paraphrase-multilingual-mpnet-base-v2'
 MODEL_SUBFOLDER = os.path.join('modelos', MODEL_NAME) 
-configure_tesseract()
 
 model_sbert = None
-try:
-    print("Carregando modelo de linguagem local (SBERT)...")
-    model_path_sbert = os.path.join(sys._MEIPASS, MODEL_SUBFOLDER) if getattr(sys, 'frozen', False) else MODEL_SUBFOLDER
-    if os.path.exists(model_path_sbert):
-        model_sbert = SentenceTransformer(model_path_sbert)
-        print("Modelo SBERT carregado com sucesso.")
-    else:
-        print(f"ERRO FATAL: O diretório do modelo SBERT não foi encontrado em '{model_path_sbert}'")
-        sys.exit("Falha ao carregar modelo local. O aplicativo não pode continuar.")
-except Exception as e:
-    print(f"ERRO FATAL ao carregar o modelo de linguagem SBERT: {e}")
-    sys.exit("Falha ao carregar modelo local. O aplicativo não pode continuar.")
+_model_sbert_lock = threading.Lock()
+
+
+def get_sbert_model():
+    """Returns the local SBERT model, loading it on first use.
+
+    Loading is thread-safe: concurrent callers wait for a single load, which is
+    usually already running in the background (see `preload_sbert_model`).
+
+    Returns:
+        SentenceTransformer: The loaded model.
+
+    Raises:
+        RuntimeError: If the model folder is missing or the model fails to load.
+    """
+    global model_sbert
+    with _model_sbert_lock:
+        if model_sbert is None:
+            print("Carregando modelo de linguagem local (SBERT)...")
+            start_time = time.perf_counter()
+            model_path_sbert = os.path.join(sys._MEIPASS, MODEL_SUBFOLDER) if getattr(sys, 'frozen', False) else MODEL_SUBFOLDER
+            if not os.path.exists(model_path_sbert):
+                print(f"ERRO FATAL: O diretório do modelo SBERT não foi encontrado em '{model_path_sbert}'")
+                raise RuntimeError(f"Modelo local não encontrado em '{model_path_sbert}'.")
+            try:
+                from sentence_transformers import SentenceTransformer
+                model_sbert = SentenceTransformer(model_path_sbert)
+            except Exception as e:
+                print(f"ERRO FATAL ao carregar o modelo de linguagem SBERT: {e}")
+                raise RuntimeError(f"Falha ao carregar o modelo local: {e}") from e
+            print(f"Modelo SBERT carregado com sucesso em {time.perf_counter() - start_time:.1f}s.")
+        return model_sbert
+
+
+def preload_sbert_model(on_done=None):
+    """Loads the local SBERT model in a background thread.
+
+    Args:
+        on_done (function, optional): Called from the background thread once loading ends,
+            with the load time in seconds and the error message (None on success).
+
+    Returns:
+        threading.Thread: The started thread.
+    """
+    def _load():
+        start_time = time.perf_counter()
+        error_message = None
+        try:
+            get_sbert_model()
+        except RuntimeError as e:
+            error_message = str(e)
+        if on_done:
+            on_done(time.perf_counter() - start_time, error_message)
+
+    thread = threading.Thread(target=_load, daemon=True)
+    thread.start()
+    return thread
+
+
+def _as_numpy_embedding(embedding):
+    """Returns an SBERT embedding as a float32 numpy array, whether it is a numpy array or a torch tensor."""
+    if hasattr(embedding, "detach"):
+        embedding = embedding.detach().cpu().numpy()
+    return np.asarray(embedding, dtype=np.float32)
+
+
+def encode_texts_local(texts, batch_size=DEFAULT_SBERT_BATCH_SIZE):
+    """Encodes several texts with the local SBERT model in a single batched call.
+
+    Args:
+        texts (list[str]): The texts to encode.
+        batch_size (int, optional): The batch size passed to the SBERT encoder.
+
+    Returns:
+        list: The normalized numpy embedding of each text, or None for texts too short to classify.
+    """
+    embeddings = [None] * len(texts)
+    valid_indexes = [i for i, text in enumerate(texts) if text and len(text.strip()) >= 5]
+    if valid_indexes:
+        model = get_sbert_model()
+        with instrumentation.timed("embedding"):
+            encoded = model.encode([texts[i] for i in valid_indexes], batch_size=batch_size, normalize_embeddings=True)
+        for i, embedding in zip(valid_indexes, encoded):
+            embeddings[i] = _as_numpy_embedding(embedding)
+    return embeddings
+
+
+def classify_embeddings_local(text_embeddings, categories_embeddings_dict):
+    """Classifies pre-computed document embeddings against the category embeddings.
+
+    The category embeddings are stacked into one matrix, so the cosine similarity of
+    every document against every category is a single matrix multiplication followed
+    by an argmax per document.
+
+    Args:
+        text_embeddings (list): Normalized document embeddings, as returned by `encode_texts_local`. None entries are classified as 'Outros'.
+        categories_embeddings_dict (dict): A dictionary mapping category names to their SBERT embeddings (numpy arrays or tensors).
+
+    Returns:
+        list[tuple[str, float]]: The best-matching category name and its confidence score (0.0 to 1.0) for each document, in input order.
+    """
+    results = [("Outros", 0.0)] * len(text_embeddings)
+    valid_indexes = [i for i, embedding in enumerate(text_embeddings) if embedding is not None]
+    category_names = [name for name, embedding in categories_embeddings_dict.items() if embedding is not None]
+    if not valid_indexes or not category_names: return results
+
+    with instrumentation.timed("classification"):
+        category_matrix = np.vstack([_as_numpy_embedding(categories_embeddings_dict[name]) for name in category_names])
+        category_matrix /= np.maximum(np.linalg.norm(category_matrix, axis=1, keepdims=True), 1e-12)
+        document_matrix = np.vstack([text_embeddings[i] for i in valid_indexes])
+
+        similarities = document_matrix @ category_matrix.T
+        best_indexes = similarities.argmax(axis=1)
+    for row, (i, best_index) in enumerate(zip(valid_indexes, best_indexes)):
+        results[i] = (category_names[best_index], (float(similarities[row, best_index]) + 1) / 2)
+    return results
+
+
+def classify_contents_local(texts, categories_embeddings_dict, batch_size=DEFAULT_SBERT_BATCH_SIZE):
+    """Classifies several texts at once using the local SBERT model.
+
+    All documents are encoded in a single batched `encode` call and then classified
+    with `classify_embeddings_local`.
+
+    Args:
+        texts (list[str]): The text contents to classify.
+        categories_embeddings_dict (dict): A dictionary mapping category names to their SBERT embeddings (numpy arrays or tensors).
+        batch_size (int, optional): The batch size passed to the SBERT encoder.
+
+    Returns:
+        list[tuple[str, float]]: The best-matching category name and its confidence score (0.0 to 1.0) for each text, in input order.
+    """
+    return classify_embeddings_local(encode_texts_local(texts, batch_size), categories_embeddings_dict)
+
+
+def classify_contents_local_cached(texts, file_hashes, categories_embeddings_dict, batch_size=DEFAULT_SBERT_BATCH_SIZE):
+    """Classifies several texts locally, reusing document embeddings from the extracted-text cache.
+
+    Only the texts without a cached embedding for the current model are encoded, and
+    their new embeddings are stored for the next run.
+
+    Args:
+        texts (list[str]): The text contents to classify.
+        file_hashes (list): The hash of the file each text came from (None to bypass the cache).
+        categories_embeddings_dict (dict): A dictionary mapping category names to their SBERT embeddings.
+        batch_size (int, optional): The batch size passed to the SBERT encoder.
+
+    Returns:
+        list[tuple[str, float]]: The best-matching category name and its confidence score for each text, in input order.
+    """
+    text_cache = get_text_cache()
+    with instrumentation.timed("cache_lookup"):
+        text_embeddings = [text_cache.get_embedding(file_hash, EXTRACTOR_VERSION, MODEL_NAME) if file_hash else None for file_hash in file_hashes]
+    missing_indexes = [i for i, embedding in enumerate(text_embeddings) if embedding is None]
+    if missing_indexes:
+        encoded = encode_texts_local([texts[i] for i in missing_indexes], batch_size)
+        for i, embedding in zip(missing_indexes, encoded):
+            text_embeddings[i] = embedding
+            if embedding is not None and file_hashes[i]:
+                text_cache.put_embedding(file_hashes[i], EXTRACTOR_VERSION, MODEL_NAME, embedding)
+    return classify_embeddings_local(text_embeddings, categories_embeddings_dict)
 
 
 def classify_content_local(text, categories_embeddings_dict):
     """Classifies text using the local SBERT model via cosine similarity.
 
     Compares the text's embedding with pre-computed embeddings of category descriptions.
+    This is the single-document form of `classify_contents_local`.
 
     Args:
         text (str): The text content to classify.
-        categories_embeddings_dict (dict): A dictionary mapping category names to their SBERT tensor embeddings.
+        categories_embeddings_dict (dict): A dictionary mapping category names to their SBERT embeddings.
 
     Returns:
         tuple[str, float]: A tuple containing the best-matching category name and its confidence score (0.0 to 1.0).
     """
-    if not text or len(text.strip()) < 5: return "Outros", 0.0
-    text_embedding = model_sbert.encode(text, convert_to_tensor=True)
-    max_similarity, best_category = -1.0, "Outros"
-    for category_name, description_embedding in categories_embeddings_dict.items():
-        if description_embedding is None: continue
-        similarity = util.cos_sim(text_embedding, description_embedding).item()
-        if similarity > max_similarity:
-            max_similarity, best_category = similarity, category_name
-    return best_category, (max_similarity + 1) / 2
+    return classify_contents_local([text], categories_embeddings_dict)[0]
+
+
+CATEGORY_EMBEDDINGS_CACHE_FILE = "category_embeddings.npz"
+_category_embeddings_cache = None
+_category_embeddings_lock = threading.Lock()
+
+
+def _category_embedding_key(name, description):
+    """Builds the persistent cache key of a category embedding.
+
+    The key combines the SBERT model name with a hash of the category name and
+    description, so an entry is only invalidated when one of them changes.
+    """
+    digest = hashlib.sha256(f"{name}\n{description}".encode("utf-8")).hexdigest()
+    return f"{MODEL_NAME}__{digest}"
+
+
+def _load_category_embeddings_cache():
+    """Loads the category embeddings cache from disk, once per session.
+
+    Must be called with `_category_embeddings_lock` held.
+
+    Returns:
+        dict: The cache, mapping cache keys to numpy embeddings.
+    """
+    global _category_embeddings_cache
+    if _category_embeddings_cache is None:
+        _category_embeddings_cache = {}
+        cache_path = os.path.join(get_app_data_path(), CATEGORY_EMBEDDINGS_CACHE_FILE)
+        if os.path.exists(cache_path):
+            try:
+                with np.load(cache_path) as stored:
+                    _category_embeddings_cache = {key: stored[key] for key in stored.files}
+            except Exception as e:
+                print(f"AVISO: Cache de embeddings das categorias inválido, será recriado: {e}")
+    return _category_embeddings_cache
+
+
+def _save_category_embeddings_cache():
+    """Writes the category embeddings cache to disk atomically.
+
+    Must be called with `_category_embeddings_lock` held.
+    """
+    cache_path = os.path.join(get_app_data_path(), CATEGORY_EMBEDDINGS_CACHE_FILE)
+    temp_path = cache_path + ".tmp"
+    try:
+        with open(temp_path, "wb") as f:
+            np.savez(f, **_category_embeddings_cache)
+        os.replace(temp_path, cache_path)
+    except (IOError, OSError) as e:
+        print(f"ERRO: Falha ao salvar o cache de embeddings das categorias: {e}")
+
+
+def get_category_embeddings(categories_dict, batch_size=DEFAULT_SBERT_BATCH_SIZE):
+    """Returns the SBERT embeddings of the category descriptions.
+
+    Embeddings are persisted under `get_app_data_path()` and reused across runs
+    and sessions. Only categories whose name or description is not in the cache
+    yet are encoded, all of them in a single batch.
+
+    Args:
+        categories_dict (dict): A dictionary of category names to their descriptions.
+        batch_size (int, optional): The batch size passed to the SBERT encoder.
+
+    Returns:
+        dict: A dictionary mapping category names to their numpy embeddings.
+    """
+    categories = {name: desc for name, desc in categories_dict.items() if desc and name != "Outros (Não processável)"}
+    keys = {name: _category_embedding_key(name, desc) for name, desc in categories.items()}
+    with _category_embeddings_lock:
+        cache = _load_category_embeddings_cache()
+        missing = [name for name in categories if keys[name] not in cache]
+        if missing:
+            print(f"Calculando embeddings de {len(missing)} categoria(s) nova(s) ou alterada(s)...")
+            embeddings = get_sbert_model().encode([categories[name] for name in missing], batch_size=batch_size)
+            for name, embedding in zip(missing, embeddings):
+                cache[keys[name]] = _as_numpy_embedding(embedding)
+            _save_category_embeddings_cache()
+        return {name: cache[keys[name]] for name in categories}
 
 
 def classify_by_filename_keywords(filename, categories_dict):
@@ -516,6 +1207,126 @@ def classify_by_filename_keywords(filename, categories_dict):
     return "Outros", 0.0
 
 
+def _parse_retry_after(response):
+    """Returns the delay requested by a response's Retry-After header, in seconds, or None."""
+    retry_after = response.headers.get("Retry-After") if response is not None else None
+    if not retry_after: return None
+    try:
+        return max(0.0, float(retry_after))
+    except ValueError:
+        try:
+            return max(0.0, (email.utils.parsedate_to_datetime(retry_after) - datetime.datetime.now(datetime.timezone.utc)).total_seconds())
+        except (TypeError, ValueError):
+            return None
+
+
+_edge_rate_limit_lock = threading.Lock()
+_edge_rate_limited_until = 0.0
+
+
+def _wait_for_edge_rate_limit():
+    """Blocks while the Edge Functions asked every caller to back off (after a 429 response)."""
+    with _edge_rate_limit_lock:
+        delay = _edge_rate_limited_until - time.monotonic()
+    if delay > 0:
+        time.sleep(delay)
+
+
+def _defer_edge_calls(delay):
+    """Makes every Edge Function caller wait `delay` seconds before its next request."""
+    global _edge_rate_limited_until
+    with _edge_rate_limit_lock:
+        _edge_rate_limited_until = max(_edge_rate_limited_until, time.monotonic() + delay)
+
+
+def _invoke_edge_function_with_retries(function_name, payload, max_retries=EDGE_MAX_RETRIES, timeout=120):
+    """Invokes an Edge Function, retrying failed calls.
+
+    Rate-limited responses (429, or 503 with Retry-After) pause every concurrent caller
+    for the delay the server asked for, and are retried without consuming one of the
+    `max_retries` attempts, up to `EDGE_MAX_RATE_LIMIT_WAITS` times. Other failures are
+    retried with a linear backoff.
+
+    Args:
+        function_name (str): The name of the Edge Function.
+        payload (dict): The JSON payload to send to the function.
+        max_retries (int, optional): The number of attempts for failures other than rate limiting.
+        timeout (int, optional): The request timeout in seconds.
+
+    Returns:
+        dict: The decoded JSON response.
+
+    Raises:
+        Exception: The last error, once the attempts are exhausted.
+    """
+    attempt = 0
+    rate_limit_waits = 0
+    while True:
+        _wait_for_edge_rate_limit()
+        try:
+            return invoke_edge_function_manually(function_name, payload, timeout)
+        except requests.exceptions.HTTPError as e:
+            status_code = e.response.status_code if e.response is not None else None
+            retry_after = _parse_retry_after(e.response)
+            if (status_code == 429 or (status_code == 503 and retry_after is not None)) and rate_limit_waits < EDGE_MAX_RATE_LIMIT_WAITS:
+                rate_limit_waits += 1
+                delay = min(retry_after if retry_after is not None else 2 ** rate_limit_waits, EDGE_MAX_RETRY_AFTER)
+                print(f"  > Limite de requisições atingido em '{function_name}'. Aguardando {delay:.1f}s...")
+                _defer_edge_calls(delay)
+                continue
+            error = e
+        except Exception as e:
+            error = e
+        attempt += 1
+        if attempt >= max_retries:
+            print(f"ERRO: Máximo de tentativas atingido para '{function_name}'.")
+            raise error
+        time.sleep(2 * attempt)
+
+
+class CreditLedger:
+    """Thread-safe accounting of the Gemini credits available to a simulation.
+
+    A credit is reserved before a Gemini call starts and then either committed (the
+    call produced a Gemini classification) or released (it did not). Reservations are
+    atomic, so concurrent callers can never spend more than the available credits.
+    """
+    def __init__(self, available_credits):
+        """Initializes the ledger.
+
+        Args:
+            available_credits (int): The maximum number of credits that may be spent.
+        """
+        self.available_credits = available_credits
+        self.spent = 0
+        self.reserved = 0
+        self._lock = threading.Lock()
+
+    def try_reserve(self):
+        """Reserves one credit. Returns False if every credit is already spent or reserved."""
+        with self._lock:
+            if self.spent + self.reserved >= self.available_credits:
+                return False
+            self.reserved += 1
+            return True
+
+    def commit(self):
+        """Turns one reservation into a spent credit."""
+        with self._lock:
+            self.reserved -= 1
+            self.spent += 1
+
+    def release(self):
+        """Gives one reserved credit back."""
+        with self._lock:
+            self.reserved -= 1
+
+    def is_exhausted(self):
+        """Returns True once every credit has been spent (not merely reserved)."""
+        with self._lock:
+            return self.spent >= self.available_credits
+
+
 def classify_text_via_edge(text_content, categories_dict):
     """Classifies a block of text by calling the 'classify-document-gemini' Edge Function.
 
@@ -534,28 +1345,44 @@ def classify_text_via_edge(text_content, categories_dict):
     function_name = "classify-document-gemini"
     payload = {"document_text": text_content, "categories": categories_dict}
 
-    max_retries = 3
-    for attempt in range(max_retries):
-        try:
-            response = invoke_edge_function_manually(function_name, payload, 120)
-            if "category" in response:
-                return response.get("category", "Outros"), response.get("confidence", 0.3)
-            else:
-                print(f"ERRO: Resposta da Edge Function (Texto) inesperada: {response}")
-                return "Outros", 0.0
-        except Exception as e:
-            if attempt < max_retries - 1:
-                time.sleep(2 * (attempt + 1))
-            else:
-                print(f"ERRO: Máximo de tentativas atingido para '{function_name}'.")
-                raise e
+    with instrumentation.timed("edge_call"):
+        response = _invoke_edge_function_with_retries(function_name, payload)
+    if "category" in response:
+        return response.get("category", "Outros"), response.get("confidence", 0.3)
+    print(f"ERRO: Resposta da Edge Function (Texto) inesperada: {response}")
+    return "Outros", 0.0
+
+
+def downsample_image_for_upload(file_path, max_dimension=UPLOAD_IMAGE_MAX_DIMENSION):
+    """Re-encodes an image as a JPEG no larger than `max_dimension` pixels on either side.
+
+    Args:
+        file_path (str): The path to the image file.
+        max_dimension (int, optional): The maximum width and height of the result.
+
+    Returns:
+        bytes: The JPEG-encoded image.
+    """
+    from PIL import Image
+    import io
+    with Image.open(file_path) as image:
+        image.draft("RGB", (max_dimension, max_dimension))
+        image = image.convert("RGB")
+        image.thumbnail((max_dimension, max_dimension))
+        buffer = io.BytesIO()
+        image.save(buffer, format="JPEG", quality=85)
+    return buffer.getvalue()
 
 
 def classify_file_via_edge(file_path, categories_dict):
     """Classifies a file by calling the 'classify-document-file' Edge Function.
 
     Encodes the file in Base64 and sends it to a Supabase Edge Function for
-    classification by a multimodal cloud AI model.
+    classification by a multimodal cloud AI model. The file is encoded in chunks while
+    the request is sent, so it is never held in memory as a whole. Files larger than
+    `MAX_EDGE_UPLOAD_BYTES` are not uploaded: images are sent downsampled, other files
+    are left to the text-extraction fallback (oversized videos never get here, see
+    `_classify_with_gemini`).
 
     Args:
         file_path (str): The path to the file to classify.
@@ -568,9 +1395,6 @@ def classify_file_via_edge(file_path, categories_dict):
 
     function_name = "classify-document-file"
     try:
-        with open(file_path, "rb") as f:
-            base64_encoded_data = base64.b64encode(f.read()).decode('utf-8')
-        
         ext = os.path.splitext(file_path)[1].lower().replace(".", "")
         
         if ext == 'jpg':
@@ -582,201 +1406,701 @@ def classify_file_via_edge(file_path, categories_dict):
             mime_type = f'video/{ext}'
         else:
             mime_type = f'application/{ext}'
-        
-        payload = {
-            "file_data_base64": base64_encoded_data,
-            "mime_type": mime_type,
-            "categories": categories_dict
-        }
+
+        file_size = os.path.getsize(file_path)
+        if file_size <= MAX_EDGE_UPLOAD_BYTES:
+            payload = edge_client.Base64JsonBody(
+                {"mime_type": mime_type, "categories": categories_dict}, "file_data_base64", file_path=file_path)
+        elif ext in IMAGE_EXTENSIONS:
+            print(f"  > Imagem com {file_size / 1024 / 1024:.1f} MB acima do limite de upload. Reduzindo a resolução...")
+            payload = edge_client.Base64JsonBody(
+                {"mime_type": "image/jpeg", "categories": categories_dict}, "file_data_base64", data=downsample_image_for_upload(file_path))
+        else:
+            print(f"  > Arquivo com {file_size / 1024 / 1024:.1f} MB acima do limite de upload. Usando a extração de texto.")
+            return "Outros", 0.0
     except Exception as e:
         print(f"ERRO ao preparar arquivo '{os.path.basename(file_path)}' para upload: {e}")
         return "Outros", 0.0
 
-    max_retries = 3
-    for attempt in range(max_retries):
+    with instrumentation.timed("edge_call"):
+        response = _invoke_edge_function_with_retries(function_name, payload)
+    if "category" in response:
+        return response.get("category", "Outros"), response.get("confidence", 0.3)
+    print(f"ERRO: Resposta da Edge Function (Arquivo) inesperada: {response}")
+    return "Outros", 0.0
+
+
+def _classify_with_gemini(file_path, extension_no_dot, categories_dict, extract_fn=None, near_duplicate_index=None, file_hash=None,
+                          lookup_text_fn=None):
+    """Runs the Gemini classification chain for a single file.
+
+    With a near-duplicate index, files whose text is cheap to get (cached, or needing no
+    OCR) are looked up first and, if a document with nearly the same text was already
+    classified by Gemini, its category is reused without any call. Otherwise tries the
+    file upload first (for natively supported formats) and falls back to classifying the
+    extracted text; a Gemini result is then added to the index. Videos larger than
+    `MAX_EDGE_UPLOAD_BYTES` are neither uploaded nor extracted and stay in 'Outros'.
+
+    Args:
+        file_path (str): The path to the file to classify.
+        extension_no_dot (str): The lowercase file extension, without the leading dot.
+        categories_dict (dict): The dictionary of available categories.
+        extract_fn (function, optional): The text extractor to use. Defaults to `extract_text_from_file`.
+        near_duplicate_index (cache_store.NearDuplicateIndex, optional): The index of documents already classified.
+        file_hash (str, optional): The file's hash, under which a Gemini result is added to the index.
+        lookup_text_fn (function, optional): Returns the text for the index lookup, or None if
+            it would need OCR. Defaults to `extract_text_without_ocr`.
+
+    Returns:
+        tuple[str, str, bool]: The classified category, the method used and whether
+        the chain reached a final decision (if False, the local model must be used).
+    """
+    extract_fn = extract_fn or extract_text_from_file
+    classified_category = "Outros"
+    classification_method_used = "não definido"
+    gemini_succeeded = False
+    signature = None
+
+    file_size = os.path.getsize(file_path) if extension_no_dot in VIDEO_EXTENSIONS and os.path.isfile(file_path) else 0
+    if file_size > MAX_EDGE_UPLOAD_BYTES:
+        print(f"  > Vídeo com {file_size / 1024 / 1024:.1f} MB acima do limite de upload. Mantido em 'Outros'.")
+        return "Outros", OVERSIZED_MEDIA_METHOD, True
+
+    if near_duplicate_index is not None:
+        try:
+            text_content = (lookup_text_fn or extract_text_without_ocr)(file_path)
+            with instrumentation.timed("near_duplicates"):
+                signature = near_duplicates.compute_signature(text_content)
+                match = near_duplicate_index.find(signature, near_duplicates.DEFAULT_THRESHOLD) if signature is not None else None
+            if match and match[1] in categories_dict:
+                print(f"  > Quase idêntico a um documento já classificado ({match[2]:.0%} de semelhança). "
+                      f"Categoria '{match[1]}' reaproveitada sem chamar a IA.")
+                return match[1], NEAR_DUPLICATE_METHOD, True
+        except Exception as e:
+            print(f"  > Erro na busca por quase duplicados: {e}.")
+
+    if extension_no_dot in NATIVE_GEMINI_EXTENSIONS:
         try:
-            response = invoke_edge_function_manually(function_name, payload, 120)
-            if "category" in response:
-                return response.get("category", "Outros"), response.get("confidence", 0.3)
+            print("  > Tentativa 1: IA Gemini (Upload de Arquivo)")
+            category, _ = classify_file_via_edge(file_path, categories_dict)
+            if category != "Outros":
+                classified_category = category
+                classification_method_used = "gemini_file"
+                gemini_succeeded = True
             else:
-                print(f"ERRO: Resposta da Edge Function (Arquivo) inesperada: {response}")
-                return "Outros", 0.0
+                print("  > Aviso: Upload de arquivo retornou 'Outros'. Tentando fallback.")
         except Exception as e:
-            if attempt < max_retries - 1:
-                time.sleep(2 * (attempt + 1))
+            print(f"  > Erro no Upload de Arquivo: {e}. Tentando fallback.")
+
+    if not gemini_succeeded:
+        try:
+            print("  > Tentativa 2: IA Gemini (Extração de Texto)")
+            text_content = extract_fn(file_path)
+            if text_content and text_content != "Formato de arquivo não suportado.":
+                category, _ = classify_text_via_edge(text_content, categories_dict)
+                if category != "Outros":
+                    classified_category = category
+                    classification_method_used = "gemini_text"
+                    gemini_succeeded = True
+                else:
+                    print("  > Aviso: Extração de texto retornou 'Outros'.")
             else:
-                print(f"ERRO: Máximo de tentativas atingido para '{function_name}'.")
-                raise e
+                classified_category = "Outros (Não processável)"
+                classification_method_used = "extracao_falhou"
+                gemini_succeeded = True
+        except Exception as e:
+            print(f"  > Erro na Extração de Texto: {e}.")
+
+    if signature is not None and file_hash and "gemini" in classification_method_used:
+        try:
+            near_duplicate_index.add(file_hash, signature, classified_category)
+        except sqlite3.Error as e:
+            print(f"  > AVISO: Não foi possível registrar o documento no índice de quase duplicados: {e}")
+
+    return classified_category, classification_method_used, gemini_succeeded
+
+
+def _apply_category_adjustments(extension_no_dot, classified_category, classification_method_used, categories_dict):
+    """Normalizes a classification result and applies the media-type fallbacks.
+
+    Unknown categories become 'Outros', and images or videos left in 'Outros' are
+    redirected to 'Imagens' or 'Vídeos' when those categories exist.
+
+    Returns:
+        tuple[str, str]: The adjusted category and classification method.
+    """
+    if classified_category not in categories_dict and classified_category != "Outros (Não processável)":
+        classified_category = "Outros"
+
+    if extension_no_dot in IMAGE_EXTENSIONS and classified_category == "Outros":
+        if "Imagens" in categories_dict:
+            print("  > Ajuste: Imagem classificada como 'Outros'. Redirecionando para 'Imagens'.")
+            classified_category = "Imagens"
+            classification_method_used += "_img_fallback"
+
+    if extension_no_dot in VIDEO_EXTENSIONS and classified_category == "Outros":
+        if "Vídeos" in categories_dict:
+            print("  > Ajuste: Vídeo classificado como 'Outros'. Redirecionando para 'Vídeos'.")
+            classified_category = "Vídeos"
+            classification_method_used += "_vid_fallback"
+
+    return classified_category, classification_method_used
+
 
+def _matches_any_glob(relative_path, patterns):
+    """Returns True if a relative path (with '/' separators) or its file name matches one of the glob patterns."""
+    name = relative_path.rsplit("/", 1)[-1]
+    return any(fnmatch.fnmatch(relative_path, pattern) or fnmatch.fnmatch(name, pattern) for pattern in patterns)
 
-def simulate_organization(folder_path, categories_dict, progress_callback=None, use_gemini=False, available_credits_for_simulation=0):
+
+def scan_folder(folder_path, recursive=False, include=None, exclude=None, skip_dirs=None):
+    """Lists the files of a folder as a stream, optionally walking its subfolders.
+
+    Built on `os.scandir`: entries are yielded as soon as they are found (so work can
+    start before a large tree is fully listed) and the stat information of each
+    `DirEntry` is reused instead of stat-ing every path again. Subfolders are walked
+    iteratively, so deep trees do not hit the recursion limit, and symbolic links to
+    folders are not followed.
+
+    Args:
+        folder_path (str): The folder to scan.
+        recursive (bool, optional): If True, also lists the files of every subfolder.
+        include (list[str], optional): Glob patterns (e.g. '*.pdf', 'notas/*'); when given, only
+            matching files are listed. Patterns are matched against the relative path and the file name.
+        exclude (list[str], optional): Glob patterns of files and folders to leave out.
+        skip_dirs (collection, optional): Names of first-level subfolders that are never entered
+            (e.g. the category folders created by a previous organization).
+
+    Yields:
+        tuple[str, os.stat_result]: The path of each file relative to `folder_path`
+        (using the OS separator) and its stat information.
+    """
+    skip_dirs = set(skip_dirs or ())
+    pending_dirs = [""]
+    while pending_dirs:
+        relative_dir = pending_dirs.pop()
+        try:
+            entries = os.scandir(os.path.join(folder_path, relative_dir) if relative_dir else folder_path)
+        except OSError as e:
+            print(f"AVISO: Não foi possível listar '{relative_dir or folder_path}': {e}")
+            continue
+        subdirs = []
+        with entries:
+            for entry in entries:
+                relative_path = os.path.join(relative_dir, entry.name) if relative_dir else entry.name
+                glob_path = relative_path.replace(os.sep, "/")
+                try:
+                    if entry.is_dir(follow_symlinks=False):
+                        if recursive and not (not relative_dir and entry.name in skip_dirs) \
+                                and not (exclude and _matches_any_glob(glob_path, exclude)):
+                            subdirs.append(relative_path)
+                        continue
+                    if not entry.is_file(): continue
+                    if include and not _matches_any_glob(glob_path, include): continue
+                    if exclude and _matches_any_glob(glob_path, exclude): continue
+                    yield relative_path, entry.stat()
+                except OSError:
+                    continue
+        # Walks subfolders in name order (reversed, since the list is used as a stack)
+        pending_dirs.extend(sorted(subdirs, reverse=True))
+
+
+class PlanEntry(namedtuple("PlanEntry", ["filename", "category", "date", "method"])):
+    """One file of an organization plan.
+
+    A `(filename, category, date, method)` tuple, so it unpacks like the plain tuples
+    the plan used to hold, that also carries the file's `timings` (the seconds spent
+    on it per stage, see `instrumentation.STAGES`) and, for an identical copy of an
+    earlier file of the scan, that file's name in `duplicate_of`.
+    """
+    def __new__(cls, filename, category, date, method, timings=None, duplicate_of=None):
+        entry = super().__new__(cls, filename, category, date, method)
+        entry.timings = timings if timings is not None else {}
+        entry.duplicate_of = duplicate_of
+        return entry
+
+    def _replace(self, **changes):
+        """Like `namedtuple._replace`, keeping `timings` and `duplicate_of`."""
+        return PlanEntry(*map(changes.pop, self._fields, self), timings=self.timings, duplicate_of=self.duplicate_of)
+
+
+def route_duplicates(files_info, to_duplicates_folder=True):
+    """Routes the identical copies found by a scan to the duplicates folder, or back.
+
+    Copies go to `DUPLICATES_CATEGORY` instead of the category of the file they copy;
+    with `to_duplicates_folder=False` they go back to that category. Copies whose
+    category was changed by hand are left alone.
+
+    Args:
+        files_info (list[PlanEntry]): The plan returned by `simulate_organization`.
+        to_duplicates_folder (bool, optional): Whether copies go to the duplicates folder.
+
+    Returns:
+        list[PlanEntry]: The updated plan (a new list; `files_info` is not modified).
+    """
+    categories_by_name = {entry.filename: entry.category for entry in files_info}
+    routed = []
+    for entry in files_info:
+        if getattr(entry, "duplicate_of", None) and entry.method == DUPLICATE_METHOD:
+            category = DUPLICATES_CATEGORY if to_duplicates_folder else categories_by_name.get(entry.duplicate_of, entry.category)
+            entry = entry._replace(category=category)
+        routed.append(entry)
+    return routed
+
+
+def _run_classification_pipeline(folder_path, file_entries, categories_dict, categories_embeddings_dict, cache_data,
+                                 progress_callback, use_gemini, available_credits_for_simulation,
+                                 hash_workers, extraction_workers, edge_workers, sbert_batch_size, recorder,
+                                 near_duplicate_index=None):
+    """Classifies files through a staged, concurrent pipeline.
+
+    `file_entries` is consumed lazily (e.g. straight from `scan_folder`), as the hashing
+    stage has room for more files, so the first results are ready before the folder
+    has been fully listed.
+
+    Stages:
+        1. Hashing in a thread pool, resolving cache hits immediately. Identical files
+           (same hash) are processed once: the other copies wait for that result and reuse it.
+        2. Gemini calls in a bounded thread pool. Credits are reserved on dispatch and
+           released when a call does not succeed, so a file only falls back to the local
+           model once every credit has actually been spent.
+        3. Text extraction and OCR in a process pool, skipped for files already in the
+           extracted-text cache.
+        4. Local classification in SBERT batches, reusing cached document embeddings.
+
+    All bookkeeping (cache, credits, results, progress) happens on the calling thread,
+    which also hands the spans timed by each stage to `recorder`, for the file they belong to.
+
+    Returns:
+        tuple: The relative paths of the files, in input order, their `(category, method)`
+        results, for each file the index of the file it is an identical copy of (or None),
+        the number of Gemini API calls made and whether the cache was updated.
+    """
+    files_in_folder = []
+    results = []
+    file_hashes = []
+    extensions = []
+    indexes_by_hash = {}
+    processed_index_by_hash = {}
+    duplicates_waiting = {}
+    pending_files = iter(file_entries)
+    scan_finished = False
+    futures_tags = {}
+    deferred_gemini = deque()
+    sbert_queue = []
+    counters = {"completed": 0, "extractions": 0}
+    credit_ledger = CreditLedger(available_credits_for_simulation if use_gemini else 0)
+    cache_was_updated = False
+    text_cache = get_text_cache()
+
+    with ThreadPoolExecutor(max_workers=hash_workers) as hash_pool, \
+         ProcessPoolExecutor(max_workers=extraction_workers, initializer=_init_extraction_process) as extract_pool, \
+         ThreadPoolExecutor(max_workers=edge_workers) as edge_pool:
+
+        def submit(executor, stage, index, fn, *args):
+            futures_tags[executor.submit(fn, *args)] = (stage, index)
+
+        def feed_hash_stage():
+            # Keeps a bounded number of files in the hashing stage at any time.
+            nonlocal scan_finished
+            in_flight = sum(1 for stage, _ in futures_tags.values() if stage == "hash")
+            while in_flight < hash_workers * 4 and not scan_finished:
+                next_file = next(pending_files, None)
+                if next_file is None:
+                    scan_finished = True
+                    return
+                filename, stat_result = next_file
+                index = len(files_in_folder)
+                files_in_folder.append(filename)
+                results.append(None)
+                file_hashes.append(None)
+                extensions.append(os.path.splitext(filename)[1].lower().replace(".", ""))
+                submit(hash_pool, "hash", index, instrumentation.call_collecting,
+                       get_file_hash, os.path.join(folder_path, filename), stat_result)
+                in_flight += 1
+
+        def finish(index, classified_category, classification_method_used, adjust=True):
+            if adjust:
+                classified_category, classification_method_used = _apply_category_adjustments(
+                    extensions[index], classified_category, classification_method_used, categories_dict)
+            print(f"  > Resultado Final ('{files_in_folder[index]}'): Categoria='{classified_category}', Método='{classification_method_used}'")
+            results[index] = (classified_category, classification_method_used)
+            counters["completed"] += 1
+            if progress_callback:
+                # While the folder is still being listed, the total is the number of files found so far
+                progress_callback(current_val=counters["completed"], total_val=len(files_in_folder))
+            for duplicate_index in duplicates_waiting.pop(index, ()):
+                finish(duplicate_index, classified_category, DUPLICATE_METHOD, adjust=False)
+
+        def dispatch_local(index):
+            filename = files_in_folder[index]
+            kw_category, kw_conf = classify_by_filename_keywords(filename, categories_dict)
+            with recorder.timed("cache_lookup", filename):
+                cached_text = text_cache.get_text(file_hashes[index], EXTRACTOR_VERSION) if file_hashes[index] else None
+            if kw_conf > 0.8:
+                finish(index, kw_category, "local_keyword")
+            elif cached_text is not None:
+                queue_for_sbert(index, cached_text)
+            else:
+                counters["extractions"] += 1
+                submit(extract_pool, "extract", index, instrumentation.call_collecting,
+                       extract_text_from_file, os.path.join(folder_path, filename))
+
+        def extract_in_pool(path, extractor=extract_text_from_file):
+            # Runs on an edge thread: the extraction's spans join the ones of the Gemini chain
+            text_content, spans = extract_pool.submit(instrumentation.call_collecting, extractor, path).result()
+            instrumentation.record(spans)
+            return text_content
+
+        def dispatch_gemini(index):
+            extract_fn = lambda path: extract_text_cached(path, file_hashes[index], extract_in_pool)
+            lookup_text_fn = lambda path: near_duplicate_text_cached(
+                path, file_hashes[index], lambda file_path: extract_in_pool(file_path, extract_text_without_ocr))
+            submit(edge_pool, "edge", index, instrumentation.call_collecting, _classify_with_gemini,
+                   os.path.join(folder_path, files_in_folder[index]), extensions[index], categories_dict, extract_fn,
+                   near_duplicate_index, file_hashes[index], lookup_text_fn)
+
+        def drain_deferred_gemini():
+            while deferred_gemini and credit_ledger.try_reserve():
+                dispatch_gemini(deferred_gemini.popleft())
+            if credit_ledger.is_exhausted():
+                while deferred_gemini:
+                    dispatch_local(deferred_gemini.popleft())
+
+        def queue_for_sbert(index, text_content):
+            if text_content and text_content != "Formato de arquivo não suportado.":
+                sbert_queue.append((index, text_content))
+            else:
+                finish(index, "Outros (Não processável)", "local_nao_processavel")
+
+        def flush_sbert_queue():
+            indexes = [index for index, _ in sbert_queue]
+            texts = [text for _, text in sbert_queue]
+            sbert_queue.clear()
+            if progress_callback:
+                progress_callback(message=f"Classificando {len(texts)} arquivo(s) com o modelo local...")
+            batch_results, spans = instrumentation.call_collecting(
+                classify_contents_local_cached, texts, [file_hashes[index] for index in indexes], categories_embeddings_dict, sbert_batch_size)
+            recorder.add_shared(spans, [files_in_folder[index] for index in indexes])
+            for index, (category, _) in zip(indexes, batch_results):
+                finish(index, category, "local_sbert")
+
+        feed_hash_stage()
+        while futures_tags:
+            done, _ = wait(list(futures_tags), return_when=FIRST_COMPLETED)
+            for future in done:
+                stage, index = futures_tags.pop(future)
+                filename = files_in_folder[index]
+
+                if stage == "hash":
+                    file_hash, spans = future.result()
+                    recorder.add(spans, filename)
+                    file_hashes[index] = file_hash
+                    if file_hash:
+                        indexes_by_hash.setdefault(file_hash, []).append(index)
+                        processed_index = processed_index_by_hash.setdefault(file_hash, index)
+                        if processed_index != index:
+                            print(f"\nProcessando '{filename}' (Cópia idêntica de '{files_in_folder[processed_index]}')")
+                            if results[processed_index] is not None:
+                                finish(index, results[processed_index][0], DUPLICATE_METHOD, adjust=False)
+                            else:
+                                duplicates_waiting.setdefault(processed_index, []).append(index)
+                            continue
+                    with recorder.timed("cache_lookup", filename):
+                        is_cached = bool(file_hash) and file_hash in cache_data
+                    if is_cached:
+                        print(f"\nProcessando '{filename}' (Resultado encontrado no cache!)")
+                        finish(index, cache_data[file_hash], "cache")
+                        continue
+                    print(f"\nProcessando '{filename}'...")
+                    if progress_callback:
+                        progress_callback(message=f"Analisando '{filename}'...")
+                    if credit_ledger.try_reserve():
+                        dispatch_gemini(index)
+                    elif not credit_ledger.is_exhausted():
+                        # Every credit is reserved by in-flight calls: wait to see whether one is given back
+                        deferred_gemini.append(index)
+                    else:
+                        dispatch_local(index)
+
+                elif stage == "edge":
+                    try:
+                        (classified_category, classification_method_used, gemini_succeeded), spans = future.result()
+                        recorder.add(spans, filename)
+                    except Exception as e:
+                        print(f"  > Erro inesperado na IA Gemini para '{filename}': {e}.")
+                        classified_category, classification_method_used, gemini_succeeded = "Outros", "não definido", False
+                    if "gemini" in classification_method_used:
+                        credit_ledger.commit()
+                    else:
+                        credit_ledger.release()
+                    if file_hashes[index] and ("gemini" in classification_method_used or classification_method_used == NEAR_DUPLICATE_METHOD):
+                        cache_data[file_hashes[index]] = classified_category
+                        cache_was_updated = True
+                    if gemini_succeeded:
+                        finish(index, classified_category, classification_method_used)
+                    else:
+                        print(f"  > Fallback Final para '{filename}': Modelo Local (IA não concluiu)")
+                        dispatch_local(index)
+                    drain_deferred_gemini()
+
+                elif stage == "extract":
+                    counters["extractions"] -= 1
+                    try:
+                        text_content, spans = future.result()
+                        recorder.add(spans, filename)
+                        if file_hashes[index] and text_content != "Formato de arquivo não suportado.":
+                            text_cache.put_text(file_hashes[index], EXTRACTOR_VERSION, text_content)
+                    except Exception as e:
+                        print(f"ERRO no processo de extração para '{filename}': {e}")
+                        text_content = ""
+                    queue_for_sbert(index, text_content)
+
+            feed_hash_stage()
+            if sbert_queue and (len(sbert_queue) >= sbert_batch_size or counters["extractions"] == 0):
+                flush_sbert_queue()
+
+    # Copies finish hashing in any order: as in sequential mode, the first one listed is the
+    # one reported as processed (with the processing's timings), and the others as its duplicates
+    duplicate_of = [None] * len(files_in_folder)
+    for file_hash, indexes in indexes_by_hash.items():
+        if len(indexes) < 2: continue
+        original_index = min(indexes)
+        processed_index = processed_index_by_hash[file_hash]
+        if processed_index != original_index:
+            results[original_index], results[processed_index] = results[processed_index], results[original_index]
+            recorder.swap_files(files_in_folder[original_index], files_in_folder[processed_index])
+        for index in indexes:
+            if index != original_index:
+                duplicate_of[index] = original_index
+
+    return files_in_folder, results, duplicate_of, credit_ledger.spent, cache_was_updated
+
+
+def simulate_organization(folder_path, categories_dict, progress_callback=None, use_gemini=False, available_credits_for_simulation=0,
+                          parallel=False, hash_workers=DEFAULT_HASH_WORKERS, extraction_workers=DEFAULT_EXTRACTION_WORKERS,
+                          edge_workers=DEFAULT_EDGE_WORKERS, sbert_batch_size=DEFAULT_SBERT_BATCH_SIZE, only_files=None,
+                          recursive=False, include=None, exclude=None, recorder=None, route_duplicates_apart=False,
+                          detect_near_duplicates=True):
     """Simulates the file organization process without moving any files.
 
     Iterates through files in a given folder, classifies each one using either
     a local model or a cloud AI (Gemini), and returns a structured plan of
     the proposed organization. It uses a cache to speed up re-scans.
 
+    Files with identical content (same `get_file_hash`) are classified once: the first
+    one listed is processed, and each other copy reuses its category, with no
+    extraction, model or Gemini call (and no credit spent), as method `DUPLICATE_METHOD`.
+    Files whose text nearly matches a document classified by Gemini in an earlier run
+    or scan reuse its category in the same way, as method `NEAR_DUPLICATE_METHOD`.
+
     Args:
         folder_path (str): The path to the folder containing files to organize.
         categories_dict (dict): A dictionary of category names to their descriptions.
         progress_callback (function, optional): A callback function to report progress. It receives `current_val`, `total_val`, and `message` arguments.
         use_gemini (bool, optional): If True, attempts to use the Gemini AI for classification.
         available_credits_for_simulation (int, optional): The maximum number of Gemini API calls to make during this simulation.
+        parallel (bool, optional): If True, processes the files through the staged pipeline
+            (hashing, extraction/OCR, batched SBERT and Gemini calls running concurrently)
+            instead of one file at a time. The output is identical in both modes.
+        hash_workers (int, optional): Number of threads hashing files in pipeline mode.
+        extraction_workers (int, optional): Number of processes extracting text and running OCR in pipeline mode.
+        edge_workers (int, optional): Maximum number of concurrent Gemini calls in pipeline mode.
+        sbert_batch_size (int, optional): Number of documents encoded together by SBERT in pipeline mode.
+        only_files (collection, optional): If given, only these file names of the folder are
+            classified (used by the watch mode to process new and changed files only). A dict of
+            file names to their `os.stat_result` is used as the listing itself: the folder is not
+            scanned again, and `recursive`, `include` and `exclude` do not apply.
+        recursive (bool, optional): If True, also classifies the files of subfolders, except the
+            category folders themselves. Their file names are then paths relative to `folder_path`.
+        include (list[str], optional): Glob patterns of the files to classify. See `scan_folder`.
+        exclude (list[str], optional): Glob patterns of files and folders to skip. See `scan_folder`.
+        recorder (instrumentation.RunRecorder, optional): Receives the timed spans of the run, for
+            aggregate statistics and trace export. A private one is used if not given.
+        route_duplicates_apart (bool, optional): If True, identical copies are planned into the
+            `DUPLICATES_CATEGORY` folder instead of their original's category. See `route_duplicates`.
+        detect_near_duplicates (bool, optional): If True (and Gemini is used), looks each file up
+            in the user's near-duplicate index before calling Gemini. See `open_near_duplicate_index`.
 
     Returns:
         tuple: A tuple containing:
-            - list: A list of tuples, where each tuple represents a file and its classification result.
+            - list: A list of `PlanEntry` tuples `(filename, category, date, method)`, one per file,
+              each with the seconds spent on the file per stage in its `timings` attribute and,
+              for identical copies, the name of the file they copy in `duplicate_of`.
             - dict: A dictionary representing the proposed folder structure with files grouped by category.
             - int: The number of Gemini API calls made during the simulation.
     """
     user_id = config.current_user.id if config.current_user else "local_user"
     cache_data = load_cache(user_id)
-    cache_was_updated = False
-
-    categories_embeddings_dict = {}
-    if not use_gemini or available_credits_for_simulation == 0:
-        print("Modo local ativo. Pré-calculando embeddings das categorias...")
-        for name, desc in categories_dict.items():
-            if desc and name != "Outros (Não processável)":
-                categories_embeddings_dict[name] = model_sbert.encode(desc, convert_to_tensor=True)
-    
-    files_to_organize = []
-    organized_structure = {}
-    gemini_api_calls_count = 0
-
+    near_duplicate_index = None
     try:
-        files_in_folder = [f for f in os.listdir(folder_path) if os.path.isfile(os.path.join(folder_path, f))]
-    except FileNotFoundError:
-        return [], {}, 0
-        
-    total_files = len(files_in_folder)
-    if total_files == 0:
-        return [], {}, 0
-
-    for i, filename in enumerate(files_in_folder):
-        file_path = os.path.join(folder_path, filename)
-        extension_with_dot = os.path.splitext(filename)[1].lower()
-        extension_no_dot = extension_with_dot.replace(".", "")
-        file_hash = get_file_hash(file_path)
-
-        if file_hash and file_hash in cache_data:
-            if progress_callback:
-                progress_callback(message=f"Verificando cache de '{filename}'...")
-            print(f"\nProcessando '{filename}' (Resultado encontrado no cache!)")
-            classified_category = cache_data[file_hash]
-            classification_method_used = "cache"
+        cache_was_updated = False
+        recorder = recorder or instrumentation.RunRecorder()
+
+        categories_embeddings_dict = {}
+        if not use_gemini or available_credits_for_simulation == 0:
+            print("Modo local ativo. Carregando embeddings das categorias...")
+            with recorder.scope():
+                categories_embeddings_dict = get_category_embeddings(categories_dict, sbert_batch_size)
+    
+        files_to_organize = []
+        organized_structure = {}
+        gemini_api_calls_count = 0
+        edge_client.clear_call_timings()
+
+        if not os.path.isdir(folder_path):
+            return [], {}, 0
+
+        if use_gemini and available_credits_for_simulation > 0 and detect_near_duplicates:
+            try:
+                near_duplicate_index = open_near_duplicate_index(user_id)
+            except sqlite3.Error as e:
+                print(f"AVISO: Não foi possível abrir o índice de quase duplicados: {e}")
+
+        if isinstance(only_files, dict):
+            file_entries = iter(only_files.items())
         else:
-            print(f"\nProcessando '{filename}'...")
-            if progress_callback:
-                progress_callback(message=f"Analisando '{filename}'...")
+            only_files = set(only_files) if only_files is not None else None
+            file_entries = ((filename, stat_result)
+                            for filename, stat_result in scan_folder(folder_path, recursive, include, exclude,
+                                                                         skip_dirs=set(categories_dict) | {DUPLICATES_CATEGORY})
+                            if only_files is None or filename in only_files)
+
+        if parallel:
+            files_in_folder, pipeline_results, duplicate_of, gemini_api_calls_count, cache_was_updated = _run_classification_pipeline(
+                folder_path, file_entries, categories_dict, categories_embeddings_dict, cache_data,
+                progress_callback, use_gemini, available_credits_for_simulation,
+                hash_workers, extraction_workers, edge_workers, sbert_batch_size, recorder, near_duplicate_index)
+            for filename, (classified_category, classification_method_used), original_index in zip(files_in_folder, pipeline_results, duplicate_of):
+                files_to_organize.append(PlanEntry(filename, classified_category, "N/A", classification_method_used, recorder.timings_for(filename),
+                                                   files_in_folder[original_index] if original_index is not None else None))
+        else:
+            credit_ledger = CreditLedger(available_credits_for_simulation)
+            first_index_by_hash = {}
+            file_entries = list(file_entries)
+            total_files = len(file_entries)
+            for i, (filename, stat_result) in enumerate(file_entries):
+                file_path = os.path.join(folder_path, filename)
+                extension_with_dot = os.path.splitext(filename)[1].lower()
+                extension_no_dot = extension_with_dot.replace(".", "")
+                with recorder.scope(filename):
+                    file_hash = get_file_hash(file_path, stat_result)
+                    original_index = first_index_by_hash.setdefault(file_hash, i) if file_hash else i
+
+                    with instrumentation.timed("cache_lookup"):
+                        is_cached = original_index == i and bool(file_hash) and file_hash in cache_data
+                    if original_index != i:
+                        print(f"\nProcessando '{filename}' (Cópia idêntica de '{file_entries[original_index][0]}')")
+                        classified_category = files_to_organize[original_index].category
+                        classification_method_used = DUPLICATE_METHOD
+                    elif is_cached:
+                        if progress_callback:
+                            progress_callback(message=f"Verificando cache de '{filename}'...")
+                        print(f"\nProcessando '{filename}' (Resultado encontrado no cache!)")
+                        classified_category = cache_data[file_hash]
+                        classification_method_used = "cache"
+                    else:
+                        print(f"\nProcessando '{filename}'...")
+                        if progress_callback:
+                            progress_callback(message=f"Analisando '{filename}'...")
 
-            classified_category = "Outros"
-            classification_method_used = "não definido"
-            gemini_succeeded = False
+                        classified_category = "Outros"
+                        classification_method_used = "não definido"
+                        gemini_succeeded = False
             
-            use_gemini_for_this_file = use_gemini and gemini_api_calls_count < available_credits_for_simulation
+                        use_gemini_for_this_file = use_gemini and credit_ledger.try_reserve()
 
-            if use_gemini_for_this_file:
-                if extension_no_dot in NATIVE_GEMINI_EXTENSIONS:
-                    try:
-                        print("  > Tentativa 1: IA Gemini (Upload de Arquivo)")
-                        category, _ = classify_file_via_edge(file_path, categories_dict)
-                        if category != "Outros":
-                            classified_category = category
-                            classification_method_used = "gemini_file"
-                            gemini_succeeded = True
-                        else:
-                            print("  > Aviso: Upload de arquivo retornou 'Outros'. Tentando fallback.")
-                    except Exception as e:
-                        print(f"  > Erro no Upload de Arquivo: {e}. Tentando fallback.")
-                
-                if not gemini_succeeded:
-                    try:
-                        print("  > Tentativa 2: IA Gemini (Extração de Texto)")
-                        text_content = extract_text_from_file(file_path)
-                        if text_content and text_content != "Formato de arquivo não suportado.":
-                            category, _ = classify_text_via_edge(text_content, categories_dict)
-                            if category != "Outros":
-                                classified_category = category
-                                classification_method_used = "gemini_text"
-                                gemini_succeeded = True
-                            else:
-                                print("  > Aviso: Extração de texto retornou 'Outros'.")
-                        else:
-                            classified_category = "Outros (Não processável)"
-                            classification_method_used = "extracao_falhou"
-                            gemini_succeeded = True
-                    except Exception as e:
-                        print(f"  > Erro na Extração de Texto: {e}.")
+                        if use_gemini_for_this_file:
+                            classified_category, classification_method_used, gemini_succeeded = _classify_with_gemini(
+                                file_path, extension_no_dot, categories_dict, lambda path: extract_text_cached(path, file_hash),
+                                near_duplicate_index, file_hash, lambda path: near_duplicate_text_cached(path, file_hash))
 
-                if "gemini" in classification_method_used:
-                    gemini_api_calls_count += 1
+                            if "gemini" in classification_method_used:
+                                credit_ledger.commit()
+                            else:
+                                credit_ledger.release()
 
-            if not gemini_succeeded:
-                if use_gemini:
-                    print("  > Fallback Final: Modelo Local (IA não concluiu)")
-                else:
-                    print("  > Estratégia: Modelo Local")
+                        if not gemini_succeeded:
+                            if use_gemini:
+                                print("  > Fallback Final: Modelo Local (IA não concluiu)")
+                            else:
+                                print("  > Estratégia: Modelo Local")
                 
-                kw_category, kw_conf = classify_by_filename_keywords(filename, categories_dict)
-                if kw_conf > 0.8:
-                    classified_category = kw_category
-                    classification_method_used = "local_keyword"
-                else:
-                    text_content = extract_text_from_file(file_path)
-                    if text_content and text_content != "Formato de arquivo não suportado.":
-                        classified_category, _ = classify_content_local(text_content, categories_embeddings_dict)
-                        classification_method_used = "local_sbert"
-                    else:
-                        classified_category = "Outros (Não processável)"
-                        classification_method_used = "local_nao_processavel"
+                            kw_category, kw_conf = classify_by_filename_keywords(filename, categories_dict)
+                            if kw_conf > 0.8:
+                                classified_category = kw_category
+                                classification_method_used = "local_keyword"
+                            else:
+                                text_content = extract_text_cached(file_path, file_hash)
+                                if text_content and text_content != "Formato de arquivo não suportado.":
+                                    classified_category, _ = classify_contents_local_cached([text_content], [file_hash], categories_embeddings_dict)[0]
+                                    classification_method_used = "local_sbert"
+                                else:
+                                    classified_category = "Outros (Não processável)"
+                                    classification_method_used = "local_nao_processavel"
             
-            if file_hash and "gemini" in classification_method_used:
-                cache_data[file_hash] = classified_category
-                cache_was_updated = True
-
-        date_str = "N/A"
-        # try:
-        #     # A extração de datas continua sendo um processo separado e informativo
-        #     text_for_dates = extract_text_from_file(file_path)
-        #     if text_for_dates:
-        #         dates_list = extract_dates(text_for_dates)
-        #         if dates_list:
-        #             date_str = ", ".join(d.strftime('%d/%m/%Y') for d in dates_list)
-        # except Exception:
-        #     pass
-
-        if classified_category not in categories_dict and classified_category != "Outros (Não processável)":
-            classified_category = "Outros"
-
-        if extension_no_dot in IMAGE_EXTENSIONS and classified_category == "Outros":
-            if "Imagens" in categories_dict:
-                print("  > Ajuste: Imagem classificada como 'Outros'. Redirecionando para 'Imagens'.")
-                classified_category = "Imagens"
-                classification_method_used += "_img_fallback"
+                        if file_hash and ("gemini" in classification_method_used or classification_method_used == NEAR_DUPLICATE_METHOD):
+                            cache_data[file_hash] = classified_category
+                            cache_was_updated = True
+
+                date_str = "N/A"
+                # try:
+                #     # A extração de datas continua sendo um processo separado e informativo
+                #     text_for_dates = extract_text_from_file(file_path)
+                #     if text_for_dates:
+                #         dates_list = extract_dates(text_for_dates)
+                #         if dates_list:
+                #             date_str = ", ".join(d.strftime('%d/%m/%Y') for d in dates_list)
+                # except Exception:
+                #     pass
+
+                if original_index == i:
+                    classified_category, classification_method_used = _apply_category_adjustments(
+                        extension_no_dot, classified_category, classification_method_used, categories_dict)
+
+                print(f"  > Resultado Final: Categoria='{classified_category}', Método='{classification_method_used}'")
+
+                files_to_organize.append(PlanEntry(filename, classified_category, date_str, classification_method_used, recorder.timings_for(filename),
+                                                   file_entries[original_index][0] if original_index != i else None))
         
-        if extension_no_dot in VIDEO_EXTENSIONS and classified_category == "Outros":
-            if "Vídeos" in categories_dict:
-                print("  > Ajuste: Vídeo classificado como 'Outros'. Redirecionando para 'Vídeos'.")
-                classified_category = "Vídeos"
-                classification_method_used += "_vid_fallback"
-
-        print(f"  > Resultado Final: Categoria='{classified_category}', Método='{classification_method_used}'")
-
-        files_to_organize.append((filename, classified_category, date_str, classification_method_used))
-        if classified_category not in organized_structure:
-            organized_structure[classified_category] = []
-        organized_structure[classified_category].append(filename)
-        
-        if progress_callback:
-            progress_callback(current_val=i + 1, total_val=total_files)
-
-    if cache_was_updated:
-        print("\nSalvando novos resultados no arquivo de cache...")
-        save_cache(user_id, cache_data)
-
-    for cat_name_key in categories_dict.keys():
-        if cat_name_key not in organized_structure:
-            organized_structure[cat_name_key] = []
+                if progress_callback:
+                    progress_callback(current_val=i + 1, total_val=total_files)
+            gemini_api_calls_count = credit_ledger.spent
+
+        duplicate_count = sum(1 for entry in files_to_organize if entry.duplicate_of)
+        if duplicate_count:
+            print(f"\n{duplicate_count} cópia(s) idêntica(s) reaproveitaram o resultado de outro arquivo.")
+        near_duplicate_count = sum(1 for entry in files_to_organize if entry.method == NEAR_DUPLICATE_METHOD)
+        if near_duplicate_count:
+            print(f"{near_duplicate_count} arquivo(s) quase idêntico(s) a documentos já classificados dispensaram a IA.")
+        if route_duplicates_apart:
+            files_to_organize = route_duplicates(files_to_organize)
+        for entry in files_to_organize:
+            organized_structure.setdefault(entry.category, []).append(entry.filename)
+
+        recorder.finish()
+        timing_summary = edge_client.summarize_call_timings()
+        if timing_summary:
+            print(f"\nChamadas à IA: {timing_summary['calls']} ({timing_summary['new_connections']} nova(s) conexão(ões)), "
+                  f"TTFB médio {timing_summary['avg_ttfb'] or 0:.2f}s, total médio {timing_summary['avg_total']:.2f}s.")
+        print(instrumentation.format_summary(recorder.summary()))
+
+        if cache_was_updated:
+            print("\nNovos resultados salvos no cache.")
+        if not files_to_organize:
+            return [], {}, 0
+
+        for cat_name_key in categories_dict.keys():
+            if cat_name_key not in organized_structure:
+                organized_structure[cat_name_key] = []
     
-    return files_to_organize, organized_structure, gemini_api_calls_count
\ No newline at end of file
+        return files_to_organize, organized_structure, gemini_api_calls_count
+    finally:
+        # Also on errors, so the stores opened for this run are not left open
+        save_cache(user_id, cache_data)
+        if near_duplicate_index is not None:
+            near_duplicate_index.close()
+        if _text_cache is not None:
+            _text_cache.flush()
+        if _hash_index is not None:
+            _hash_index.flush()
@@ -0,0 +1,558 @@
+"""Execution of organization plans: moving each file into its category folder.
+
+Shared by the GUI (`App._execute_organization_real`) and the headless CLI.
+
+Every target path, collision renames included, is decided up front from one listing
+of each category folder, so no name is probed on disk while moving. The moves then run
+in a small thread pool and never overwrite a file: on POSIX a file is hard-linked at its
+target and then unlinked (a copy into an exclusively created file across devices), on
+Windows `os.rename` already refuses existing targets. A file created at a target after
+the plan was made gets the move renamed with a numeric suffix instead.
+
+Each run is recorded in an append-only journal (JSON lines, in the `journals` folder of
+the app data directory): a header with the planned moves, then one line per finished
+move with the size and modification time of the moved file, plus its hash when the hash
+index already knows it (no file is read to move it). An interrupted run
+can be resumed from it (`resume_plan`), and any run can be rolled back (`undo_plan`,
+`rollback_last`).
+"""
+
+import datetime
+import errno
+import hashlib
+import json
+import os
+import shutil
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+import organizer
+
+# Category whose files are left where they are
+UNPROCESSABLE_CATEGORY = "Outros (Não processável)"
+# Number of threads moving files, and read size when a move has to copy across devices
+DEFAULT_MOVE_WORKERS = 4
+COPY_BUFFER_SIZE = 1024 * 1024
+JOURNAL_FOLDER = "journals"
+JOURNAL_VERSION = 1
+
+
+class MoveJournal:
+    """An append-only record of the moves of one plan execution.
+
+    The first line holds the folder and the planned moves; each following line records
+    an event: a category folder created (`mkdir`), a move done or failed, a move undone,
+    or the end of the run. A line cut short by a crash is ignored when loading.
+    """
+    def __init__(self, path):
+        """Opens an existing journal for appending.
+
+        Args:
+            path (str): The journal file.
+        """
+        self.path = path
+        self._file = open(path, "a", encoding="utf-8")
+
+    @classmethod
+    def create(cls, path, folder_path, moves):
+        """Creates the journal of a new run.
+
+        Args:
+            path (str): The journal file to create.
+            folder_path (str): The organized folder.
+            moves (list): The planned `(source, target)` paths, relative to `folder_path`.
+
+        Returns:
+            MoveJournal: The journal, open for appending.
+        """
+        header = {"version": JOURNAL_VERSION, "folder": os.path.abspath(folder_path),
+                  "created": datetime.datetime.now().isoformat(timespec="seconds"),
+                  "moves": [list(move) for move in moves]}
+        with open(path, "x", encoding="utf-8") as f:
+            f.write(json.dumps(header, ensure_ascii=False) + "\n")
+        return cls(path)
+
+    @staticmethod
+    def load(path):
+        """Reads a journal.
+
+        Args:
+            path (str): The journal file.
+
+        Returns:
+            dict: The header fields (`folder`, `created`, `moves`) plus the replayed state:
+            `created_dirs` (list), `done` and `undone` (sets of move indexes), `failed` and
+            `undo_failed` (dicts of index to the error of its last attempt, for moves and
+            undos not done since), `fingerprints` (dict of index to the size, modification
+            time and SHA-256 of the moved file), `complete` and `undo_complete` (bools).
+        """
+        with open(path, "r", encoding="utf-8") as f:
+            state = json.loads(f.readline())
+            state.update({"created_dirs": [], "done": set(), "undone": set(), "failed": {}, "undo_failed": {},
+                          "fingerprints": {}, "complete": False, "undo_complete": False})
+            for line in f:
+                try:
+                    event = json.loads(line)
+                except json.JSONDecodeError:
+                    continue
+                if "done" in event:
+                    state["done"].add(event["done"]); state["failed"].pop(event["done"], None)
+                    if "target" in event:
+                        state["moves"][event["done"]][1] = event["target"]
+                    if "size" in event:
+                        state["fingerprints"][event["done"]] = {key: event.get(key) for key in ("size", "mtime_ns", "sha256")}
+                elif "failed" in event:
+                    state["failed"][event["failed"]] = event.get("error")
+                elif "undone" in event:
+                    state["undone"].add(event["undone"]); state["undo_failed"].pop(event["undone"], None)
+                elif "undo_failed" in event:
+                    state["undo_failed"][event["undo_failed"]] = event.get("error")
+                elif "mkdir" in event:
+                    state["created_dirs"].append(event["mkdir"])
+                elif "complete" in event:
+                    state["complete"] = True
+                elif "undo_complete" in event:
+                    state["undo_complete"] = True
+        state["moves"] = [tuple(move) for move in state["moves"]]
+        return state
+
+    def record(self, event, value=True, **fields):
+        """Appends an event (e.g. `record("done", 3)`). Call `flush` to push it to disk."""
+        self._file.write(json.dumps({event: value, **fields}, ensure_ascii=False) + "\n")
+
+    def flush(self):
+        """Pushes the recorded events to the operating system."""
+        self._file.flush()
+
+    def close(self):
+        """Flushes the journal to stable storage and closes it."""
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self._file.close()
+
+
+def _folder_key(folder_path):
+    return hashlib.sha1(os.path.normcase(os.path.abspath(folder_path)).encode("utf-8")).hexdigest()[:12]
+
+
+def get_journal_folder():
+    """Returns the folder holding the move journals, creating it if needed."""
+    path = os.path.join(organizer.get_app_data_path(), JOURNAL_FOLDER)
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+def new_journal_path(folder_path):
+    """Returns a fresh journal file name for a run over `folder_path`."""
+    timestamp = datetime.datetime.now().strftime("%Y%m%d-%H%M%S-%f")
+    return os.path.join(get_journal_folder(), f"{_folder_key(folder_path)}_{timestamp}.jsonl")
+
+
+def list_journals(folder_path):
+    """Lists the journals of the runs over `folder_path`, most recent first.
+
+    Args:
+        folder_path (str): The organized folder.
+
+    Returns:
+        list[str]: The journal paths.
+    """
+    prefix = _folder_key(folder_path) + "_"
+    journal_folder = get_journal_folder()
+    names = sorted((name for name in os.listdir(journal_folder) if name.startswith(prefix)), reverse=True)
+    return [os.path.join(journal_folder, name) for name in names]
+
+
+def find_interrupted_journals(folder_path):
+    """Returns the journals of runs over `folder_path` that neither finished nor were undone."""
+    interrupted = []
+    for path in list_journals(folder_path):
+        try:
+            state = MoveJournal.load(path)
+        except (OSError, ValueError):
+            continue
+        if not state["complete"] and not state["undo_complete"]:
+            interrupted.append(path)
+    return interrupted
+
+
+def plan_moves(folder_path, files_info):
+    """Decides the target path of every file of a plan, without touching the files.
+
+    Each category folder is listed once; names already taken there, and names given to
+    earlier files of the plan, get a numeric suffix (`name_1.ext`, `name_2.ext`, ...).
+    Files found in subfolders are moved flat into the category folder.
+
+    Args:
+        folder_path (str): The organized folder.
+        files_info (list): The plan: `(filename, category, date, method)` tuples.
+
+    Returns:
+        tuple: `(moves, renamed, skipped)`: the `(source, target)` paths relative to
+        `folder_path`, a dict of the sources given a new name to that name, and the
+        number of files left in place (not processable).
+    """
+    taken_names_by_category = {}
+    moves, renamed, skipped = [], {}, 0
+    for filename, category, _, _ in files_info:
+        if category == UNPROCESSABLE_CATEGORY:
+            skipped += 1
+            continue
+        taken = taken_names_by_category.get(category)
+        if taken is None:
+            try:
+                taken = {os.path.normcase(name) for name in os.listdir(os.path.join(folder_path, category))}
+            except FileNotFoundError:
+                taken = set()
+            taken_names_by_category[category] = taken
+
+        target_name = os.path.basename(filename)
+        if os.path.normcase(target_name) in taken:
+            base, ext = os.path.splitext(target_name); count = 1
+            while os.path.normcase(f"{base}_{count}{ext}") in taken:
+                count += 1
+            target_name = f"{base}_{count}{ext}"
+            renamed[filename] = target_name
+        taken.add(os.path.normcase(target_name))
+        moves.append((filename, os.path.join(category, target_name)))
+    return moves, renamed, skipped
+
+
+def move_file(source_path, target_path, rename_on_collision=True):
+    """Moves a file without ever overwriting an existing one.
+
+    Args:
+        source_path (str): The file to move.
+        target_path (str): Where to move it.
+        rename_on_collision (bool, optional): If True and `target_path` exists, the file is
+            moved to the first free `name_1.ext`, `name_2.ext`, ... next to it instead.
+
+    The file's row in the hash index follows it to its new path.
+
+    Returns:
+        str: The path the file was moved to.
+
+    Raises:
+        FileExistsError: If `target_path` exists and `rename_on_collision` is False.
+    """
+    base, ext = os.path.splitext(target_path); count = 0
+    while True:
+        try:
+            _move_no_overwrite(source_path, target_path)
+            organizer.get_hash_index().move(os.path.abspath(source_path), os.path.abspath(target_path))
+            return target_path
+        except FileExistsError:
+            if not rename_on_collision: raise
+            count += 1
+            target_path = f"{base}_{count}{ext}"
+
+
+def _move_no_overwrite(source_path, target_path):
+    # Raises FileExistsError if target_path exists, whatever the way the file is moved
+    if os.name == "nt":
+        try:
+            os.rename(source_path, target_path)  # Never replaces an existing file on Windows
+            return
+        except OSError as e:
+            if e.errno != errno.EXDEV: raise
+        _copy_no_overwrite(source_path, target_path)
+        return
+    try:
+        os.link(source_path, target_path, follow_symlinks=False)
+    except OSError as e:
+        if e.errno == errno.EXDEV:
+            _copy_no_overwrite(source_path, target_path)
+            return
+        if e.errno not in (errno.EPERM, errno.ENOTSUP, errno.EOPNOTSUPP, errno.EMLINK): raise
+        # No hard links on this file system: reserves the name, then renames over the placeholder
+        open(target_path, "xb").close()
+        os.rename(source_path, target_path)
+        return
+    os.unlink(source_path)
+
+
+def _copy_no_overwrite(source_path, target_path):
+    # Moves a file across devices into an exclusively created target
+    if os.path.islink(source_path):
+        os.symlink(os.readlink(source_path), target_path)
+    else:
+        with open(source_path, "rb") as source, open(target_path, "xb") as target:
+            try:
+                shutil.copyfileobj(source, target, COPY_BUFFER_SIZE)
+            except BaseException:
+                target.close(); os.unlink(target_path)
+                raise
+        shutil.copystat(source_path, target_path)
+    os.unlink(source_path)
+
+
+def execute_plan(folder_path, files_info, progress_callback=None, log_callback=print,
+                 workers=DEFAULT_MOVE_WORKERS, journal_path=None):
+    """Moves the files of an organization plan into their category folders.
+
+    Args:
+        folder_path (str): The organized folder.
+        files_info (list): The plan: `(filename, category, date, method)` tuples, with file
+            names relative to `folder_path`.
+        progress_callback (function, optional): Receives `current_val`, `total_val` and `message` arguments.
+            It is called about a hundred times per run at most, not once per file.
+        log_callback (function, optional): Receives the renames, the errors and the totals per category folder.
+        workers (int, optional): The number of threads moving files.
+        journal_path (str, optional): The journal file. Defaults to a new file in the journals folder.
+
+    Returns:
+        dict: The number of files `moved`, `skipped` (not processable) and `failed`, and the `journal` path.
+    """
+    moves, renamed, skipped = plan_moves(folder_path, files_info)
+    if skipped:
+        log_callback(f"Pulando {skipped} arquivo(s) não processável(is).")
+    for filename, new_name in renamed.items():
+        log_callback(f"Arquivo '{filename}' já existe. Renomeando para '{new_name}'.")
+
+    journal_path = journal_path or new_journal_path(folder_path)
+    journal = MoveJournal.create(journal_path, folder_path, moves)
+    try:
+        summary = _run_moves(folder_path, moves, range(len(moves)), journal, _move_and_fingerprint,
+                             progress_callback, log_callback, workers)
+        journal.record("complete")
+    finally:
+        journal.close()
+    summary.update(skipped=skipped, journal=journal_path)
+    return summary
+
+
+def resume_plan(journal_path, progress_callback=None, log_callback=print, workers=DEFAULT_MOVE_WORKERS):
+    """Finishes an interrupted run from its journal.
+
+    Moves already done, including those that happened but were not journaled yet when
+    the run was interrupted, are not repeated. A file whose target name was taken in the
+    meantime is reported as failed instead of being overwritten.
+
+    Args:
+        journal_path (str): The journal of the interrupted run.
+        progress_callback (function, optional): See `execute_plan`.
+        log_callback (function, optional): See `execute_plan`.
+        workers (int, optional): The number of threads moving files.
+
+    Returns:
+        dict: The number of files `moved` and `failed` by this call, and the `journal` path.
+    """
+    state = MoveJournal.load(journal_path)
+    folder_path, moves = state["folder"], state["moves"]
+    pending = [index for index in range(len(moves)) if index not in state["done"]]
+    log_callback(f"Retomando a organização de '{folder_path}': {len(pending)} de {len(moves)} arquivo(s) pendente(s).")
+
+    def resume_move(source_path, target_path, _):
+        if not os.path.lexists(source_path):
+            if os.path.lexists(target_path): return _fingerprint(target_path)  # Moved before the interruption
+            raise FileNotFoundError(errno.ENOENT, "Arquivo não encontrado", source_path)
+        if os.path.lexists(target_path):
+            if not os.path.samefile(source_path, target_path):
+                raise FileExistsError(errno.EEXIST, "O destino já existe", target_path)
+            os.unlink(source_path)  # Interrupted between the hard link and the unlink of the move
+            organizer.get_hash_index().move(os.path.abspath(source_path), os.path.abspath(target_path))
+            return _fingerprint(target_path)
+        return _move_and_fingerprint(source_path, target_path, _)
+
+    journal = MoveJournal(journal_path)
+    try:
+        summary = _run_moves(folder_path, moves, pending, journal, resume_move, progress_callback, log_callback, workers)
+        journal.record("complete")
+    finally:
+        journal.close()
+    summary["journal"] = journal_path
+    return summary
+
+
+def undo_plan(journal_path, progress_callback=None, log_callback=print, workers=DEFAULT_MOVE_WORKERS, force=False):
+    """Moves every file of a finished or interrupted run back to where it was.
+
+    A file is only moved back if its original path is still free, and if it is still the
+    file that was moved: its size and modification time are compared with the ones
+    journaled when it was moved, and only when they differ is its content hash compared
+    too (a file moved without a known hash then counts as changed). A file that no longer exists at either path (e.g. it was deleted) is journaled as
+    undone with a `missing` flag and skipped, so it does not keep the undo from completing.
+    Category folders created by the run are removed if they end up empty. The undo is
+    journaled as well, so an interrupted undo can simply be run again.
+
+    Args:
+        journal_path (str): The journal of the run.
+        progress_callback (function, optional): See `execute_plan`.
+        log_callback (function, optional): See `execute_plan`.
+        workers (int, optional): The number of threads moving files.
+        force (bool, optional): If True, files changed since they were moved are moved back too.
+
+    Returns:
+        dict: The number of files `restored`, `missing` and `failed`, and the `journal` path.
+    """
+    state = MoveJournal.load(journal_path)
+    folder_path, moves, fingerprints = state["folder"], state["moves"], state["fingerprints"]
+    # An interrupted run may have moved files it did not get to journal, so all of its moves are checked
+    to_undo = [index for index in range(len(moves))
+               if index not in state["undone"] and (index in state["done"] or not state["complete"])]
+    log_callback(f"Desfazendo a organização de '{folder_path}': {len(to_undo)} arquivo(s).")
+    if state["undo_failed"]:
+        log_callback(f"{len(state['undo_failed'])} arquivo(s) não puderam ser restaurados na tentativa anterior; tentando novamente.")
+
+    def restore(current_path, original_path, index):
+        if not os.path.lexists(current_path):
+            if os.path.lexists(original_path): return {}  # Never moved, or already moved back
+            organizer.get_hash_index().remove(os.path.abspath(current_path))
+            return {"missing": True}
+        if os.path.lexists(original_path):
+            raise FileExistsError(errno.EEXIST, "O local original está ocupado", original_path)
+        if not force and index in fingerprints and not _matches_fingerprint(current_path, fingerprints[index]):
+            raise ValueError(f"'{current_path}' foi modificado depois da organização")
+        move_file(current_path, original_path, rename_on_collision=False)
+        return {}
+
+    journal = MoveJournal(journal_path)
+    try:
+        summary = _run_moves(folder_path, [(target, source) for source, target in moves], to_undo, journal, restore,
+                             progress_callback, log_callback, workers, done_event="undone", failed_event="undo_failed")
+        for relative_dir in reversed(state["created_dirs"]):
+            try:
+                os.rmdir(os.path.join(folder_path, relative_dir))
+            except OSError:
+                pass
+        if not summary["failed"]:
+            journal.record("undo_complete")
+    finally:
+        journal.close()
+    return {"restored": summary["moved"], "missing": summary["missing"], "failed": summary["failed"],
+            "journal": journal_path}
+
+
+def find_last_applied_journal(folder_path):
+    """Returns the journal of the most recent run over `folder_path` that was not undone, or None."""
+    for path in list_journals(folder_path):
+        try:
+            state = MoveJournal.load(path)
+        except (OSError, ValueError):
+            continue
+        if not state["undo_complete"] and (state["done"] or not state["complete"]):
+            return path
+    return None
+
+
+def has_undoable_run(folder_path):
+    """Returns True if `folder_path` has an organization that can be undone (see `find_last_applied_journal`)."""
+    try:
+        return find_last_applied_journal(folder_path) is not None
+    except OSError:
+        return False
+
+
+def rollback_last(folder_path, progress_callback=None, log_callback=print, workers=DEFAULT_MOVE_WORKERS, force=False):
+    """Undoes the most recent organization of a folder that was not undone yet.
+
+    Calling it again rolls back the run before that one, and so on.
+
+    Args:
+        folder_path (str): The organized folder.
+        progress_callback (function, optional): See `execute_plan`.
+        log_callback (function, optional): See `execute_plan`.
+        workers (int, optional): The number of threads moving files.
+        force (bool, optional): See `undo_plan`.
+
+    Returns:
+        dict or None: The summary of `undo_plan`, or None if there is nothing to undo.
+    """
+    journal_path = find_last_applied_journal(folder_path)
+    if journal_path is None:
+        log_callback("Nenhuma organização desta pasta para desfazer.")
+        return None
+    return undo_plan(journal_path, progress_callback=progress_callback, log_callback=log_callback,
+                     workers=workers, force=force)
+
+
+def _fingerprint(file_path, stat_result=None):
+    """Returns the journaled identity of a file: size, modification time and, if the hash index knows it, content hash.
+
+    The hash is never computed here, so that moving a file does not read it; undo only
+    needs it for files whose size or modification time changed.
+    """
+    stat_result = stat_result or os.stat(file_path)
+    return {"size": stat_result.st_size, "mtime_ns": stat_result.st_mtime_ns,
+            "sha256": organizer.get_hash_index().get(os.path.abspath(file_path), stat_result)}
+
+
+def _matches_fingerprint(file_path, fingerprint):
+    stat_result = os.stat(file_path)
+    if (stat_result.st_size, stat_result.st_mtime_ns) == (fingerprint["size"], fingerprint["mtime_ns"]):
+        return True
+    # Only read the file when its metadata changed (e.g. it was copied across devices or touched)
+    return fingerprint["sha256"] is not None and organizer.get_file_hash(file_path, stat_result) == fingerprint["sha256"]
+
+
+def _move_and_fingerprint(source_path, target_path, _):
+    # Files classified just before are in the hash index; the others are moved without a hash
+    stat_result = os.stat(source_path)
+    fingerprint = _fingerprint(source_path, stat_result)
+    moved_path = move_file(source_path, target_path)
+    if moved_path != target_path:
+        fingerprint["target"] = moved_path
+    return fingerprint
+
+
+def _run_moves(folder_path, moves, indexes, journal, move, progress_callback, log_callback, workers,
+               done_event="done", failed_event="failed"):
+    """Runs the moves at `indexes` in a thread pool, journaling each result as it completes.
+
+    `move(source_path, target_path, index)` performs one move and returns the extra fields journaled with it;
+    a `missing` field means there was no file to move, which is counted apart from the moved ones, and a
+    `target` field is the path the file was moved to when its planned target was taken in the meantime.
+    """
+    total = len(indexes)
+    summary = {"moved": 0, "missing": 0, "failed": 0}
+    if progress_callback:
+        progress_callback(message="Movendo arquivos...")
+
+    # Target folders are created up front, once each
+    for relative_dir in sorted({os.path.dirname(moves[index][1]) for index in indexes}):
+        target_dir = os.path.join(folder_path, relative_dir)
+        if relative_dir and not os.path.isdir(target_dir):
+            try:
+                os.makedirs(target_dir)
+                journal.record("mkdir", relative_dir)
+                log_callback(f"Criando pasta: '{target_dir}'")
+            except OSError as e:
+                log_callback(f"Erro ao criar pasta '{target_dir}': {e}")
+    journal.flush()
+
+    moved_by_folder = {}
+    report_every = max(1, total // 100)
+    completed = 0
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+        pending = {executor.submit(move, os.path.join(folder_path, moves[index][0]),
+                                   os.path.join(folder_path, moves[index][1]), index): index
+                   for index in indexes}
+        while pending:
+            finished, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in finished:
+                index = pending.pop(future)
+                try:
+                    fields = future.result() or {}
+                    if "target" in fields:
+                        fields["target"] = os.path.relpath(fields["target"], folder_path)
+                        log_callback(f"'{moves[index][0]}': o destino foi ocupado durante a organização. Movido para '{fields['target']}'.")
+                    journal.record(done_event, index, **fields)
+                    if fields.get("missing"):
+                        summary["missing"] += 1
+                        log_callback(f"Ignorando '{moves[index][0]}': o arquivo não existe mais.")
+                    else:
+                        summary["moved"] += 1
+                        target_dir = os.path.dirname(moves[index][1]) or "."
+                        moved_by_folder[target_dir] = moved_by_folder.get(target_dir, 0) + 1
+                except Exception as e:
+                    journal.record(failed_event, index, error=str(e))
+                    summary["failed"] += 1
+                    log_callback(f"Erro ao mover '{moves[index][0]}': {e}")
+                completed += 1
+                if progress_callback and (completed % report_every == 0 or completed == total):
+                    progress_callback(current_val=completed, total_val=total)
+            journal.flush()
+    organizer.get_hash_index().flush()
+
+    for target_dir, count in sorted(moved_by_folder.items()):
+        log_callback(f"{count} arquivo(s) movido(s) para '{target_dir}'.")
+    return summary
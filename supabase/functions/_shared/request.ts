@@ -0,0 +1,11 @@
+// supabase/functions/_shared/request.ts
+// Lê o corpo JSON da requisição, descompactando-o quando o cliente o envia com gzip
+// (o organizador compacta payloads grandes para reduzir o tempo de upload).
+export async function readJsonBody(req: Request) {
+    const encoding = req.headers.get("Content-Encoding")?.toLowerCase();
+    if (encoding === "gzip" && req.body) {
+        const decompressed = req.body.pipeThrough(new DecompressionStream("gzip"));
+        return JSON.parse(await new Response(decompressed).text());
+    }
+    return await req.json();
+}
@@ -1,6 +1,7 @@
 // supabase/functions/classify-document-file/index.ts
 import { serve } from "https://deno.land/std@0.177.0/http/server.ts"
 import { corsHeaders } from '../_shared/cors.ts'
+import { readJsonBody } from '../_shared/request.ts'
 
 const GEMINI_API_KEY = Deno.env.get("GEMINI_API_KEY_EDGE")
 const GEMINI_API_URL = `https://generativelanguage.googleapis.com/v1/models/gemini-2.5-flash:generateContent?key=${GEMINI_API_KEY}`;
@@ -11,7 +12,7 @@ serve(async (req: Request) => {
   }
 
   try {
-    const { file_data_base64, mime_type, categories } = await req.json();
+    const { file_data_base64, mime_type, categories } = await readJsonBody(req);
 
     if (!file_data_base64 || !mime_type || !categories) {
       throw new Error("Dados ausentes: file_data_base64, mime_type e categories são obrigatórios.");
@@ -1,6 +1,7 @@
 // supabase/functions/classify-document-gemini/index.ts
 import { serve } from "https://deno.land/std@0.177.0/http/server.ts"
 import { corsHeaders } from '../_shared/cors.ts'
+import { readJsonBody } from '../_shared/request.ts'
 
 const GEMINI_API_KEY = Deno.env.get("GEMINI_API_KEY_EDGE")
 const GEMINI_API_URL = `https://generativelanguage.googleapis.com/v1/models/gemini-2.5-flash:generateContent?key=${GEMINI_API_KEY}`;
@@ -15,7 +16,7 @@ serve(async (req: Request) => {
     if (!authHeader || !authHeader.startsWith("Bearer ")) {
     }
 
-    const { document_text, categories } = await req.json();
+    const { document_text, categories } = await readJsonBody(req);
 
     if (!document_text || !categories) {
       return new Response(JSON.stringify({ error: "Dados ausentes: document_text e categories são obrigatórios." }), {
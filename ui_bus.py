@@ -0,0 +1,61 @@
+"""Progress and log bus between worker threads and the Tk interface.
+
+Worker threads push log lines and progress updates without blocking and without
+touching Tk. The UI thread drains the bus at a fixed frame rate: all the log lines
+queued since the previous frame are inserted at once, and only the latest progress
+update is shown, however many arrived in between.
+"""
+
+import threading
+from collections import deque
+
+# Interval between two drains of the bus by the UI thread, in milliseconds
+DEFAULT_FRAME_INTERVAL_MS = 50
+# Log lines kept in the bus when the UI falls behind; older ones are dropped
+MAX_PENDING_LOG_LINES = 10000
+
+
+class UiUpdateBus:
+    """A thread-safe mailbox of log lines and the latest progress update."""
+    def __init__(self, max_pending_log_lines=MAX_PENDING_LOG_LINES):
+        """Initializes an empty bus.
+
+        Args:
+            max_pending_log_lines (int, optional): The maximum number of undrained log lines.
+        """
+        self._lock = threading.Lock()
+        self._log_lines = deque(maxlen=max_pending_log_lines)
+        self._dropped_log_lines = 0
+        self._progress = None
+
+    def push_log(self, message):
+        """Queues a log line. Safe to call from any thread."""
+        with self._lock:
+            if len(self._log_lines) == self._log_lines.maxlen:
+                self._dropped_log_lines += 1
+            self._log_lines.append(message)
+
+    def push_progress(self, current_val=None, total_val=None, message=None):
+        """Records a progress update, replacing any update not drained yet. Safe to call from any thread."""
+        with self._lock:
+            self._progress = (current_val, total_val, message)
+
+    def discard_progress(self):
+        """Drops the pending progress update, e.g. when the progress bar is hidden."""
+        with self._lock:
+            self._progress = None
+
+    def drain(self):
+        """Takes everything queued since the previous drain.
+
+        Returns:
+            tuple: `(log_lines, dropped_log_lines, progress)`: the queued log lines, the number
+            of lines dropped because the bus was full, and the latest progress update as a
+            `(current_val, total_val, message)` tuple, or None if there was none.
+        """
+        with self._lock:
+            log_lines = list(self._log_lines)
+            self._log_lines.clear()
+            dropped_log_lines, self._dropped_log_lines = self._dropped_log_lines, 0
+            progress, self._progress = self._progress, None
+        return log_lines, dropped_log_lines, progress